@@ -1,18 +1,21 @@
 from __future__ import annotations
 
+import contextlib
 import copy
 import itertools
 import functools
 import logging
 import random
 import secrets
+import threading
 import typing  # this can go away when Python 3.8 support is dropped
+import weakref
 from argparse import Namespace
-from collections import Counter, deque
-from collections.abc import Collection, MutableSequence
+from collections import deque
+from collections.abc import Collection, MutableMapping, MutableSequence
 from enum import IntEnum, IntFlag
-from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Set, Tuple, \
-                   TypedDict, Union, Type, ClassVar
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, KeysView, List, Mapping, NamedTuple, Optional, \
+                   Set, Tuple, TypedDict, Union, Type, ClassVar
 
 import NetUtils
 import Options
@@ -59,6 +62,10 @@ class MultiWorld():
     regions: RegionManager
     itempool: List[Item]
     is_race: bool = False
+    stage_workers: int = 0
+    """threads for the parallel_stages of worlds in call_all, 0 or 1 calls them one by one"""
+    profile: Optional[Utils.GenerationProfile] = None
+    """records the steps of generation when set, see profile_step"""
     precollected_items: Dict[int, List[Item]]
     state: CollectionState
 
@@ -71,6 +78,7 @@ class MultiWorld():
     progression_balancing: Dict[int, Options.ProgressionBalancing]
     completion_condition: Dict[int, Callable[[CollectionState], bool]]
     indirect_connections: Dict[Region, Set[Entrance]]
+    rule_dependencies: Dict[int, Dict[str, Set[Union[Entrance, Location]]]]
     exclude_locations: Dict[int, Options.ExcludeLocations]
     priority_locations: Dict[int, Options.PriorityLocations]
     start_inventory: Dict[int, Options.StartInventory]
@@ -154,6 +162,7 @@ class MultiWorld():
         self.early_items = {player: {} for player in self.player_ids}
         self.local_early_items = {player: {} for player in self.player_ids}
         self.indirect_connections = {}
+        self.rule_dependencies = {}
         self.start_inventory_from_pool: Dict[int, Options.StartInventoryPool] = {}
 
         for player in range(1, players + 1):
@@ -312,6 +321,12 @@ class MultiWorld():
     def get_name_string_for_object(self, obj) -> str:
         return obj.name if self.players == 1 else f'{obj.name} ({self.get_player_name(obj.player)})'
 
+    def profile_step(self, step: str, player: Optional[int] = None) -> typing.ContextManager[None]:
+        """Records the time and memory taken by the block in profile, does nothing without one."""
+        if self.profile is None:
+            return contextlib.nullcontext()
+        return self.profile.measure(step, player)
+
     def get_player_name(self, player: int) -> str:
         return self.player_name[player]
 
@@ -408,6 +423,22 @@ class MultiWorld():
         state.can_reach(Region) in the Entrance's traversal condition, as opposed to pure transition logic."""
         self.indirect_connections.setdefault(region, set()).add(entrance)
 
+    def register_rule_dependencies(self, spot: Union[Entrance, Location], item_names: Iterable[str]) -> None:
+        """Report that the access rule of this Entrance or Location only reads these item names of its own player.
+        CollectionState then only re-evaluates the rule when one of these items changes, instead of on every update.
+        Reaching Regions in an Entrance rule additionally requires register_indirect_condition, as usual.
+        Replacing the rule afterwards drops the declaration again."""
+        spot.item_dependencies = frozenset(item_names)
+        if spot.player not in self.rule_dependencies:
+            state: Optional[CollectionState] = getattr(self, "state", None)
+            if state and spot.player in state.prog_items:
+                prog_items = ChangeTrackingCounter(state.prog_items[spot.player])
+                prog_items.changed.update(prog_items)  # may have changed since its last reachability update
+                state.prog_items[spot.player] = prog_items
+        player_dependencies = self.rule_dependencies.setdefault(spot.player, {})
+        for item_name in spot.item_dependencies:
+            player_dependencies.setdefault(item_name, set()).add(spot)
+
     def get_locations(self, player: Optional[int] = None) -> Iterable[Location]:
         if player is not None:
             return self.regions.location_cache[player].values()
@@ -468,56 +499,40 @@ class MultiWorld():
         prog_locations = {location for location in self.get_locations() if location.item
                           and location.item.advancement and location not in state.locations_checked}
 
-        while prog_locations:
-            sphere: Set[Location] = set()
-            # build up spheres of collection radius.
-            # Everything in each sphere is independent from each other in dependencies and only depends on lower spheres
-            for location in prog_locations:
-                if location.can_reach(state):
-                    sphere.add(location)
-
-            if not sphere:
-                # ran out of places and did not finish yet, quit
-                return False
-
-            for location in sphere:
-                state.collect(location.item, True, location)
-            prog_locations -= sphere
-
+        for _ in state.collect_spheres(prog_locations):
             if self.has_beaten_game(state):
                 return True
 
         return False
 
-    def get_spheres(self) -> Iterator[Set[Location]]:
+    def get_spheres(self, state: Optional[CollectionState] = None) -> Iterator[Set[Location]]:
         """
         yields a set of locations for each logical sphere
 
         If there are unreachable locations, the last sphere of reachable
         locations is followed by an empty set, and then a set of all of the
         unreachable locations.
+
+        :param state: state to collect the spheres into, a new CollectionState if not supplied
         """
-        state = CollectionState(self)
+        if not state:
+            state = CollectionState(self)
         locations = set(self.get_filled_locations())
 
-        while locations:
-            sphere: Set[Location] = set()
-
-            for location in locations:
-                if location.can_reach(state):
-                    sphere.add(location)
-            yield sphere
-            if not sphere:
-                if locations:
-                    yield locations  # unreachable locations
-                break
+        yield from state.collect_spheres(locations)
+        if locations:
+            yield set()
+            yield locations  # unreachable locations
 
-            for location in sphere:
-                state.collect(location.item, True, location)
-            locations -= sphere
+    def fulfills_accessibility(self, state: Optional[CollectionState] = None,
+                               spheres: Optional[Iterable[Set[Location]]] = None):
+        """
+        Check if accessibility rules are fulfilled with current or supplied state.
 
-    def fulfills_accessibility(self, state: Optional[CollectionState] = None):
-        """Check if accessibility rules are fulfilled with current or supplied state."""
+        :param state: state to collect into, a new CollectionState if not supplied
+        :param spheres: spheres of get_spheres that were already collected into state, reused instead of walking the
+        multiworld again where they are equivalent
+        """
         if not state:
             state = CollectionState(self)
         players: Dict[str, Set[int]] = {
@@ -552,38 +567,379 @@ class MultiWorld():
                 return False  # still locations required to be collected
             return True
 
-        locations = [location for location in self.get_locations() if location_relevant(location)]
-
-        while locations:
-            sphere: List[Location] = []
-            for n in range(len(locations) - 1, -1, -1):
-                if locations[n].can_reach(state):
-                    sphere.append(locations.pop(n))
-
-            if not sphere:
-                # ran out of places and did not finish yet, quit
-                logging.warning(f"Could not access required locations for accessibility check."
-                                f" Missing: {locations}")
-                return False
-
-            for location in sphere:
-                if location.item:
-                    state.collect(location.item, True, location)
-
-            if self.has_beaten_game(state):
-                beatable_fulfilled = True
+        locations = {location for location in self.get_locations() if location_relevant(location)}
 
+        # get_spheres collects every filled location, which only matches if the excluded ones don't add progression
+        if spheres is not None and all(location.item for location in locations) and not any(
+                location.advancement and location.progress_type == LocationProgressType.EXCLUDED
+                for location in self.get_filled_locations()):
+            for sphere in spheres:
+                if not sphere:
+                    break
+                locations -= sphere
+            beatable_fulfilled = self.has_beaten_game(state)
             if all_done():
                 return True
+        else:
+            for _ in state.collect_spheres(locations):
+                if self.has_beaten_game(state):
+                    beatable_fulfilled = True
+
+                if all_done():
+                    return True
 
+        if locations:
+            # ran out of places and did not finish yet, quit
+            logging.warning(f"Could not access required locations for accessibility check."
+                            f" Missing: {locations}")
         return False
 
 
 PathValue = Tuple[str, Optional["PathValue"]]
 
 
+class SharedSubState:
+    """Per-player part of a CollectionState that copies of the state share until it is changed.
+    Copies clone it when it is accessed through PlayerSubStates[player], which may change it, but not when
+    CollectionState only reads it through PlayerSubStates.peek. The owner clones it for the copies still sharing it
+    before its next change."""
+    _sharers: Optional[List[Tuple[weakref.ReferenceType[PlayerSubStates], int]]] = None
+
+    def share(self, sharer: PlayerSubStates, player: int) -> None:
+        sharers = self._sharers
+        if sharers is None:
+            self._sharers = sharers = []
+        elif len(sharers) >= 64 and len(sharers) & (len(sharers) - 1) == 0:
+            # copies are often thrown away without being touched, don't keep their references around forever
+            sharers[:] = [(ref, player) for ref, player in sharers
+                          if (sub_states := ref()) is not None and sub_states.shared.get(player) is self]
+        sharers.append((weakref.ref(sharer), player))
+
+    def clone(self) -> SharedSubState:
+        return self.__class__(self)
+
+    def _unshare(self) -> None:
+        sharers, self._sharers = self._sharers, None
+        for ref, player in sharers:
+            sharer = ref()
+            if sharer is not None:
+                sharer.unshare(player, self)
+
+
+def _unshare_before(method: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(method)
+    def wrapper(self: SharedSubState, *args: Any) -> Any:
+        if self._sharers:
+            self._unshare()
+        return method(self, *args)
+    return wrapper
+
+
+class SharedSet(SharedSubState, set):
+    """set of reachable_regions or blocked_connections, see SharedSubState"""
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+
+for _method in ("add", "clear", "difference_update", "discard", "intersection_update", "pop", "remove",
+                "symmetric_difference_update", "update", "__iand__", "__ior__", "__isub__", "__ixor__"):
+    setattr(SharedSet, _method, _unshare_before(getattr(set, _method)))
+
+
+_intern_lock = threading.Lock()
+
+
+class ItemNameIndex(dict):
+    """Interns the item names counted in prog_items to dense indices into ItemCounter.counts.
+    The item names of a world are interned at registration in item id order, into the index of its class.
+    Each World instance counts with an overlay of that, to which other names like events are appended when they are
+    first counted, so those are dropped with the multiworld. Index 0 is never handed out, so lookups can use
+    .get(item_name, 0)."""
+    names: List[Optional[str]]
+    groups: Dict[str, Tuple[int, ...]]
+
+    def __init__(self, item_names: Iterable[str] = (),
+                 item_name_groups: Optional[Mapping[str, Iterable[str]]] = None) -> None:
+        super().__init__()
+        self.names = [None]
+        for item_name in item_names:
+            self.intern(item_name)
+        self.groups = {group_name: tuple(sorted(self.intern(item_name) for item_name in item_names))
+                       for group_name, item_names in (item_name_groups or {}).items()}
+
+    def intern(self, item_name: str) -> int:
+        index = self.get(item_name)
+        if index is None:
+            # worlds can run in parallel threads, see World.parallel_stages
+            with _intern_lock:
+                index = self.get(item_name)
+                if index is None:
+                    index = len(self.names)
+                    self.names.append(item_name)
+                    self[item_name] = index
+        return index
+
+    def overlay(self) -> ItemNameIndex:
+        """Returns a copy with the same indices, names interned into it are not added to this one."""
+        ret = self.__class__.__new__(self.__class__)
+        dict.update(ret, self)
+        ret.names = self.names.copy()
+        ret.groups = self.groups
+        return ret
+
+
+class ItemCounter(SharedSubState, MutableMapping):
+    """Counter of prog_items, backed by a list of counts indexed by ItemNameIndex, see also SharedSubState.
+    Unlike in a Counter, item names with a count of 0 are missing keys: they are not iterated over, not contained and
+    not counted by len(), also after subtract, which keeps them in a Counter. Negative counts are kept."""
+    index: ItemNameIndex
+    counts: List[int]
+    access_results: Dict[int, Tuple[Location, Callable[[CollectionState], bool], bool]]
+    """results of access rules with declared item dependencies for these counts, see CollectionState.check_access"""
+
+    def __init__(self, counts: Union[Mapping[str, int], Iterable[str], None] = None,
+                 index: Optional[ItemNameIndex] = None) -> None:
+        if index is None:
+            index = counts.index if isinstance(counts, ItemCounter) else ItemNameIndex()
+        self.index = index
+        self.counts = [0] * len(index.names)
+        self.access_results = {}
+        if counts:
+            self.update(counts)
+
+    def __getitem__(self, item_name: str) -> int:
+        try:
+            return self.counts[self.index.get(item_name, 0)]
+        except IndexError:
+            # interned after this counter was created
+            return 0
+
+    def __setitem__(self, item_name: str, count: int) -> None:
+        if self._sharers:
+            self._unshare()
+        index = self.index.intern(item_name)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend(itertools.repeat(0, len(self.index.names) - len(counts)))
+        counts[index] = count
+        # may be shared with clones, so start a new one instead of clearing it
+        self.access_results = {}
+
+    def __delitem__(self, item_name: str) -> None:
+        if self[item_name]:
+            self[item_name] = 0
+
+    def __iter__(self) -> Iterator[str]:
+        return (item_name for item_name, count in zip(self.index.names, self.counts) if count)
+
+    def __len__(self) -> int:
+        return len(self.counts) - self.counts.count(0)
+
+    def __contains__(self, item_name: object) -> bool:
+        return bool(self[item_name])
+
+    def get(self, item_name: str, default: Any = None) -> Any:
+        return self[item_name] or default
+
+    def clear(self) -> None:
+        for item_name in list(self):
+            del self[item_name]
+
+    def update(self, counts: Union[Mapping[str, int], Iterable[str], None] = None, /, **kwargs: int) -> None:
+        """Adds counts like Counter.update."""
+        for item_name, count in self._pairs(counts, kwargs):
+            self[item_name] += count
+
+    def subtract(self, counts: Union[Mapping[str, int], Iterable[str], None] = None, /, **kwargs: int) -> None:
+        """Subtracts counts like Counter.subtract, except that item names reaching 0 are dropped."""
+        for item_name, count in self._pairs(counts, kwargs):
+            self[item_name] -= count
+
+    @staticmethod
+    def _pairs(counts: Union[Mapping[str, int], Iterable[str], None],
+               kwargs: Mapping[str, int]) -> Iterator[Tuple[str, int]]:
+        if isinstance(counts, Mapping):
+            yield from counts.items()
+        elif counts is not None:
+            yield from zip(counts, itertools.repeat(1))
+        yield from kwargs.items()
+
+    def total(self) -> int:
+        return sum(self.counts)
+
+    def clone(self) -> ItemCounter:
+        ret = self.__class__.__new__(self.__class__)
+        ret.index = self.index
+        ret.counts = counts = self.counts.copy()
+        # the counts are the same, so are the results until either side changes and starts over
+        ret.access_results = self.access_results
+        # catch up with names interned since, so lookups of those don't have to take the slow path
+        if len(counts) < len(self.index.names):
+            counts.extend(itertools.repeat(0, len(self.index.names) - len(counts)))
+        return ret
+
+    copy = clone
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return dict(self.items()) == {item_name: count for item_name, count in other.items() if count}
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({dict(self.items())!r})"
+
+    def __reduce__(self):
+        return self.__class__, (dict(self.items()), self.index)
+
+
+class PlayerSubStates(dict):
+    """Maps player to their SharedSubState in a CollectionState,
+    values still shared with the state this was copied from are cloned when accessed through [player], get, items or
+    values, which may change them. Reading the players, comparing and copying doesn't clone them."""
+    shared: Dict[int, SharedSubState]
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.shared = {}
+        super().__init__(*args, **kwargs)
+
+    def __missing__(self, player: int) -> Any:
+        sub_state = self.shared.pop(player)
+        sub_state = sub_state.clone()
+        dict.__setitem__(self, player, sub_state)
+        return sub_state
+
+    def peek(self, player: int) -> Any:
+        """Returns the sub-state of player without cloning it, if it is still shared. It must not be changed."""
+        sub_state = dict.get(self, player)
+        if sub_state is None:
+            return self.shared[player]
+        return sub_state
+
+    def __setitem__(self, player: int, sub_state: Any) -> None:
+        if self.shared:
+            self.shared.pop(player, None)
+        dict.__setitem__(self, player, sub_state)
+
+    def __delitem__(self, player: int) -> None:
+        if player in self.shared:
+            del self.shared[player]
+        else:
+            dict.__delitem__(self, player)
+
+    def unshare(self, player: int, sub_state: SharedSubState) -> None:
+        """Called by sub_state before it changes."""
+        if self.shared.get(player) is sub_state:
+            del self.shared[player]
+            dict.__setitem__(self, player, sub_state.clone())
+
+    def unshare_all(self) -> None:
+        if self.shared:
+            sub_states = {player: self[player] for player in itertools.chain(dict.keys(self), tuple(self.shared))}
+            dict.clear(self)
+            # keep the order of players independent of which ones were accessed first
+            dict.update(self, sorted(sub_states.items()))
+
+    def share(self) -> PlayerSubStates:
+        """Returns a copy whose values are shared with this one until either side changes them."""
+        ret = self.__class__()
+        for player, sub_state in itertools.chain(dict.items(self), self.shared.items()):
+            if isinstance(sub_state, SharedSubState):
+                ret.shared[player] = sub_state
+                sub_state.share(ret, player)
+            else:
+                dict.__setitem__(ret, player, copy.copy(sub_state))
+        return ret
+
+    copy = share
+
+    def peek_items(self) -> List[Tuple[int, Any]]:
+        """Returns the players and their sub-states without cloning the shared ones. They must not be changed."""
+        if not self.shared:
+            return list(dict.items(self))
+        # keep the order of players independent of which ones were accessed first, like unshare_all
+        return sorted(itertools.chain(dict.items(self), self.shared.items()), key=lambda item: item[0])
+
+    def __contains__(self, player: object) -> bool:
+        return dict.__contains__(self, player) or player in self.shared
+
+    def __iter__(self) -> Iterator[int]:
+        return (player for player, _ in self.peek_items())
+
+    def __len__(self) -> int:
+        return dict.__len__(self) + len(self.shared)
+
+    def keys(self) -> KeysView[int]:
+        return dict.fromkeys(self).keys()
+
+    def clear(self) -> None:
+        self.shared.clear()
+        dict.clear(self)
+
+    def get(self, player: int, default: Any = None) -> Any:
+        """Like self[player], the returned sub-state may be changed, so only it is cloned if still shared."""
+        return self[player] if player in self else default
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, PlayerSubStates):
+            other = dict(other.peek_items())
+        return dict(self.peek_items()) == other
+
+    def __ne__(self, other: object) -> bool:
+        return not self == other
+
+    def __repr__(self) -> str:
+        return repr(dict(self.peek_items()))
+
+    def __reduce__(self):
+        return self.__class__, (dict(self.peek_items()),)
+
+
+def _unshare_all_before(method: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(method)
+    def wrapper(self: PlayerSubStates, *args: Any) -> Any:
+        if self.shared:
+            self.unshare_all()
+        return method(self, *args)
+    return wrapper
+
+
+# these return or change sub-states of every player, which callers may then change
+for _method in ("items", "pop", "popitem", "setdefault", "update", "values"):
+    setattr(PlayerSubStates, _method, _unshare_all_before(getattr(dict, _method)))
+
+
+class ChangeTrackingCounter(ItemCounter):
+    """ItemCounter for prog_items of players with declared rule dependencies,
+    remembers which item names changed since the last reachability update."""
+    changed: Set[str]
+
+    def __init__(self, counts: Union[Mapping[str, int], Iterable[str], None] = None,
+                 index: Optional[ItemNameIndex] = None) -> None:
+        self.changed = set()
+        super().__init__(counts, index)
+
+    def __setitem__(self, item_name: str, count: int) -> None:
+        super().__setitem__(item_name, count)
+        self.changed.add(item_name)
+
+    def clone(self) -> ChangeTrackingCounter:
+        ret = super().clone()
+        ret.changed = set(self.changed)
+        return ret
+
+    def pop_changed(self) -> Set[str]:
+        """Returns the item names changed since the last call."""
+        if self._sharers:
+            self._unshare()
+        changed, self.changed = self.changed, set()
+        return changed
+
+    def __reduce__(self):
+        return self.__class__, (dict(self.items()), self.index), {"changed": set(self.changed)}
+
+
 class CollectionState():
-    prog_items: Dict[int, Counter[str]]
+    prog_items: Dict[int, ItemCounter]
     multiworld: MultiWorld
     reachable_regions: Dict[int, Set[Region]]
     blocked_connections: Dict[int, Set[Entrance]]
@@ -595,29 +951,50 @@ class CollectionState():
     additional_copy_functions: List[Callable[[CollectionState, CollectionState], CollectionState]] = []
 
     def __init__(self, parent: MultiWorld):
-        self.prog_items = {player: Counter() for player in parent.get_all_ids()}
+        self.prog_items = PlayerSubStates({player: ItemCounter(index=self._item_name_index(parent, player))
+                                           for player in parent.get_all_ids()})
         self.multiworld = parent
-        self.reachable_regions = {player: set() for player in parent.get_all_ids()}
-        self.blocked_connections = {player: set() for player in parent.get_all_ids()}
+        self.reachable_regions = PlayerSubStates({player: SharedSet() for player in parent.get_all_ids()})
+        self.blocked_connections = PlayerSubStates({player: SharedSet() for player in parent.get_all_ids()})
         self.events = set()
         self.path = {}
         self.locations_checked = set()
         self.stale = {player: True for player in parent.get_all_ids()}
+        for player in parent.rule_dependencies:
+            self.prog_items[player] = ChangeTrackingCounter(index=self._item_name_index(parent, player))
         for function in self.additional_init_functions:
             function(self, parent)
         for items in parent.precollected_items.values():
             for item in items:
                 self.collect(item, True)
 
+    @staticmethod
+    def _item_name_index(multiworld: MultiWorld, player: int) -> ItemNameIndex:
+        world = multiworld.worlds.get(player)
+        if world is not None:
+            return world.item_name_index
+        # the state of a test can be created before the worlds
+        from worlds import AutoWorld
+        world_type = AutoWorld.AutoWorldRegister.world_types.get(multiworld.game.get(player))
+        return world_type.item_name_index.overlay() if world_type else ItemNameIndex()
+
     def update_reachable_regions(self, player: int):
         self.stale[player] = False
-        reachable_regions = self.reachable_regions[player]
-        blocked_connections = self.blocked_connections[player]
-        queue = deque(self.blocked_connections[player])
+        # a copy often finds nothing new, so it only clones what it shares once it has to change it
+        reachable_regions = self._peek(self.reachable_regions, player)
+        blocked_connections = self._peek(self.blocked_connections, player)
+        shared = True
+        if player in self.multiworld.rule_dependencies:
+            queue = deque(self._get_changed_connections(player))
+        else:
+            queue = deque(blocked_connections)
         start = self.multiworld.get_region("Menu", player)
 
         # init on first call - this can't be done on construction since the regions don't exist yet
         if start not in reachable_regions:
+            reachable_regions = self.reachable_regions[player]
+            blocked_connections = self.blocked_connections[player]
+            shared = False
             reachable_regions.add(start)
             blocked_connections.update(start.exits)
             queue.extend(start.exits)
@@ -627,9 +1004,17 @@ class CollectionState():
             connection = queue.popleft()
             new_region = connection.connected_region
             if new_region in reachable_regions:
+                if shared:
+                    reachable_regions = self.reachable_regions[player]
+                    blocked_connections = self.blocked_connections[player]
+                    shared = False
                 blocked_connections.remove(connection)
             elif connection.can_reach(self):
                 assert new_region, f"tried to search through an Entrance \"{connection}\" with no Region"
+                if shared:
+                    reachable_regions = self.reachable_regions[player]
+                    blocked_connections = self.blocked_connections[player]
+                    shared = False
                 reachable_regions.add(new_region)
                 blocked_connections.remove(connection)
                 blocked_connections.update(new_region.exits)
@@ -641,20 +1026,54 @@ class CollectionState():
                     if new_entrance in blocked_connections and new_entrance not in queue:
                         queue.append(new_entrance)
 
+    def _get_changed_connections(self, player: int) -> Set[Entrance]:
+        """Returns the blocked connections of player that may have become passable since the last update."""
+        blocked_connections = self._peek(self.blocked_connections, player)
+        prog_items = self._peek(self.prog_items, player)
+        if not isinstance(prog_items, ChangeTrackingCounter):
+            return set(blocked_connections)
+        changed_items = self.prog_items[player].pop_changed() if prog_items.changed else set()
+        changed = {connection for connection in blocked_connections if connection.item_dependencies is None}
+        player_dependencies = self.multiworld.rule_dependencies[player]
+        for item_name in changed_items:
+            changed.update(spot for spot in player_dependencies.get(item_name, ()) if spot in blocked_connections)
+        return changed
+
     def copy(self) -> CollectionState:
-        ret = CollectionState(self.multiworld)
-        ret.prog_items = copy.deepcopy(self.prog_items)
-        ret.reachable_regions = {player: copy.copy(self.reachable_regions[player]) for player in
-                                 self.reachable_regions}
-        ret.blocked_connections = {player: copy.copy(self.blocked_connections[player]) for player in
-                                   self.blocked_connections}
+        """Per-player prog_items, reachable_regions and blocked_connections are shared with the copy
+        and only cloned for the players whose part either state touches afterwards."""
+        ret = CollectionState.__new__(CollectionState)
+        ret.multiworld = self.multiworld
+        ret.prog_items = self._share(self.prog_items)
+        ret.reachable_regions = self._share(self.reachable_regions)
+        ret.blocked_connections = self._share(self.blocked_connections)
         ret.events = copy.copy(self.events)
         ret.path = copy.copy(self.path)
         ret.locations_checked = copy.copy(self.locations_checked)
+        ret.stale = {player: True for player in self.multiworld.get_all_ids()}
+        # precollected items are part of the copied prog_items already, only LogicMixin attributes are left to init
+        for function in self.additional_init_functions:
+            function(ret, self.multiworld)
         for function in self.additional_copy_functions:
             ret = function(self, ret)
         return ret
 
+    @staticmethod
+    def _peek(sub_states: Dict[int, Any], player: int) -> Any:
+        """Returns the sub-state of player for reading, without cloning it if it is still shared with another state."""
+        try:
+            return sub_states.peek(player)
+        except AttributeError:
+            # replaced by a plain dict from outside
+            return sub_states[player]
+
+    @staticmethod
+    def _share(sub_states: Dict[int, Any]) -> PlayerSubStates:
+        if isinstance(sub_states, PlayerSubStates):
+            return sub_states.share()
+        # replaced by a plain dict from outside
+        return PlayerSubStates({player: copy.copy(sub_state) for player, sub_state in sub_states.items()})
+
     def can_reach(self,
                   spot: Union[Location, Entrance, Region, str],
                   resolution_hint: Optional[str] = None,
@@ -680,112 +1099,203 @@ class CollectionState():
     def can_reach_region(self, spot: str, player: int) -> bool:
         return self.multiworld.get_region(spot, player).can_reach(self)
 
+    def check_access(self, location: Location) -> bool:
+        """Evaluates the access rule of location. Location rules with declared item dependencies only read the items of
+        their own player, so their result is kept with that player's prog_items until those change, also for copies.
+        Other rules, and Entrance rules, can also read Regions, placed items or anything else, so they are always
+        evaluated."""
+        if location.item_dependencies is None:
+            return location.access_rule(self)
+        item_counts = self._peek(self.prog_items, location.player)
+        try:
+            access_results = item_counts.access_results
+        except AttributeError:
+            # replaced by a plain Counter
+            return location.access_rule(self)
+        # keyed by id, as Location.__hash__ is slow, the entry keeps the Location alive so its id can't be reused
+        rule = location.access_rule
+        entry = access_results.get(id(location))
+        if entry is None or entry[1] != rule:
+            result = bool(rule(self))
+            access_results[id(location)] = location, rule, result
+            return result
+        return entry[2]
+
     def sweep_for_events(self, key_only: bool = False, locations: Optional[Iterable[Location]] = None) -> None:
         if locations is None:
             locations = self.multiworld.get_filled_locations()
-        reachable_events = True
         # since the loop has a good chance to run more than once, only filter the events once
         locations = {location for location in locations if location.advancement and location not in self.events and
                      not key_only or getattr(location.item, "locked_dungeon_item", False)}
-        while reachable_events:
-            reachable_events = {location for location in locations if location.can_reach(self)}
-            locations -= reachable_events
-            for event in reachable_events:
-                self.events.add(event)
-                assert isinstance(event.item, Item), "tried to collect Event with no Item"
-                self.collect(event.item, True, event)
+        for sphere in self.collect_spheres(locations):
+            self.events.update(sphere)
+
+    def collect_spheres(self, locations: Set[Location]) -> Iterator[Set[Location]]:
+        """
+        Collects the items of locations one logical sphere at a time, yielding each sphere after collecting it.
+
+        Reached locations are removed from locations, so only the unreachable ones are left in it once this stops.
+        After the first sphere, only locations that can have become reachable are tested again: those whose parent
+        region became reachable, those with opaque access rules and those whose declared item dependencies changed.
+        """
+        rule_dependencies = self.multiworld.rule_dependencies
+        waiting_on_region: Dict[Region, List[Location]] = {}
+        waiting_on_items: Dict[int, Set[Location]] = {}
+        candidates: Iterable[Location] = locations
+        # regions stay reachable, so only the first candidates can be waiting on their parent region
+        first_sphere = True
+        while candidates:
+            sphere: Set[Location] = set()
+            opaque: List[Location] = []
+            for location in candidates:
+                if location.can_reach(self):
+                    sphere.add(location)
+                elif first_sphere and not location.parent_region.can_reach(self):
+                    waiting_on_region.setdefault(location.parent_region, []).append(location)
+                elif location.item_dependencies is None:
+                    opaque.append(location)
+                else:
+                    waiting_on_items.setdefault(location.player, set()).add(location)
+            if not sphere:
+                return
+            first_sphere = False
+            locations -= sphere
+            for location in sphere:
+                if location.item:
+                    self.collect(location.item, True, location)
+
+            # find the next candidates before yielding, as reachability updates forget which items changed
+            candidates = opaque
+            for player in {location.item.player for location in sphere if location.item}:
+                waiting = waiting_on_items.get(player)
+                if not waiting:
+                    continue
+                prog_items = self._peek(self.prog_items, player)
+                if not isinstance(prog_items, ChangeTrackingCounter):
+                    candidates.extend(waiting)
+                    waiting.clear()
+                    continue
+                player_dependencies = rule_dependencies[player]
+                for item_name in prog_items.changed:
+                    for spot in player_dependencies.get(item_name, ()):
+                        if spot in waiting:
+                            waiting.remove(spot)
+                            candidates.append(spot)
+            for region in [region for region in waiting_on_region if region.can_reach(self)]:
+                candidates.extend(waiting_on_region.pop(region))
+            yield sphere
 
     # item name related
+    # these read ItemCounter.counts directly, the fallbacks cover item names interned after the counter was created
+    # and prog_items replaced by plain Counters
     def has(self, item: str, player: int, count: int = 1) -> bool:
-        return self.prog_items[player][item] >= count
+        item_counts = self._peek(self.prog_items, player)
+        try:
+            return item_counts.counts[item_counts.index.get(item, 0)] >= count
+        except (AttributeError, IndexError):
+            return item_counts[item] >= count
 
     def has_all(self, items: Iterable[str], player: int) -> bool:
         """Returns True if each item name of items is in state at least once."""
-        return all(self.prog_items[player][item] for item in items)
+        item_counts = self._peek(self.prog_items, player)
+        try:
+            counts, index = item_counts.counts, item_counts.index
+            for item in items:
+                if not counts[index.get(item, 0)]:
+                    return False
+            return True
+        except (AttributeError, IndexError):
+            return all(item_counts[item] for item in items)
 
     def has_any(self, items: Iterable[str], player: int) -> bool:
         """Returns True if at least one item name of items is in state at least once."""
-        return any(self.prog_items[player][item] for item in items)
+        item_counts = self._peek(self.prog_items, player)
+        try:
+            counts, index = item_counts.counts, item_counts.index
+            for item in items:
+                if counts[index.get(item, 0)]:
+                    return True
+            return False
+        except (AttributeError, IndexError):
+            return any(item_counts[item] for item in items)
 
     def has_all_counts(self, item_counts: Mapping[str, int], player: int) -> bool:
         """Returns True if each item name is in the state at least as many times as specified."""
-        return all(self.prog_items[player][item] >= count for item, count in item_counts.items())
+        player_counts = self._peek(self.prog_items, player)
+        return all(player_counts[item] >= count for item, count in item_counts.items())
 
     def has_any_count(self, item_counts: Mapping[str, int], player: int) -> bool:
         """Returns True if at least one item name is in the state at least as many times as specified."""
-        return any(self.prog_items[player][item] >= count for item, count in item_counts.items())
+        player_counts = self._peek(self.prog_items, player)
+        return any(player_counts[item] >= count for item, count in item_counts.items())
 
     def count(self, item: str, player: int) -> int:
-        return self.prog_items[player][item]
+        item_counts = self._peek(self.prog_items, player)
+        try:
+            return item_counts.counts[item_counts.index.get(item, 0)]
+        except (AttributeError, IndexError):
+            return item_counts[item]
 
     def has_from_list(self, items: Iterable[str], player: int, count: int) -> bool:
         """Returns True if the state contains at least `count` items matching any of the item names from a list."""
-        found: int = 0
-        player_prog_items = self.prog_items[player]
-        for item_name in items:
-            found += player_prog_items[item_name]
-            if found >= count:
-                return True
-        return False
-    
+        item_counts = self._list_counts(items, player)
+        return bool(item_counts) and sum(item_counts) >= count
+
     def has_from_list_unique(self, items: Iterable[str], player: int, count: int) -> bool:
         """Returns True if the state contains at least `count` items matching any of the item names from a list.
         Ignores duplicates of the same item."""
-        found: int = 0
-        player_prog_items = self.prog_items[player]
-        for item_name in items:
-            found += player_prog_items[item_name] > 0
-            if found >= count:
-                return True
-        return False
+        item_counts = self._list_counts(items, player)
+        return bool(item_counts) and len(item_counts) - item_counts.count(0) >= count
 
     def count_from_list(self, items: Iterable[str], player: int) -> int:
         """Returns the cumulative count of items from a list present in state."""
-        return sum(self.prog_items[player][item_name] for item_name in items)
-    
+        return sum(self._list_counts(items, player))
+
     def count_from_list_unique(self, items: Iterable[str], player: int) -> int:
         """Returns the cumulative count of items from a list present in state. Ignores duplicates of the same item."""
-        return sum(self.prog_items[player][item_name] > 0 for item_name in items)
+        item_counts = self._list_counts(items, player)
+        return len(item_counts) - item_counts.count(0)
+
+    def _list_counts(self, items: Iterable[str], player: int) -> List[int]:
+        item_counts = self._peek(self.prog_items, player)
+        try:
+            counts, index = item_counts.counts, item_counts.index
+            return [counts[index.get(item_name, 0)] for item_name in items]
+        except (AttributeError, IndexError):
+            return [item_counts[item_name] for item_name in items]
 
     # item name group related
     def has_group(self, item_name_group: str, player: int, count: int = 1) -> bool:
         """Returns True if the state contains at least `count` items present in a specified item group."""
-        found: int = 0
-        player_prog_items = self.prog_items[player]
-        for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]:
-            found += player_prog_items[item_name]
-            if found >= count:
-                return True
-        return False
+        item_counts = self._group_counts(item_name_group, player)
+        return bool(item_counts) and sum(item_counts) >= count
 
     def has_group_unique(self, item_name_group: str, player: int, count: int = 1) -> bool:
         """Returns True if the state contains at least `count` items present in a specified item group.
         Ignores duplicates of the same item.
         """
-        found: int = 0
-        player_prog_items = self.prog_items[player]
-        for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]:
-            found += player_prog_items[item_name] > 0
-            if found >= count:
-                return True
-        return False
+        item_counts = self._group_counts(item_name_group, player)
+        return bool(item_counts) and len(item_counts) - item_counts.count(0) >= count
 
     def count_group(self, item_name_group: str, player: int) -> int:
         """Returns the cumulative count of items from an item group present in state."""
-        player_prog_items = self.prog_items[player]
-        return sum(
-            player_prog_items[item_name]
-            for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]
-        )
+        return sum(self._group_counts(item_name_group, player))
 
     def count_group_unique(self, item_name_group: str, player: int) -> int:
         """Returns the cumulative count of items from an item group present in state.
         Ignores duplicates of the same item."""
-        player_prog_items = self.prog_items[player]
-        return sum(
-            player_prog_items[item_name] > 0
-            for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]
-        )
+        item_counts = self._group_counts(item_name_group, player)
+        return len(item_counts) - item_counts.count(0)
+
+    def _group_counts(self, item_name_group: str, player: int) -> List[int]:
+        item_counts = self._peek(self.prog_items, player)
+        try:
+            counts = item_counts.counts
+            # interned at registration, so the indices are always in range
+            return [counts[index] for index in item_counts.index.groups[item_name_group]]
+        except (AttributeError, KeyError):
+            return [item_counts[item_name]
+                    for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]]
 
     # Item related
     def collect(self, item: Item, event: bool = False, location: Optional[Location] = None) -> bool:
@@ -805,17 +1315,26 @@ class CollectionState():
 
         return changed
 
-    def remove(self, item: Item):
+    def remove(self, item: Item, event: bool = False):
+        """Undoes collect of item, event has to match the value it was collected with."""
         changed = self.multiworld.worlds[item.player].remove(self, item)
+        if not changed and event:
+            player_prog_items = self.prog_items[item.player]
+            if player_prog_items[item.name] > 1:
+                player_prog_items[item.name] -= 1
+            else:
+                del player_prog_items[item.name]
+            changed = True
         if changed:
             # invalidate caches, nothing can be trusted anymore now
-            self.reachable_regions[item.player] = set()
-            self.blocked_connections[item.player] = set()
+            self.reachable_regions[item.player] = SharedSet()
+            self.blocked_connections[item.player] = SharedSet()
             self.stale[item.player] = True
 
 
 class Entrance:
     access_rule: Callable[[CollectionState], bool] = staticmethod(lambda state: True)
+    _item_dependencies: Optional[Tuple[Callable[[CollectionState], bool], FrozenSet[str]]] = None
     hide_path: bool = False
     player: int
     name: str
@@ -830,6 +1349,18 @@ class Entrance:
         self.parent_region = parent
         self.player = player
 
+    @property
+    def item_dependencies(self) -> Optional[FrozenSet[str]]:
+        """set through MultiWorld.register_rule_dependencies, None marks access_rule as opaque.
+        Kept with the rule it was declared for, so it no longer applies once access_rule is replaced."""
+        if self._item_dependencies is None or self._item_dependencies[0] != self.access_rule:
+            return None
+        return self._item_dependencies[1]
+
+    @item_dependencies.setter
+    def item_dependencies(self, item_names: Optional[FrozenSet[str]]) -> None:
+        self._item_dependencies = None if item_names is None else (self.access_rule, item_names)
+
     def can_reach(self, state: CollectionState) -> bool:
         if self.parent_region.can_reach(state) and self.access_rule(state):
             if not self.hide_path and not self in state.path:
@@ -946,7 +1477,7 @@ class Region:
     def can_reach(self, state: CollectionState) -> bool:
         if state.stale[self.player]:
             state.update_reachable_regions(self.player)
-        return self in state.reachable_regions[self.player]
+        return self in state._peek(state.reachable_regions, self.player)
 
     @property
     def hint_text(self) -> str:
@@ -1036,6 +1567,7 @@ class Location:
     progress_type: LocationProgressType = LocationProgressType.DEFAULT
     always_allow = staticmethod(lambda state, item: False)
     access_rule: Callable[[CollectionState], bool] = staticmethod(lambda state: True)
+    _item_dependencies: Optional[Tuple[Callable[[CollectionState], bool], FrozenSet[str]]] = None
     item_rule = staticmethod(lambda item: True)
     item: Optional[Item] = None
 
@@ -1045,6 +1577,18 @@ class Location:
         self.address = address
         self.parent_region = parent
 
+    @property
+    def item_dependencies(self) -> Optional[FrozenSet[str]]:
+        """set through MultiWorld.register_rule_dependencies, None marks access_rule as opaque.
+        Kept with the rule it was declared for, so it no longer applies once access_rule is replaced."""
+        if self._item_dependencies is None or self._item_dependencies[0] != self.access_rule:
+            return None
+        return self._item_dependencies[1]
+
+    @item_dependencies.setter
+    def item_dependencies(self, item_names: Optional[FrozenSet[str]]) -> None:
+        self._item_dependencies = None if item_names is None else (self.access_rule, item_names)
+
     def can_fill(self, state: CollectionState, item: Item, check_access=True) -> bool:
         return ((self.always_allow(state, item) and item.name not in state.multiworld.worlds[item.player].options.non_local_items)
                 or ((self.progress_type != LocationProgressType.EXCLUDED or not (item.advancement or item.useful))
@@ -1054,7 +1598,7 @@ class Location:
     def can_reach(self, state: CollectionState) -> bool:
         # self.access_rule computes faster on average, so placing it first for faster abort
         assert self.parent_region, "Can't reach location without region"
-        return self.access_rule(state) and self.parent_region.can_reach(state)
+        return state.check_access(self) and self.parent_region.can_reach(state)
 
     def place_locked_item(self, item: Item):
         if self.item:
@@ -1221,33 +1765,26 @@ class Spoiler:
         state = CollectionState(multiworld)
         sphere_candidates = set(prog_locations)
         logging.debug('Building up collection spheres.')
-        while sphere_candidates:
-
-            # build up spheres of collection radius.
-            # Everything in each sphere is independent from each other in dependencies and only depends on lower spheres
-
-            sphere = {location for location in sphere_candidates if state.can_reach(location)}
-
-            for location in sphere:
-                state.collect(location.item, True, location)
-
-            sphere_candidates -= sphere
+        # build up spheres of collection radius.
+        # Everything in each sphere is independent from each other in dependencies and only depends on lower spheres
+        for sphere in state.collect_spheres(sphere_candidates):
             collection_spheres.append(sphere)
             state_cache.append(state.copy())
 
             logging.debug('Calculated sphere %i, containing %i of %i progress items.', len(collection_spheres),
                           len(sphere),
                           len(prog_locations))
-            if not sphere:
-                logging.debug('The following items could not be reached: %s', ['%s (Player %d) at %s (Player %d)' % (
-                    location.item.name, location.item.player, location.name, location.player) for location in
-                                                                               sphere_candidates])
-                if any([multiworld.worlds[location.item.player].options.accessibility != 'minimal' for location in sphere_candidates]):
-                    raise RuntimeError(f'Not all progression items reachable ({sphere_candidates}). '
-                                       f'Something went terribly wrong here.')
-                else:
-                    self.unreachables = sphere_candidates
-                    break
+        if sphere_candidates:
+            collection_spheres.append(set())
+            state_cache.append(state.copy())
+            logging.debug('The following items could not be reached: %s', ['%s (Player %d) at %s (Player %d)' % (
+                location.item.name, location.item.player, location.name, location.player) for location in
+                                                                           sphere_candidates])
+            if any([multiworld.worlds[location.item.player].options.accessibility != 'minimal' for location in sphere_candidates]):
+                raise RuntimeError(f'Not all progression items reachable ({sphere_candidates}). '
+                                   f'Something went terribly wrong here.')
+            else:
+                self.unreachables = sphere_candidates
 
         # in the second phase, we cull each sphere such that the game is still beatable,
         # reducing each range of influence to the bare minimum required inside it
@@ -1,6 +1,9 @@
 import collections
+import functools
+import inspect
 import itertools
 import logging
+import time
 import typing
 from collections import Counter, deque
 
@@ -19,6 +22,28 @@ def _log_fill_progress(name: str, placed: int, total_items: int) -> None:
     logging.info(f"Current fill step ({name}) at {placed}/{total_items} items placed.")
 
 
+FillStep = typing.TypeVar("FillStep", bound=typing.Callable[..., typing.Any])
+
+
+def _profiled(function: FillStep) -> FillStep:
+    """Records calls of a fill step taking the multiworld first in MultiWorld.profile,
+    named after the function and its name argument if it has one."""
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(multiworld: MultiWorld, *args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        if getattr(multiworld, "profile", None) is None:
+            return function(multiworld, *args, **kwargs)
+        step = function.__name__
+        arguments = signature.bind(multiworld, *args, **kwargs)
+        arguments.apply_defaults()
+        if "name" in arguments.arguments:
+            step += f" ({arguments.arguments['name']})"
+        with multiworld.profile.measure(step):
+            return function(multiworld, *args, **kwargs)
+    return typing.cast(FillStep, wrapper)
+
+
 def sweep_from_pool(base_state: CollectionState, itempool: typing.Sequence[Item] = tuple(),
                     locations: typing.Optional[typing.List[Location]] = None) -> CollectionState:
     new_state = base_state.copy()
@@ -28,6 +53,7 @@ def sweep_from_pool(base_state: CollectionState, itempool: typing.Sequence[Item]
     return new_state
 
 
+@_profiled
 def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locations: typing.List[Location],
                      item_pool: typing.List[Item], single_player_placement: bool = False, lock: bool = False,
                      swap: bool = True, on_place: typing.Optional[typing.Callable[[Location], None]] = None,
@@ -52,6 +78,10 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
     reachable_items: typing.Dict[int, typing.Deque[Item]] = {}
     for item in item_pool:
         reachable_items.setdefault(item.player, deque()).append(item)
+    # base_state with item_pool and unplaced_items collected, kept in sync with them instead of recollecting every step
+    pool_state = base_state.copy()
+    for item in item_pool:
+        pool_state.collect(item, True)
 
     # for progress logging
     total = min(len(item_pool), len(locations))
@@ -66,9 +96,10 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
                 if pool_item is item:
                     item_pool.pop(p)
                     break
-        maximum_exploration_state = sweep_from_pool(
-            base_state, item_pool + unplaced_items, multiworld.get_filled_locations(item.player)
-            if single_player_placement else None)
+            pool_state.remove(item, True)
+        maximum_exploration_state = pool_state.copy()
+        maximum_exploration_state.sweep_for_events(locations=multiworld.get_filled_locations(item.player)
+                                                   if single_player_placement else None)
 
         has_beaten_game = multiworld.has_beaten_game(maximum_exploration_state)
 
@@ -76,6 +107,8 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
             # if we have run out of locations to fill,break out of this loop
             if not locations:
                 unplaced_items += items_to_place
+                for item in items_to_place:
+                    pool_state.collect(item, True)
                 break
             item_to_place = items_to_place.pop(0)
 
@@ -114,9 +147,13 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
 
                         location.item = None
                         placed_item.location = None
-                        swap_state = sweep_from_pool(base_state, [placed_item, *item_pool] if unsafe else item_pool,
-                                                     multiworld.get_filled_locations(item.player)
-                                                     if single_player_placement else None)
+                        swap_state = pool_state.copy()
+                        for unplaced_item in unplaced_items:
+                            swap_state.remove(unplaced_item, True)
+                        if unsafe:
+                            swap_state.collect(placed_item, True)
+                        swap_state.sweep_for_events(locations=multiworld.get_filled_locations(item.player)
+                                                    if single_player_placement else None)
                         # unsafe means swap_state assumes we can somehow collect placed_item before item_to_place
                         # by continuing to swap, which is not guaranteed. This is unsafe because there is no mechanic
                         # to clean that up later, so there is a chance generation fails.
@@ -143,6 +180,7 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
                                 reachable_items[placed_item.player].appendleft(
                                     placed_item)
                                 item_pool.append(placed_item)
+                                pool_state.collect(placed_item, True)
 
                                 # cleanup at the end to hopefully get better errors
                                 cleanup_required = True
@@ -156,9 +194,11 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
                     if spot_to_fill is None:
                         # Can't place this item, move on to the next
                         unplaced_items.append(item_to_place)
+                        pool_state.collect(item_to_place, True)
                         continue
                 else:
                     unplaced_items.append(item_to_place)
+                    pool_state.collect(item_to_place, True)
                     continue
             multiworld.push_item(spot_to_fill, item_to_place, False)
             spot_to_fill.locked = lock
@@ -217,6 +257,7 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
     item_pool.extend(unplaced_items)
 
 
+@_profiled
 def remaining_fill(multiworld: MultiWorld,
                    locations: typing.List[Location],
                    itempool: typing.List[Item],
@@ -343,6 +384,7 @@ def inaccessible_location_rules(multiworld: MultiWorld, state: CollectionState,
             add_item_rule(location, forbid_important_item_rule)
 
 
+@_profiled
 def distribute_early_items(multiworld: MultiWorld,
                            fill_locations: typing.List[Location],
                            itempool: typing.List[Item]) -> typing.Tuple[typing.List[Location], typing.List[Item]]:
@@ -429,6 +471,7 @@ def distribute_early_items(multiworld: MultiWorld,
     return fill_locations, itempool
 
 
+@_profiled
 def distribute_items_restrictive(multiworld: MultiWorld,
                                  panic_method: typing.Literal["swap", "raise", "start_inventory"] = "swap") -> None:
     fill_locations = sorted(multiworld.get_unfilled_locations())
@@ -544,6 +587,7 @@ def distribute_items_restrictive(multiworld: MultiWorld,
         logging.info(f"Per-Player counts: {print_data})")
 
 
+@_profiled
 def flood_items(multiworld: MultiWorld) -> None:
     # get items to distribute
     multiworld.random.shuffle(multiworld.itempool)
@@ -605,6 +649,7 @@ def flood_items(multiworld: MultiWorld) -> None:
                 break
 
 
+@_profiled
 def balance_multiworld_progression(multiworld: MultiWorld) -> None:
     # A system to reduce situations where players have no checks remaining, popularly known as "BK mode."
     # Overall progression balancing algorithm:
@@ -647,7 +692,10 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
         def get_sphere_locations(sphere_state: CollectionState,
                                  locations: typing.Set[Location]) -> typing.Set[Location]:
             sphere_state.sweep_for_events(key_only=True, locations=locations)
-            return {loc for loc in locations if sphere_state.can_reach(loc)}
+            # most unchecked locations are behind unreachable regions in early spheres, their regions are cached
+            # per state, so check those before evaluating access rules that can't matter yet
+            return {loc for loc in locations
+                    if loc.parent_region.can_reach(sphere_state) and sphere_state.check_access(loc)}
 
         def item_percentage(player: int, num: int) -> float:
             return num / total_locations_count[player]
@@ -657,6 +705,7 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
             return
 
         while True:
+            sphere_start = time.perf_counter()
             # Gather non-locked locations.
             # This ensures that only shuffled locations get counted for progression balancing,
             #   i.e. the items the players will be checking.
@@ -726,30 +775,32 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                         if l not in balancing_unchecked_locations:
                             unlocked_locations[l.player].add(l)
                     items_to_replace: typing.List[Location] = []
+                    balancing_beaten = multiworld.has_beaten_game(balancing_state)
                     for player in balancing_players:
                         locations_to_test = unlocked_locations[player]
                         items_to_test = list(candidate_items[player])
                         items_to_test.sort()
                         multiworld.random.shuffle(items_to_test)
+                        # state with the candidates of player that are still in place,
+                        # updated as each one is tested instead of recollecting the others every time
+                        candidates_state = state.copy()
+                        for location in items_to_test:
+                            candidates_state.collect(location.item, True)
                         while items_to_test:
                             testing = items_to_test.pop()
-                            reducing_state = state.copy()
-                            for location in itertools.chain((
-                                l for l in items_to_replace
-                                if l.item.player == player
-                            ), items_to_test):
-                                reducing_state.collect(location.item, True, location)
-
+                            candidates_state.remove(testing.item, True)
+                            reducing_state = candidates_state.copy()
                             reducing_state.sweep_for_events(locations=locations_to_test)
 
-                            if multiworld.has_beaten_game(balancing_state):
-                                if not multiworld.has_beaten_game(reducing_state):
-                                    items_to_replace.append(testing)
+                            if balancing_beaten:
+                                replace = not multiworld.has_beaten_game(reducing_state)
                             else:
                                 reduced_sphere = get_sphere_locations(reducing_state, locations_to_test)
                                 p = item_percentage(player, reachable_locations_count[player] + len(reduced_sphere))
-                                if p < threshold_percentages[player]:
-                                    items_to_replace.append(testing)
+                                replace = p < threshold_percentages[player]
+                            if replace:
+                                items_to_replace.append(testing)
+                                candidates_state.collect(testing.item, True)
 
                     old_moved_item_count = moved_item_count
 
@@ -789,6 +840,7 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                 if location.advancement:
                     state.collect(location.item, True, location)
             checked_locations |= sphere_locations
+            logging.debug(f"Balanced sphere {sphere_num - 1} in {time.perf_counter() - sphere_start:.4f} seconds")
 
             if multiworld.has_beaten_game(state):
                 break
@@ -809,6 +861,7 @@ def swap_location_item(location_1: Location, location_2: Location, check_locked:
     location_2.item.location = location_2
 
 
+@_profiled
 def distribute_planned(multiworld: MultiWorld) -> None:
     def warn(warning: str, force: typing.Union[bool, str]) -> None:
         if force in [True, 'fail', 'failure', 'none', False, 'warn', 'warning']:
@@ -52,6 +52,10 @@ def mystery_argparse():
     parser.add_argument("--skip_output", action="store_true",
                         help="Skips generation assertion and output stages and skips multidata and spoiler output. "
                              "Intended for debugging and testing purposes.")
+    parser.add_argument("--stage_workers", default=defaults.stage_workers, type=lambda value: max(int(value), 0),
+                        help="Threads for generation steps that worlds declare as isolated per player.")
+    parser.add_argument("--profile_out", default=None,
+                        help="Writes the time and memory taken by each generation step and world to this JSON file.")
     args = parser.parse_args()
     if not os.path.isabs(args.weights_file_path):
         args.weights_file_path = os.path.join(args.player_files_path, args.weights_file_path)
@@ -155,6 +159,8 @@ def main(args=None) -> Tuple[argparse.Namespace, int]:
     erargs.outputpath = args.outputpath
     erargs.skip_prog_balancing = args.skip_prog_balancing
     erargs.skip_output = args.skip_output
+    erargs.stage_workers = args.stage_workers
+    erargs.profile_out = args.profile_out
 
     settings_cache: Dict[str, Tuple[argparse.Namespace, ...]] = \
         {fname: (tuple(roll_settings(yaml, args.plando) for yaml in yamls) if args.sameoptions else None)
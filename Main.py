@@ -5,15 +5,16 @@ import os
 import pickle
 import tempfile
 import time
+import tracemalloc
 import zipfile
 import zlib
-from typing import Dict, List, Optional, Set, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
 import worlds
 from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld, Region
 from Fill import balance_multiworld_progression, distribute_items_restrictive, distribute_planned, flood_items
 from Options import StartInventoryPool
-from Utils import __version__, output_path, version_tuple, get_settings
+from Utils import __version__, output_path, version_tuple, get_settings, GenerationProfile
 from settings import get_settings
 from worlds import AutoWorld
 from worlds.generic.Rules import exclusion_rules, locality_rules
@@ -22,6 +23,17 @@ __all__ = ["main"]
 
 
 def main(args, seed=None, baked_server_options: Optional[Dict[str, object]] = None):
+    if not args.profile_out:
+        return _main(args, seed, baked_server_options)
+    tracemalloc.start()
+    try:
+        return _main(args, seed, baked_server_options)
+    finally:
+        # also when generation fails, so memory allocations aren't traced for later generations in this process
+        tracemalloc.stop()
+
+
+def _main(args, seed=None, baked_server_options: Optional[Dict[str, object]] = None):
     if not baked_server_options:
         baked_server_options = get_settings().server_options.as_dict()
     assert isinstance(baked_server_options, dict)
@@ -36,6 +48,9 @@ def main(args, seed=None, baked_server_options: Optional[Dict[str, object]] = No
     logger = logging.getLogger()
     multiworld.set_seed(seed, args.race, str(args.outputname) if args.outputname else None)
     multiworld.plando_options = args.plando_options
+    multiworld.stage_workers = args.stage_workers
+    if args.profile_out:
+        multiworld.profile = GenerationProfile()
     multiworld.plando_items = args.plando_items.copy()
     multiworld.plando_texts = args.plando_texts.copy()
     multiworld.plando_connections = args.plando_connections.copy()
@@ -286,6 +301,8 @@ def main(args, seed=None, baked_server_options: Optional[Dict[str, object]] = No
 
     if args.skip_output:
         logger.info('Done. Skipped output/spoiler generation. Total Time: %s', time.perf_counter() - start)
+        if args.profile_out:
+            write_profile(multiworld, args.profile_out)
         return multiworld
 
     logger.info(f'Beginning output...')
@@ -296,7 +313,10 @@ def main(args, seed=None, baked_server_options: Optional[Dict[str, object]] = No
         output_players = [player for player in multiworld.player_ids if AutoWorld.World.generate_output.__code__
                           is not multiworld.worlds[player].generate_output.__code__]
         with concurrent.futures.ThreadPoolExecutor(len(output_players) + 2) as pool:
-            check_accessibility_task = pool.submit(multiworld.fulfills_accessibility)
+            # spheres are shared by the accessibility check and the multidata
+            spheres_state = CollectionState(multiworld)
+            spheres_task = pool.submit(profiled_call, multiworld, "get_spheres",
+                                       lambda: list(multiworld.get_spheres(spheres_state)))
 
             output_file_futures = [pool.submit(AutoWorld.call_stage, multiworld, "generate_output", temp_dir)]
             for player in output_players:
@@ -374,7 +394,7 @@ def main(args, seed=None, baked_server_options: Optional[Dict[str, object]] = No
 
                 # get spheres -> filter address==None -> skip empty
                 spheres: List[Dict[int, Set[int]]] = []
-                for sphere in multiworld.get_spheres():
+                for sphere in spheres_task.result():
                     current_sphere: Dict[int, Set[int]] = collections.defaultdict(set)
                     for sphere_location in sphere:
                         if type(sphere_location.address) is int:
@@ -408,8 +428,10 @@ def main(args, seed=None, baked_server_options: Optional[Dict[str, object]] = No
                     f.write(bytes([3]))  # version of format
                     f.write(multidata)
 
-            output_file_futures.append(pool.submit(write_multidata))
-            if not check_accessibility_task.result():
+            output_file_futures.append(pool.submit(profiled_call, multiworld, "write_multidata", write_multidata))
+            with multiworld.profile_step("fulfills_accessibility"):
+                accessible = multiworld.fulfills_accessibility(spheres_state, spheres_task.result())
+            if not accessible:
                 if not multiworld.can_beat_game():
                     raise Exception("Game appears as unbeatable. Aborting.")
                 else:
@@ -423,10 +445,12 @@ def main(args, seed=None, baked_server_options: Optional[Dict[str, object]] = No
 
         if args.spoiler > 1:
             logger.info('Calculating playthrough.')
-            multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
+            with multiworld.profile_step("create_playthrough"):
+                multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
 
         if args.spoiler:
-            multiworld.spoiler.to_file(os.path.join(temp_dir, '%s_Spoiler.txt' % outfilebase))
+            with multiworld.profile_step("write_spoiler"):
+                multiworld.spoiler.to_file(os.path.join(temp_dir, '%s_Spoiler.txt' % outfilebase))
 
         zipfilename = output_path(f"AP_{multiworld.seed_name}.zip")
         logger.info(f"Creating final archive at {zipfilename}")
@@ -436,4 +460,18 @@ def main(args, seed=None, baked_server_options: Optional[Dict[str, object]] = No
                 zf.write(file.path, arcname=file.name)
 
     logger.info('Done. Enjoy. Total Time: %s', time.perf_counter() - start)
+    if args.profile_out:
+        write_profile(multiworld, args.profile_out)
     return multiworld
+
+
+def profiled_call(multiworld: MultiWorld, step: str, function: Callable[[], Any]) -> Any:
+    with multiworld.profile_step(step):
+        return function()
+
+
+def write_profile(multiworld: MultiWorld, file_path: str) -> None:
+    """Writes the steps recorded in multiworld.profile as JSON."""
+    multiworld.profile.write(file_path, multiworld.game, version=__version__, seed=multiworld.seed_name,
+                             players=multiworld.players)
+    logging.info(f"Wrote generation profile to {file_path}")
@@ -8,8 +8,12 @@ import warnings
 if sys.version_info < (3, 8, 6):
     raise RuntimeError("Incompatible Python Version. 3.8.7+ is supported.")
 
+# set for processes started by one that already ran update, but that have no parent process, like a forkserver
+skip_update_variable = "AP_SKIP_MODULE_UPDATE"
+
 # don't run update if environment is frozen/compiled or if not the parent process (skip in subprocess)
-_skip_update = bool(getattr(sys, "frozen", False) or multiprocessing.parent_process())
+_skip_update = bool(getattr(sys, "frozen", False) or multiprocessing.parent_process() or
+                    os.environ.get(skip_update_variable))
 update_ran = _skip_update
 
 
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import bisect
 import collections
 import contextlib
 import copy
@@ -13,8 +14,10 @@ import itertools
 import logging
 import math
 import operator
+import os
 import pickle
 import random
+import secrets
 import threading
 import time
 import typing
@@ -143,6 +146,110 @@ class Client(Endpoint):
 team_slot = typing.Tuple[int, int]
 
 
+class DataStorage:
+    """Values clients store on the server with Set, which clients to notify when they change
+    and how much of it each slot stores."""
+    data: typing.Dict[str, typing.Any]
+    # key -> clients to notify when it changes
+    subscribers: typing.Dict[str, typing.MutableSet[Client]]
+    # key prefix -> clients to notify when any key starting with it changes
+    prefix_subscribers: typing.Dict[str, typing.MutableSet[Client]]
+    # key -> slot that last wrote it, which its size is accounted to
+    owners: typing.Dict[str, team_slot]
+    # sizes of the values and of what each slot stores, only kept while there is a slot_limit
+    sizes: typing.Dict[str, int]
+    slot_sizes: typing.Counter[team_slot]
+    _slot_limit: int
+
+    def __init__(self, slot_limit: int = 0):
+        self.subscribers = collections.defaultdict(weakref.WeakSet)
+        self.prefix_subscribers = collections.defaultdict(weakref.WeakSet)
+        self.prefix_lengths: typing.Set[int] = set()
+        self._slot_limit = slot_limit
+        self.load({})
+
+    @property
+    def slot_limit(self) -> int:
+        """approximate bytes a slot may store, 0 for no limit, which skips measuring values"""
+        return self._slot_limit
+
+    @slot_limit.setter
+    def slot_limit(self, slot_limit: int):
+        self._slot_limit = slot_limit
+        self.sizes, self.slot_sizes = self.measure() if slot_limit else ({}, collections.Counter())
+
+    def load(self, data: typing.Dict[str, typing.Any], owners: typing.Dict[str, team_slot] = {}):
+        """Replaces the stored values, keeping subscriptions."""
+        self.data = data
+        self.sorted_keys = sorted(data)
+        self.owners = {key: tuple(owner) for key, owner in owners.items() if key in data}
+        self.sizes, self.slot_sizes = self.measure() if self.slot_limit else ({}, collections.Counter())
+
+    def measure(self) -> typing.Tuple[typing.Dict[str, int], typing.Counter[team_slot]]:
+        """Sizes of the values and of what each slot stores, as kept in sizes and slot_sizes if there is a limit."""
+        sizes = {key: self.get_size(value) for key, value in self.data.items()}
+        slot_sizes: typing.Counter[team_slot] = collections.Counter()
+        for key, owner in self.owners.items():
+            slot_sizes[owner] += sizes[key]
+        return sizes, slot_sizes
+
+    @staticmethod
+    def get_size(value: typing.Any) -> int:
+        return len(pickle.dumps(value))
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        return self.data.get(key, default)
+
+    def keys_with_prefix(self, prefix: str) -> typing.List[str]:
+        start = bisect.bisect_left(self.sorted_keys, prefix)
+        end = start
+        while end < len(self.sorted_keys) and self.sorted_keys[end].startswith(prefix):
+            end += 1
+        return self.sorted_keys[start:end]
+
+    def get_size_changes(self, owner: team_slot, values: typing.Dict[str, typing.Any]) \
+            -> typing.Tuple[typing.Dict[str, int], typing.Counter[team_slot]]:
+        """Sizes of values and the change in size of each slot if owner would set them, nothing without a limit."""
+        slot_changes: typing.Counter[team_slot] = collections.Counter()
+        if not self.slot_limit:
+            return {}, slot_changes
+        sizes = {key: self.get_size(value) for key, value in values.items()}
+        for key, size in sizes.items():
+            if key in self.owners:
+                slot_changes[self.owners[key]] -= self.sizes[key]
+            slot_changes[owner] += size
+        return sizes, slot_changes
+
+    def exceeds_limit(self, slot_changes: typing.Counter[team_slot]) -> bool:
+        return bool(self.slot_limit) and any(
+            change > 0 and self.slot_sizes[owner] + change > self.slot_limit
+            for owner, change in slot_changes.items())
+
+    def set_values(self, owner: team_slot, values: typing.Dict[str, typing.Any], sizes: typing.Dict[str, int],
+                   slot_changes: typing.Counter[team_slot]):
+        for key, value in values.items():
+            if key not in self.data:
+                bisect.insort(self.sorted_keys, key)
+            self.data[key] = value
+            self.owners[key] = owner
+        self.sizes.update(sizes)
+        self.slot_sizes.update(slot_changes)
+
+    def subscribe(self, client: Client, key: str):
+        self.subscribers[key].add(client)
+
+    def subscribe_prefix(self, client: Client, prefix: str):
+        self.prefix_subscribers[prefix].add(client)
+        self.prefix_lengths.add(len(prefix))
+
+    def get_subscribers(self, key: str) -> typing.Set[Client]:
+        targets: typing.Set[Client] = set(self.subscribers.get(key, ()))
+        for length in self.prefix_lengths:
+            if length <= len(key):
+                targets.update(self.prefix_subscribers.get(key[:length], ()))
+        return targets
+
+
 class Context:
     dumper = staticmethod(encode)
     loader = staticmethod(decode)
@@ -163,9 +270,10 @@ class Context:
     hints_used: typing.Dict[typing.Tuple[int, int], int]
     groups: typing.Dict[int, typing.Set[int]]
     save_version = 2
-    stored_data: typing.Dict[str, object]
+    broadcast_batch_size = 100
+    """maximum of messages sent in one frame when broadcasting many at once"""
+    data_storage: DataStorage
     read_data: typing.Dict[str, object]
-    stored_data_notification_clients: typing.Dict[str, typing.Set[Client]]
     slot_info: typing.Dict[int, NetworkSlot]
     generator_version = Version(0, 0, 0)
     checksums: typing.Dict[str, str]
@@ -209,6 +317,8 @@ class Context:
         self.server = None
         self.countdown_timer = 0
         self.received_items = {}
+        self.new_item_slots: typing.Set[team_slot] = set()
+        self.new_items_handle: typing.Optional[asyncio.Handle] = None
         self.start_inventory = {}
         self.name_aliases: typing.Dict[team_slot, str] = {}
         self.location_checks = collections.defaultdict(set)
@@ -216,6 +326,8 @@ class Context:
         self.location_check_points = location_check_points
         self.hints_used = collections.defaultdict(int)
         self.hints: typing.Dict[team_slot, typing.Set[NetUtils.Hint]] = collections.defaultdict(set)
+        # (team, finding_player, location) -> slots holding a not yet found hint for it, with that hint
+        self.hint_index: typing.Dict[typing.Tuple[int, int, int], typing.List[typing.Tuple[int, NetUtils.Hint]]] = {}
         self.release_mode: str = release_mode
         self.remaining_mode: str = remaining_mode
         self.collect_mode: str = collect_mode
@@ -234,6 +346,14 @@ class Context:
         self.auto_save_interval = 60  # in seconds
         self.auto_saver_thread: typing.Optional[threading.Thread] = None
         self.save_dirty = False
+        # saves between snapshots only append the changes since the last save to a journal
+        self.journal_id: typing.Optional[str] = None  # snapshot the journal continues from, None to write a new one
+        self.journal_length = 0
+        self.journal_compaction_length = 30  # journal records after which the next save is a snapshot again
+        self.journaled_item_counts: typing.Dict[typing.Tuple[int, int, bool], int] = {}
+        self.unjournaled_checks: typing.Dict[team_slot, typing.Set[int]] = collections.defaultdict(set)
+        self.unjournaled_hints: typing.Set[team_slot] = set()
+        self.unjournaled_stored_data: typing.Set[str] = set()
         self.tags = ['AP']
         self.games: typing.Dict[int, str] = {}
         self.minimum_client_versions: typing.Dict[int, Version] = {}
@@ -241,10 +361,13 @@ class Context:
         self.groups = {}
         self.group_collected: typing.Dict[int, typing.Set[int]] = {}
         self.random = random.Random()
-        self.stored_data = {}
-        self.stored_data_notification_clients = collections.defaultdict(weakref.WeakSet)
+        self.data_storage = DataStorage()
+        # SetReplys to send at the end of the current event loop iteration
+        self.set_replies: typing.Dict[Client, typing.List[dict]] = {}
+        self.set_replies_handle: typing.Optional[asyncio.Handle] = None
         self.read_data = {}
         self.spheres = []
+        self.sphere_index = NetUtils.SphereIndex(self.spheres)
 
         # init empty to satisfy linter, I suppose
         self.gamespackage = {}
@@ -254,13 +377,17 @@ class Context:
         self.all_item_and_group_names = {}
         self.all_location_and_group_names = {}
         self.non_hintable_names = collections.defaultdict(frozenset)
+        self.encoded_cache: typing.Dict[typing.Hashable, NetUtils.EncodedJSON] = {}
 
         self._load_game_data()
 
     # Data package retrieval
     def _load_game_data(self):
         import worlds
-        self.gamespackage = worlds.network_data_package["games"]
+        # without groups, which clients get separately, copied to leave the data package of the worlds whole
+        self.gamespackage = {game: {key: value for key, value in game_package.items()
+                                    if key not in ("item_name_groups", "location_name_groups")}
+                             for game, game_package in worlds.network_data_package["games"].items()}
 
         self.item_name_groups = {world_name: world.item_name_groups for world_name, world in
                                  worlds.AutoWorldRegister.world_types.items()}
@@ -269,11 +396,6 @@ class Context:
         for world_name, world in worlds.AutoWorldRegister.world_types.items():
             self.non_hintable_names[world_name] = world.hint_blacklist
 
-        for game_package in self.gamespackage.values():
-            # remove groups from data sent to clients
-            del game_package["item_name_groups"]
-            del game_package["location_name_groups"]
-
     def _init_game_data(self):
         for game_name, game_package in self.gamespackage.items():
             if "checksum" in game_package:
@@ -300,6 +422,17 @@ class Context:
     def location_names_for_game(self, game: str) -> typing.Optional[typing.Dict[str, int]]:
         return self.gamespackage[game]["location_name_to_id"] if game in self.gamespackage else None
 
+    @property
+    def stored_data(self) -> typing.Dict[str, typing.Any]:
+        return self.data_storage.data
+
+    def encoded(self, key: typing.Hashable, value: typing.Callable[[], typing.Any]) -> NetUtils.EncodedJSON:
+        """Returns value() encoded for embedding into messages, cached under key until the next multidata load."""
+        encoded = self.encoded_cache.get(key)
+        if encoded is None:
+            encoded = self.encoded_cache[key] = NetUtils.EncodedJSON(self.dumper(value()))
+        return encoded
+
     # General networking
     async def send_msgs(self, endpoint: Endpoint, msgs: typing.Iterable[dict]) -> bool:
         if not endpoint.socket or not endpoint.socket.open:
@@ -412,6 +545,7 @@ class Context:
               use_embedded_server_options: bool):
 
         self.read_data = {}
+        self.encoded_cache = {}
         mdata_ver = decoded_obj["minimum_versions"]["server"]
         if mdata_ver > version_tuple:
             raise RuntimeError(f"Supplied Multidata (.archipelago) requires a server of at least version {mdata_ver},"
@@ -457,6 +591,7 @@ class Context:
 
         for slot, hints in decoded_obj["precollected_hints"].items():
             self.hints[0, slot].update(hints)
+        self.index_hints()
 
         # declare slots that aren't players as done
         for slot, slot_info in self.slot_info.items():
@@ -487,6 +622,7 @@ class Context:
 
         # sorted access spheres
         self.spheres = decoded_obj.get("spheres", [])
+        self.sphere_index = NetUtils.SphereIndex(self.spheres)
 
     # saving
 
@@ -503,27 +639,61 @@ class Context:
 
     def _save(self, exit_save: bool = False) -> bool:
         try:
-            encoded_save = pickle.dumps(self.get_save())
-            with open(self.save_filename, "wb") as f:
-                f.write(zlib.compress(encoded_save))
+            self._write_save(exit_save)
         except Exception as e:
             self.logger.exception(e)
             return False
         else:
             return True
 
+    def _write_save(self, exit_save: bool = False):
+        """Writes a snapshot of the save, or appends the changes since the last write to its journal."""
+        try:
+            if exit_save or self.journal_id is None or self.journal_length >= self.journal_compaction_length:
+                self._write_save_snapshot(self.get_save_snapshot())
+            else:
+                self._append_save_journal(self.encode_journal_record(self.get_journal_record()))
+                self.journal_length += 1
+        except BaseException:
+            # changes may be missing from the journal now, so start over from a snapshot
+            self.journal_id = None
+            raise
+
+    @property
+    def journal_filename(self) -> str:
+        return self.save_filename + "_journal"
+
+    def _write_save_snapshot(self, savedata: dict):
+        temp_filename = self.save_filename + "_temp"
+        with open(temp_filename, "wb") as f:
+            f.write(zlib.compress(pickle.dumps(savedata)))
+        os.replace(temp_filename, self.save_filename)
+        # the journal of the previous snapshot is ignored on load, but would only grow
+        with open(self.journal_filename, "wb"):
+            pass
+
+    def _append_save_journal(self, record: bytes):
+        with open(self.journal_filename, "ab") as f:
+            f.write(record)
+
+    def _read_save_journal(self) -> bytes:
+        try:
+            with open(self.journal_filename, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return b""
+
     def init_save(self, enabled: bool = True):
         self.saving = enabled
         if self.saving:
             if not self.save_filename:
-                import os
                 name, ext = os.path.splitext(self.data_filename)
                 self.save_filename = name + '.apsave' if ext.lower() in ('.archipelago', '.zip') \
                     else self.data_filename + '_' + 'apsave'
             try:
                 with open(self.save_filename, 'rb') as f:
                     save_data = restricted_loads(zlib.decompress(f.read()))
-                    self.set_save(save_data)
+                self.set_save(self.replay_journal(save_data, self._read_save_journal()))
             except FileNotFoundError:
                 self.logger.error('No save data found, starting a new game')
             except Exception as e:
@@ -559,7 +729,6 @@ class Context:
                 atexit.register(self._save, True)  # make sure we save on exit too
 
     def get_save(self) -> dict:
-        self.recheck_hints()
         d = {
             "version": self.save_version,
             "connect_names": self.connect_names,
@@ -576,16 +745,95 @@ class Context:
             "random_state": self.random.getstate(),
             "group_collected": dict(self.group_collected),
             "stored_data": self.stored_data,
-            "game_options": {"hint_cost": self.hint_cost, "location_check_points": self.location_check_points,
-                             "server_password": self.server_password, "password": self.password,
-                             "release_mode": self.release_mode,
-                             "remaining_mode": self.remaining_mode, "collect_mode": self.collect_mode,
-                             "item_cheat": self.item_cheat, "compatibility": self.compatibility}
-
+            "stored_data_owners": self.data_storage.owners,
+            "game_options": self.get_game_options(),
         }
 
         return d
 
+    def get_game_options(self) -> typing.Dict[str, typing.Any]:
+        return {"hint_cost": self.hint_cost, "location_check_points": self.location_check_points,
+                "server_password": self.server_password, "password": self.password,
+                "release_mode": self.release_mode,
+                "remaining_mode": self.remaining_mode, "collect_mode": self.collect_mode,
+                "item_cheat": self.item_cheat, "compatibility": self.compatibility}
+
+    journaled_save_keys = frozenset({"received_items", "location_checks", "hints", "stored_data",
+                                     "stored_data_owners"})
+
+    def get_save_snapshot(self) -> dict:
+        """get_save, starting a new journal that only holds the changes made after this snapshot."""
+        # reset before taking the snapshot, changes in between end up in both, which replaying tolerates
+        self.journal_id = secrets.token_hex(8)
+        self.journal_length = 0
+        self.journaled_item_counts = {key: len(items) for key, items in self.received_items.items()}
+        self.unjournaled_checks = collections.defaultdict(set)
+        self.unjournaled_hints = set()
+        self.unjournaled_stored_data = set()
+        d = self.get_save()
+        d["journal"] = self.journal_id
+        return d
+
+    def get_journal_record(self) -> dict:
+        """Changes to the big parts of the save since the last journal record, and the small parts as a whole."""
+        checks, self.unjournaled_checks = self.unjournaled_checks, collections.defaultdict(set)
+        hint_slots, self.unjournaled_hints = self.unjournaled_hints, set()
+        stored_keys, self.unjournaled_stored_data = self.unjournaled_stored_data, set()
+        received_items: typing.Dict[typing.Tuple[int, int, bool], typing.Tuple[int, typing.List[NetworkItem]]] = {}
+        for key, items in self.received_items.items():
+            start = self.journaled_item_counts.get(key, 0)
+            new_items = items[start:]
+            if new_items:
+                # received items are only ever appended, so recording their index keeps replays idempotent
+                received_items[key] = start, new_items
+                self.journaled_item_counts[key] = start + len(new_items)
+        record = {key: value for key, value in self.get_save().items() if key not in self.journaled_save_keys}
+        record.update({
+            "journal": self.journal_id,
+            "received_items": received_items,
+            "location_checks": dict(checks),
+            "hints": {team_slot: set(self.hints[team_slot]) for team_slot in hint_slots},
+            "stored_data": {key: self.stored_data[key] for key in stored_keys if key in self.stored_data},
+            "stored_data_owners": {key: self.data_storage.owners[key] for key in stored_keys
+                                   if key in self.data_storage.owners},
+        })
+        return record
+
+    @staticmethod
+    def encode_journal_record(record: dict) -> bytes:
+        data = zlib.compress(pickle.dumps(record))
+        return len(data).to_bytes(4, "big") + data
+
+    @staticmethod
+    def replay_journal(savedata: dict, journal: bytes) -> dict:
+        """Applies the records of journal that belong to the snapshot savedata to it."""
+        position = 0
+        while position < len(journal):
+            length = int.from_bytes(journal[position:position + 4], "big")
+            data = journal[position + 4:position + 4 + length]
+            position += 4 + length
+            try:
+                record = restricted_loads(zlib.decompress(data))
+            except Exception as e:
+                # a crash while appending leaves an incomplete record at the end
+                logging.warning(f"Could not replay the rest of the save journal: {e}")
+                break
+            if record.pop("journal") != savedata.get("journal"):
+                continue  # left over from an earlier snapshot
+            received_items = record.pop("received_items")
+            if any(start > len(savedata["received_items"].get(key, ())) for key, (start, _) in received_items.items()):
+                logging.warning("Could not replay the rest of the save journal: it is missing received items.")
+                break
+            for key, (start, items) in received_items.items():
+                savedata["received_items"].setdefault(key, [])[start:start + len(items)] = items
+            for key, locations in record.pop("location_checks").items():
+                savedata["location_checks"][key] = savedata["location_checks"].get(key, set()) | locations
+            savedata["hints"].update(record.pop("hints"))
+            savedata.setdefault("stored_data", {}).update(record.pop("stored_data"))
+            savedata.setdefault("stored_data_owners", {}).update(record.pop("stored_data_owners", {}))
+            savedata.update(record)
+        return savedata
+
     def set_save(self, savedata: dict):
         if self.connect_names != savedata["connect_names"]:
             raise Exception("This savegame does not appear to match the loaded multiworld.")
@@ -605,6 +853,11 @@ class Context:
              in savedata["client_activity_timers"]})
         self.location_checks.update(savedata["location_checks"])
         self.random.setstate(savedata["random_state"])
+        # don't continue a journal that may end in a torn record, the next save writes a snapshot instead
+        self.journal_id = None
+        # saves before hints were kept up to date on each check can hold outdated ones
+        self.recheck_hints()
+        self.index_hints()
 
         if "game_options" in savedata:
             self.hint_cost = savedata["game_options"]["hint_cost"]
@@ -621,7 +874,7 @@ class Context:
             self.group_collected = savedata["group_collected"]
 
         if "stored_data" in savedata:
-            self.stored_data = savedata["stored_data"]
+            self.data_storage.load(savedata["stored_data"], savedata.get("stored_data_owners", {}))
         # count items and slots from lists for items_handling = remote
         self.logger.info(
             f'Loaded save file with {sum([len(v) for k, v in self.received_items.items() if k[2]])} received items '
@@ -637,25 +890,62 @@ class Context:
     def recheck_hints(self, team: typing.Optional[int] = None, slot: typing.Optional[int] = None):
         for hint_team, hint_slot in self.hints:
             if (team is None or team == hint_team) and (slot is None or slot == hint_slot):
+                self.unjournaled_hints.add((hint_team, hint_slot))
                 self.hints[hint_team, hint_slot] = {
                     hint.re_check(self, hint_team) for hint in
                     self.hints[hint_team, hint_slot]
                 }
 
     def get_rechecked_hints(self, team: int, slot: int):
-        self.recheck_hints(team, slot)
+        # found hints are updated as their locations get checked, see hints_found
         return self.hints[team, slot]
 
+    def index_hints(self):
+        """Rebuilds hint_index from hints."""
+        self.hint_index = {}
+        for (team, slot), hints in self.hints.items():
+            for hint in hints:
+                self.index_hint(team, slot, hint)
+
+    def index_hint(self, team: int, slot: int, hint: NetUtils.Hint):
+        if not hint.found:
+            self.hint_index.setdefault((team, hint.finding_player, hint.location), []).append((slot, hint))
+
+    def hints_found(self, team: int, finding_player: int, locations: typing.Iterable[int]) -> typing.Set[int]:
+        """Marks the hints for these newly checked locations as found, returns the slots whose hints changed."""
+        changed_slots: typing.Set[int] = set()
+        for location in locations:
+            for slot, hint in self.hint_index.pop((team, finding_player, location), ()):
+                hints = self.hints[team, slot]
+                if hint in hints:
+                    hints.remove(hint)
+                    hints.add(hint.re_check(self, team))
+                    changed_slots.add(slot)
+        self.unjournaled_hints.update((team, slot) for slot in changed_slots)
+        return changed_slots
+
     def get_sphere(self, player: int, location_id: int) -> int:
         """Get sphere of a location, -1 if spheres are not available."""
-        if self.spheres:
-            for i, sphere in enumerate(self.spheres):
-                if location_id in sphere.get(player, set()):
-                    return i
-            raise KeyError(f"No Sphere found for location ID {location_id} belonging to player {player}. "
-                           f"Location or player may not exist.")
+        if self.sphere_index:
+            return self.sphere_index.get_sphere(player, location_id)
         return -1
 
+    def get_checked_spheres(self, team: int, slot: int) -> typing.Dict[int, int]:
+        """Get the sphere of each checked location of a slot, empty if spheres are not available."""
+        return self.sphere_index.get_spheres(slot, self.location_checks[team, slot])
+
+    def get_datapackage_checksums(self) -> typing.Dict[str, str]:
+        return {game: game_data["checksum"] for game, game_data in self.gamespackage.items()
+                if game in get_room_games(self) and "checksum" in game_data}
+
+    def hydrate(self):
+        """Called before clients need more than RoomInfo, for contexts that defer loading their multidata."""
+        pass
+
+    async def hydrate_async(self):
+        """Awaitable hydrate, contexts can override it to load their multidata without blocking the event loop."""
+        self.hydrate()
+
     def get_players_package(self):
         return [NetworkPlayer(t, p, self.get_aliased_name(t, p), n) for (t, p), n in self.player_names.items()]
 
@@ -710,12 +1000,15 @@ class Context:
                 # we can check once if hint already exists
                 if hint not in self.hints[team, hint.finding_player]:
                     self.hints[team, hint.finding_player].add(hint)
+                    self.index_hint(team, hint.finding_player, hint)
                     new_hint_events.add(hint.finding_player)
                     for player in self.slot_set(hint.receiving_player):
                         self.hints[team, player].add(hint)
+                        self.index_hint(team, player, hint)
                         new_hint_events.add(player)
 
             self.logger.info("Notice (Team #%d): %s" % (team + 1, format_hint(self, team, hint)))
+        self.unjournaled_hints.update((team, slot) for slot in new_hint_events)
         for slot in new_hint_events:
             self.on_new_hint(team, slot)
         for slot, hint_data in concerns.items():
@@ -724,8 +1017,9 @@ class Context:
                 if not clients:
                     continue
                 client_hints = [datum[1] for datum in sorted(hint_data, key=lambda x: x[0].finding_player != slot)]
+                encoded_hints = self.dumper(client_hints)
                 for client in clients:
-                    async_start(self.send_msgs(client, client_hints))
+                    async_start(self.send_encoded_msgs(client, encoded_hints))
 
     # "events"
 
@@ -748,15 +1042,13 @@ class Context:
 
     def on_changed_hints(self, team: int, slot: int):
         key: str = f"_read_hints_{team}_{slot}"
-        targets: typing.Set[Client] = set(self.stored_data_notification_clients[key])
-        if targets:
-            self.broadcast(targets, [{"cmd": "SetReply", "key": key, "value": self.hints[team, slot]}])
+        send_set_reply(self, self.data_storage.get_subscribers(key),
+                       {"cmd": "SetReply", "key": key, "value": self.hints[team, slot]})
 
     def on_client_status_change(self, team: int, slot: int):
         key: str = f"_read_client_status_{team}_{slot}"
-        targets: typing.Set[Client] = set(self.stored_data_notification_clients[key])
-        if targets:
-            self.broadcast(targets, [{"cmd": "SetReply", "key": key, "value": self.client_game_state[team, slot]}])
+        send_set_reply(self, self.data_storage.get_subscribers(key),
+                       {"cmd": "SetReply", "key": key, "value": self.client_game_state[team, slot]})
 
 
 def update_aliases(ctx: Context, team: int):
@@ -781,8 +1073,7 @@ async def server(websocket, path: str = "/", ctx: Context = None):
         async for data in websocket:
             if ctx.log_network:
                 ctx.logger.info(f"Incoming message: {data}")
-            for msg in decode(data):
-                await process_client_cmd(ctx, client, msg)
+            await process_client_cmds(ctx, client, decode(data))
     except Exception as e:
         if not isinstance(e, websockets.WebSocketException):
             ctx.logger.exception(e)
@@ -792,19 +1083,17 @@ async def server(websocket, path: str = "/", ctx: Context = None):
         await ctx.disconnect(client)
 
 
-async def on_client_connected(ctx: Context, client: Client):
-    players = []
-    for team, clients in ctx.clients.items():
-        for slot, connected_clients in clients.items():
-            if connected_clients:
-                name = ctx.player_names[team, slot]
-                players.append(NetworkPlayer(team, slot, ctx.name_aliases.get((team, slot), name), name))
+def get_room_games(ctx: Context) -> typing.Set[str]:
     games = {ctx.games[x] for x in range(1, len(ctx.games) + 1)}
     games.add("Archipelago")
+    return games
+
+
+async def on_client_connected(ctx: Context, client: Client):
     await ctx.send_msgs(client, [{
         'cmd': 'RoomInfo',
         'password': bool(ctx.password),
-        'games': games,
+        'games': ctx.encoded("RoomInfo games", lambda: get_room_games(ctx)),
         # tags are for additional features in the communication.
         # Name them by feature or fork, as you feel is appropriate.
         'tags': ctx.tags,
@@ -813,8 +1102,7 @@ async def on_client_connected(ctx: Context, client: Client):
         'permissions': get_permissions(ctx),
         'hint_cost': ctx.hint_cost,
         'location_check_points': ctx.location_check_points,
-        'datapackage_checksums': {game: game_data["checksum"] for game, game_data
-                                  in ctx.gamespackage.items() if game in games and "checksum" in game_data},
+        'datapackage_checksums': ctx.encoded("RoomInfo datapackage_checksums", ctx.get_datapackage_checksums),
         'seed_name': ctx.seed_name,
         'time': time.time(),
     }])
@@ -940,20 +1228,66 @@ def get_start_inventory(ctx: Context, player: int, remote_start_inventory: bool)
 
 
 def send_new_items(ctx: Context):
-    for team, clients in ctx.clients.items():
-        for slot, clients in clients.items():
-            for client in clients:
-                if client.no_items:
-                    continue
-                start_inventory = get_start_inventory(ctx, slot, client.remote_start_inventory)
-                items = get_received_items(ctx, team, slot, client.remote_items)
-                if len(start_inventory) + len(items) > client.send_index:
+    """Sends new items to the clients of the slots in ctx.new_item_slots at the end of the current event loop
+    iteration, so all items sent to a client until then go out as one ReceivedItems."""
+    if ctx.new_items_handle or not ctx.new_item_slots:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        flush_new_items(ctx)
+    else:
+        ctx.new_items_handle = loop.call_soon(flush_new_items, ctx)
+
+
+def flush_new_items(ctx: Context):
+    ctx.new_items_handle = None
+    new_item_slots, ctx.new_item_slots = ctx.new_item_slots, set()
+    for team, slot in new_item_slots:
+        # clients of a slot that are caught up the same way get the same message, encode it once for all of them
+        encoded_msgs: typing.Dict[typing.Tuple[int, bool, bool], str] = {}
+        for client in ctx.clients.get(team, {}).get(slot, ()):
+            if client.no_items:
+                continue
+            start_inventory = get_start_inventory(ctx, slot, client.remote_start_inventory)
+            items = get_received_items(ctx, team, slot, client.remote_items)
+            if len(start_inventory) + len(items) > client.send_index:
+                key = client.send_index, client.remote_items, client.remote_start_inventory
+                msg = encoded_msgs.get(key)
+                if msg is None:
                     first_new_item = max(0, client.send_index - len(start_inventory))
-                    async_start(ctx.send_msgs(client, [{
+                    msg = encoded_msgs[key] = ctx.dumper([{
                         "cmd": "ReceivedItems",
                         "index": client.send_index,
-                        "items": start_inventory[client.send_index:] + items[first_new_item:]}]))
-                    client.send_index = len(start_inventory) + len(items)
+                        "items": start_inventory[client.send_index:] + items[first_new_item:]}])
+                async_start(ctx.send_encoded_msgs(client, msg))
+                client.send_index = len(start_inventory) + len(items)
+
+
+def send_set_reply(ctx: Context, targets: typing.Iterable[Client], reply: dict):
+    """Sends reply to targets at the end of the current event loop iteration,
+    so all SetReplys sent to a client until then go out as one message."""
+    for target in targets:
+        ctx.set_replies.setdefault(target, []).append(reply)
+    if ctx.set_replies_handle or not ctx.set_replies:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        flush_set_replies(ctx)
+    else:
+        ctx.set_replies_handle = loop.call_soon(flush_set_replies, ctx)
+
+
+def flush_set_replies(ctx: Context):
+    ctx.set_replies_handle = None
+    set_replies, ctx.set_replies = ctx.set_replies, {}
+    # clients watching the same keys get the same replies, encode them once for all of them
+    targets: typing.Dict[typing.Tuple[int, ...], typing.List[Client]] = {}
+    for client, replies in set_replies.items():
+        targets.setdefault(tuple(id(reply) for reply in replies), []).append(client)
+    for clients in targets.values():
+        ctx.broadcast(clients, set_replies[clients[0]])
 
 
 def update_checked_locations(ctx: Context, team: int, slot: int):
@@ -979,8 +1313,11 @@ def collect_player(ctx: Context, team: int, slot: int, is_group: bool = False):
                            % (ctx.player_names[(team, slot)], team + 1),
                            {"type": "Collect", "team": team, "slot": slot})
     for source_player, location_ids in all_locations.items():
-        register_location_checks(ctx, team, source_player, location_ids, count_activity=False)
+        register_location_checks(ctx, team, source_player, location_ids, count_activity=False, batched=True)
         update_checked_locations(ctx, team, source_player)
+    if all_locations:
+        send_new_items(ctx)
+        ctx.save()
 
     if not is_group:
         for group, group_players in ctx.groups.items():
@@ -996,7 +1333,9 @@ def get_remaining(ctx: Context, team: int, slot: int) -> typing.List[int]:
 
 
 def send_items_to(ctx: Context, team: int, target_slot: int, *items: NetworkItem):
+    """Adds items to the received items of target_slot and its groups, send_new_items then delivers them."""
     for target in ctx.slot_set(target_slot):
+        ctx.new_item_slots.add((team, target))
         for item in items:
             if item.player != target_slot:
                 get_received_items(ctx, team, target, False).append(item)
@@ -1004,12 +1343,15 @@ def send_items_to(ctx: Context, team: int, target_slot: int, *items: NetworkItem
 
 
 def register_location_checks(ctx: Context, team: int, slot: int, locations: typing.Iterable[int],
-                             count_activity: bool = True):
+                             count_activity: bool = True, batched: bool = False):
+    """Checks locations of slot and sends their items. batched leaves delivering the items and saving to the caller,
+    to do once after registering the checks of many slots."""
     new_locations = set(locations) - ctx.location_checks[team, slot]
     new_locations.intersection_update(ctx.locations[slot])  # ignore location IDs unknown to this multidata
     if new_locations:
         if count_activity:
             ctx.client_activity_timers[team, slot] = datetime.datetime.now(datetime.timezone.utc)
+        info_texts: typing.List[dict] = []
         for location in new_locations:
             item_id, target_player, flags = ctx.locations[slot][location]
             new_item = NetworkItem(item_id, location, slot, flags)
@@ -1018,21 +1360,24 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
             ctx.logger.info('(Team #%d) %s sent %s to %s (%s)' % (
                 team + 1, ctx.player_names[(team, slot)], ctx.item_names[ctx.slot_info[target_player].game][item_id],
                 ctx.player_names[(team, target_player)], ctx.location_names[ctx.slot_info[slot].game][location]))
-            info_text = json_format_send_event(new_item, target_player)
-            ctx.broadcast_team(team, [info_text])
+            info_texts.append(json_format_send_event(new_item, target_player))
+        # releases can send thousands of items, so send their texts in batches instead of a frame each
+        for start in range(0, len(info_texts), ctx.broadcast_batch_size):
+            ctx.broadcast_team(team, info_texts[start:start + ctx.broadcast_batch_size])
 
         ctx.location_checks[team, slot] |= new_locations
-        send_new_items(ctx)
+        ctx.unjournaled_checks[team, slot] |= new_locations
+        if not batched:
+            send_new_items(ctx)
         ctx.broadcast(ctx.clients[team][slot], [{
             "cmd": "RoomUpdate",
             "hint_points": get_slot_points(ctx, team, slot),
             "checked_locations": new_locations,  # send back new checks only
         }])
-        old_hints = ctx.hints[team, slot].copy()
-        ctx.recheck_hints(team, slot)
-        if old_hints != ctx.hints[team, slot]:
-            ctx.on_changed_hints(team, slot)
-        ctx.save()
+        for hint_slot in ctx.hints_found(team, slot, new_locations):
+            ctx.on_changed_hints(team, hint_slot)
+        if not batched:
+            ctx.save()
 
 
 def collect_hints(ctx: Context, team: int, slot: int, item: typing.Union[int, str]) -> typing.List[NetUtils.Hint]:
@@ -1458,6 +1803,7 @@ class ClientMessageProcessor(CommonCommandProcessor):
                 new_item = NetworkItem(names[item_name], -1, self.client.slot)
                 get_received_items(self.ctx, self.client.team, self.client.slot, False).append(new_item)
                 get_received_items(self.ctx, self.client.team, self.client.slot, True).append(new_item)
+                self.ctx.new_item_slots.add((self.client.team, self.client.slot))
                 self.ctx.broadcast_text_all(
                     'Cheat console: sending "' + item_name + '" to ' + self.ctx.get_aliased_name(self.client.team,
                                                                                                  self.client.slot),
@@ -1476,9 +1822,7 @@ class ClientMessageProcessor(CommonCommandProcessor):
         cost = self.ctx.get_hint_cost(self.client.slot)
 
         if not input_text:
-            hints = {hint.re_check(self.ctx, self.client.team) for hint in
-                     self.ctx.hints[self.client.team, self.client.slot]}
-            self.ctx.hints[self.client.team, self.client.slot] = hints
+            hints = self.ctx.get_rechecked_hints(self.client.team, self.client.slot)
             self.ctx.notify_hints(self.client.team, list(hints), recipients=(self.client.slot,))
             self.output(f"A hint costs {self.ctx.get_hint_cost(self.client.slot)} points. "
                         f"You have {points_available} points.")
@@ -1616,6 +1960,10 @@ class ClientMessageProcessor(CommonCommandProcessor):
         return self.get_hints(location, True)
 
 
+def get_encoded_game_package(ctx: Context, game: str) -> NetUtils.EncodedJSON:
+    return NetUtils.encode_game_package(ctx.gamespackage[game])
+
+
 def get_checked_checks(ctx: Context, team: int, slot: int) -> typing.List[int]:
     return ctx.locations.get_checked(ctx.location_checks, team, slot)
 
@@ -1634,6 +1982,84 @@ def get_slot_points(ctx: Context, team: int, slot: int) -> int:
             ctx.get_hint_cost(slot) * ctx.hints_used[team, slot])
 
 
+# operations that change the value they are applied to instead of returning a new one
+mutating_operations = {"remove", "pop", "update"}
+
+
+async def process_client_cmds(ctx: Context, client: Client, msgs: typing.List[dict]):
+    """Processes the commands a client sent in one message, consecutive Sets of an authenticated client together."""
+    set_cmds: typing.List[dict] = []
+    for msg in msgs:
+        if client.auth and type(msg) == dict and msg.get("cmd") == "Set":
+            set_cmds.append(msg)
+            continue
+        if set_cmds:
+            await process_set_cmds(ctx, client, set_cmds)
+            set_cmds = []
+        if client in ctx.set_replies:
+            # answer the Sets before the commands sent after them, the other clients still get theirs batched
+            await ctx.send_msgs(client, ctx.set_replies.pop(client))
+        await process_client_cmd(ctx, client, msg)
+    if set_cmds:
+        await process_set_cmds(ctx, client, set_cmds)
+
+
+def changes_in_place(ctx: Context, set_cmds: typing.List[dict], operations: typing.List[dict],
+                     targets: typing.Set[Client]) -> bool:
+    """Whether a Set may change its value in place instead of a copy. Only a lone Set with one mutating operation,
+    that changes nothing if it fails, may, if no SetReply and no size limit need the previous value."""
+    if len(set_cmds) > 1 or len(operations) > 1 or targets or ctx.set_replies or ctx.data_storage.slot_limit:
+        return False
+    # updating with a list of pairs can fail halfway through
+    return operations[0]["operation"] != "update" or type(operations[0]["value"]) == dict
+
+
+async def process_set_cmds(ctx: Context, client: Client, set_cmds: typing.List[dict]):
+    """Applies all Set commands or, if any of them is invalid, none of them."""
+    values: typing.Dict[str, typing.Any] = {}  # new values, later Sets of a key build on the earlier ones
+    replies: typing.List[typing.Tuple[typing.Set[Client], dict]] = []
+    for args in set_cmds:
+        key = args.get("key", None)
+        if type(key) != str or key.startswith("_read_") or type(args.get("operations", None)) != list:
+            await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
+                                          "text": 'Set', "original_cmd": "Set"}])
+            return
+        targets = ctx.data_storage.get_subscribers(key)
+        if args.get("want_reply", True):
+            targets.add(client)
+        original_value = values[key] if key in values else ctx.stored_data.get(key, args.get("default", 0))
+        value = original_value
+        try:
+            # otherwise discarded Sets and queued SetReplys would see the changes
+            if any(operation["operation"] in mutating_operations for operation in args["operations"]) and \
+                    not changes_in_place(ctx, set_cmds, args["operations"], targets):
+                value = copy.copy(value)
+            for operation in args["operations"]:
+                value = modify_functions[operation["operation"]](value, operation["value"])
+        except Exception as e:
+            await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
+                                          "text": f'Set: Could not apply operations to {key}: {e!r}',
+                                          "original_cmd": "Set"}])
+            return
+        values[key] = value
+        replies.append((targets, {**args, "cmd": "SetReply", "original_value": original_value, "value": value}))
+
+    owner = client.team, client.slot
+    sizes, slot_changes = ctx.data_storage.get_size_changes(owner, values)
+    if ctx.data_storage.exceeds_limit(slot_changes):
+        await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
+                                      "text": f'Set: Exceeds the data storage limit of '
+                                              f'{Utils.format_SI_prefix(ctx.data_storage.slot_limit, power=1024)}B '
+                                              f'per slot',
+                                      "original_cmd": "Set"}])
+        return
+    ctx.data_storage.set_values(owner, values, sizes, slot_changes)
+    ctx.unjournaled_stored_data.update(values)
+    for targets, reply in replies:
+        send_set_reply(ctx, targets, reply)
+    ctx.save()
+
+
 async def process_client_cmd(ctx: Context, client: Client, args: dict):
     try:
         cmd: str = args["cmd"]
@@ -1648,6 +2074,9 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                                       "text": f"Command should be str, got {type(cmd)}"}])
         return
 
+    if cmd in {"Connect", "GetDataPackage"}:
+        await ctx.hydrate_async()
+
     if cmd == 'Connect':
         if not args or 'password' not in args or type(args['password']) not in [str, type(None)] or \
                 'game' not in args:
@@ -1703,7 +2132,7 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                 "players": ctx.get_players_package(),
                 "missing_locations": get_missing_checks(ctx, team, slot),
                 "checked_locations": get_checked_checks(ctx, team, slot),
-                "slot_info": ctx.slot_info,
+                "slot_info": ctx.encoded("slot_info", lambda: ctx.slot_info),
                 "hint_points": get_slot_points(ctx, team, slot),
             }
             reply = [connected_packet]
@@ -1722,14 +2151,14 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
     elif cmd == "GetDataPackage":
         exclusions = args.get("exclusions", [])
         if "games" in args:
-            games = {name: game_data for name, game_data in ctx.gamespackage.items()
+            games = {name: get_encoded_game_package(ctx, name) for name in ctx.gamespackage
                      if name in set(args.get("games", []))}
             await ctx.send_msgs(client, [{"cmd": "DataPackage",
                                           "data": {"games": games}}])
         # TODO: remove exclusions behaviour around 0.5.0
         elif exclusions:
             exclusions = set(exclusions)
-            games = {name: game_data for name, game_data in ctx.gamespackage.items()
+            games = {name: get_encoded_game_package(ctx, name) for name in ctx.gamespackage
                      if name not in exclusions}
 
             package = {"games": games}
@@ -1738,7 +2167,9 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
 
         else:
             await ctx.send_msgs(client, [{"cmd": "DataPackage",
-                                          "data": {"games": ctx.gamespackage}}])
+                                          "data": ctx.encoded("DataPackage", lambda: {"games": {
+                                              name: get_encoded_game_package(ctx, name)
+                                              for name in ctx.gamespackage}})}])
 
     elif client.auth:
         if cmd == "ConnectUpdate":
@@ -1846,35 +2277,29 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                      ctx.stored_data.get(key, None)
                 for key in keys
             }
+            prefixes = args.get("prefixes", [])
+            if type(prefixes) == list:
+                for prefix in prefixes:
+                    if type(prefix) == str:
+                        for key in ctx.data_storage.keys_with_prefix(prefix):
+                            args["keys"][key] = ctx.stored_data[key]
             await ctx.send_msgs(client, [args])
 
         elif cmd == "Set":
-            if "key" not in args or args["key"].startswith("_read_") or \
-                    "operations" not in args or not type(args["operations"]) == list:
-                await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
-                                              "text": 'Set', "original_cmd": cmd}])
-                return
-            args["cmd"] = "SetReply"
-            value = ctx.stored_data.get(args["key"], args.get("default", 0))
-            args["original_value"] = copy.copy(value)
-            for operation in args["operations"]:
-                func = modify_functions[operation["operation"]]
-                value = func(value, operation["value"])
-            ctx.stored_data[args["key"]] = args["value"] = value
-            targets = set(ctx.stored_data_notification_clients[args["key"]])
-            if args.get("want_reply", True):
-                targets.add(client)
-            if targets:
-                ctx.broadcast(targets, [args])
-            ctx.save()
+            await process_set_cmds(ctx, client, [args])
 
         elif cmd == "SetNotify":
-            if "keys" not in args or type(args["keys"]) != list:
+            keys = args.get("keys", [])
+            prefixes = args.get("prefixes", [])
+            if ("keys" not in args and "prefixes" not in args) or type(keys) != list or type(prefixes) != list or \
+                    not all(type(prefix) == str for prefix in prefixes):
                 await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
                                               "text": 'SetNotify', "original_cmd": cmd}])
                 return
-            for key in args["keys"]:
-                ctx.stored_data_notification_clients[key].add(client)
+            for key in keys:
+                ctx.data_storage.subscribe(client, key)
+            for prefix in prefixes:
+                ctx.data_storage.subscribe_prefix(client, prefix)
 
 
 def update_client_status(ctx: Context, client: Client, new_status: ClientStatus):
@@ -2198,14 +2623,16 @@ class ServerCommandProcessor(CommonCommandProcessor):
 
     def _cmd_datastore(self):
         """Debug Tool: list writable datastorage keys and approximate the size of their values with pickle."""
-        total: int = 0
-        texts = []
-        for key, value in self.ctx.stored_data.items():
-            size = len(pickle.dumps(value))
-            total += size
-            texts.append(f"Key: {key} | Size: {size}B")
-        texts.insert(0, f"Found {len(self.ctx.stored_data)} keys, "
+        data_storage = self.ctx.data_storage
+        sizes, slot_sizes = data_storage.measure()
+        texts = [f"Key: {key} | Size: {size}B" for key, size in sizes.items()]
+        total = sum(sizes.values())
+        texts.insert(0, f"Found {len(sizes)} keys, "
                         f"approximately totaling {Utils.format_SI_prefix(total, power=1024)}B")
+        for (team, slot), size in slot_sizes.most_common():
+            if size:
+                texts.append(f"{self.ctx.get_aliased_name(team, slot)} (Team #{team + 1}) | "
+                             f"Size: {Utils.format_SI_prefix(size, power=1024)}B")
         self.output("\n".join(texts))
 
 
@@ -2284,6 +2711,8 @@ def parse_args() -> argparse.Namespace:
     #0 -> recommended for tournaments to force a level playing field, only allow an exact version match
     """)
     parser.add_argument('--log_network', default=defaults["log_network"], action="store_true")
+    parser.add_argument('--datastorage_slot_limit', default=defaults["datastorage_slot_limit"], type=int,
+                        help="approximate bytes each slot may store in the data storage, 0 for no limit")
     args = parser.parse_args()
     return args
 
@@ -2329,6 +2758,7 @@ async def main(args: argparse.Namespace):
                   args.hint_cost, not args.disable_item_cheat, args.release_mode, args.collect_mode,
                   args.remaining_mode,
                   args.auto_shutdown, args.compatibility, args.log_network)
+    ctx.data_storage.slot_limit = args.datastorage_slot_limit
     data_filename = args.multidata
 
     if not data_filename:
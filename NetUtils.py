@@ -1,7 +1,13 @@
 from __future__ import annotations
 
+import array
+import bisect
+import collections
 import typing
 import enum
+import re
+import secrets
+import threading
 import warnings
 from json import JSONEncoder, JSONDecoder
 
@@ -82,27 +88,83 @@ class NetworkItem(typing.NamedTuple):
     flags: int = 0
 
 
-def _scan_for_TypedTuples(obj: typing.Any) -> typing.Any:
+class EncodedJSON(str):
+    """JSON that encode embeds as is, so parts of messages that rarely change only have to be encoded once."""
+
+
+# control characters are always escaped, so this can't show up in encoded output unless it is a placeholder
+_fragment_placeholder = f"\x00{secrets.token_hex(8)}:"
+
+
+def _scan_for_TypedTuples(obj: typing.Any, fragments: typing.List[EncodedJSON]) -> typing.Any:
     if isinstance(obj, tuple) and hasattr(obj, "_fields"):  # NamedTuple is not actually a parent class
         data = obj._asdict()
         data["class"] = obj.__class__.__name__
         return data
     if isinstance(obj, (tuple, list, set, frozenset)):
-        return tuple(_scan_for_TypedTuples(o) for o in obj)
+        return tuple(_scan_for_TypedTuples(o, fragments) for o in obj)
     if isinstance(obj, dict):
-        return {key: _scan_for_TypedTuples(value) for key, value in obj.items()}
+        return {key: _scan_for_TypedTuples(value, fragments) for key, value in obj.items()}
+    if isinstance(obj, EncodedJSON):
+        fragments.append(obj)
+        return f"{_fragment_placeholder}{len(fragments) - 1}"
     return obj
 
 
-_encode = JSONEncoder(
+_json_encode = JSONEncoder(
     ensure_ascii=False,
     check_circular=False,
     separators=(',', ':'),
 ).encode
 
+try:
+    import orjson
+except ImportError:
+    _encode = _json_encode
+else:
+    def _encode(obj: typing.Any) -> str:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+        except orjson.JSONEncodeError:
+            # integers beyond 64 bit and the like
+            return _json_encode(obj)
+
+
+_encoded_fragment = re.compile(re.escape(_encode(_fragment_placeholder)[:-1]) + r'(\d+)"')
+
 
 def encode(obj: typing.Any) -> str:
-    return _encode(_scan_for_TypedTuples(obj))
+    fragments: typing.List[EncodedJSON] = []
+    encoded = _encode(_scan_for_TypedTuples(obj, fragments))
+    if fragments:
+        # single pass, as fragments can be megabytes of data package
+        encoded = _encoded_fragment.sub(lambda match: fragments[int(match[1])], encoded)
+    return encoded
+
+
+encoded_game_packages_limit = 64
+_encoded_game_packages: typing.OrderedDict[typing.Tuple[str, ...], EncodedJSON] = collections.OrderedDict()
+_encoded_game_packages_lock = threading.Lock()
+
+
+def encode_game_package(game_package: typing.Mapping[str, typing.Any]) -> EncodedJSON:
+    """Encodes a game's data package once per checksum for the whole process, so every room and endpoint serving
+    the same package shares the encoding. Packages without a checksum are encoded every time."""
+    if "checksum" not in game_package:
+        return EncodedJSON(encode(game_package))
+    # the WebHost serves packages without their name groups under the same checksum
+    key = (game_package["checksum"], *game_package)
+    with _encoded_game_packages_lock:
+        encoded = _encoded_game_packages.get(key)
+        if encoded is not None:
+            _encoded_game_packages.move_to_end(key)
+            return encoded
+    encoded = EncodedJSON(encode(game_package))
+    with _encoded_game_packages_lock:
+        _encoded_game_packages[key] = encoded
+        while len(_encoded_game_packages) > encoded_game_packages_limit:
+            _encoded_game_packages.popitem(last=False)
+    return encoded
 
 
 def get_any_version(data: dict) -> Version:
@@ -427,3 +489,41 @@ else:
             warnings.warn("_speedups not available. Falling back to pure python LocationStore. "
                           "Install a matching C++ compiler for your platform to compile _speedups.")
             LocationStore = _LocationStore
+
+
+class SphereIndex:
+    """Sphere of each location, as location IDs sorted per player with a parallel array of their spheres.
+    Costs 12 bytes per location instead of a dict entry."""
+    _location_ids: typing.Dict[int, array.array]
+    _spheres: typing.Dict[int, array.array]
+
+    def __init__(self, spheres: typing.Sequence[typing.Mapping[int, typing.Iterable[int]]]):
+        player_locations: typing.Dict[int, typing.List[typing.Tuple[int, int]]] = collections.defaultdict(list)
+        for sphere_number, sphere in enumerate(spheres):
+            for player, location_ids in sphere.items():
+                player_locations[player].extend((location_id, sphere_number) for location_id in location_ids)
+        self._location_ids = {}
+        self._spheres = {}
+        for player, locations in player_locations.items():
+            locations.sort()
+            self._location_ids[player] = array.array("q", (location_id for location_id, _ in locations))
+            self._spheres[player] = array.array("I", (sphere_number for _, sphere_number in locations))
+
+    def __bool__(self) -> bool:
+        return bool(self._location_ids)
+
+    def get_sphere(self, player: int, location_id: int) -> int:
+        location_ids = self._location_ids.get(player, ())
+        index = bisect.bisect_left(location_ids, location_id)
+        if index == len(location_ids) or location_ids[index] != location_id:
+            raise KeyError(f"No Sphere found for location ID {location_id} belonging to player {player}. "
+                           f"Location or player may not exist.")
+        return self._spheres[player][index]
+
+    def get_spheres(self, player: int, location_ids: typing.Optional[typing.Container[int]] = None
+                    ) -> typing.Dict[int, int]:
+        """Returns location ID -> sphere for all locations of player, or only those in location_ids."""
+        player_spheres = zip(self._location_ids.get(player, ()), self._spheres.get(player, ()))
+        if location_ids is None:
+            return dict(player_spheres)
+        return {location_id: sphere for location_id, sphere in player_spheres if location_id in location_ids}
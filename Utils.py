@@ -15,6 +15,9 @@ import collections
 import importlib
 import logging
 import warnings
+import threading
+import time
+import contextlib
 
 from argparse import Namespace
 from settings import Settings, get_settings
@@ -849,6 +852,50 @@ class DeprecateDict(dict):
         return super().__getitem__(item)
 
 
+class GenerationProfile:
+    """Wall time and allocation deltas of the steps of a generation, written as JSON with --profile_out.
+    Memory is only measured while tracemalloc is tracing. It is process wide, so steps running in parallel threads
+    see each other's allocations."""
+    steps: typing.List[Dict[str, Any]]
+
+    def __init__(self) -> None:
+        self.steps = []
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def measure(self, step: str, player: Optional[int] = None) -> typing.Iterator[None]:
+        """Records the time and memory taken by the block as step, nested steps are recorded with a higher depth."""
+        import tracemalloc
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            taken = time.perf_counter() - start
+            if memory is not None and tracemalloc.is_tracing():
+                memory = tracemalloc.get_traced_memory()[0] - memory
+            self._local.depth = depth
+            with self._lock:
+                self.steps.append({"step": step, "player": player, "thread": threading.current_thread().name,
+                                   "depth": depth, "start": start - self.start, "time": taken, "memory": memory})
+
+    def write(self, file_path: str, games: typing.Mapping[int, str], **info: Any) -> None:
+        """Writes the steps in the order they started, with the total time of the world steps of each game."""
+        steps = sorted(self.steps, key=lambda entry: entry["start"])
+        game_times: Dict[str, float] = collections.defaultdict(float)
+        for entry in steps:
+            if entry["player"] in games:
+                entry["game"] = games[entry["player"]]
+                game_times[entry["game"]] += entry["time"]
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({**info, "total_time": time.perf_counter() - self.start, "games": game_times, "steps": steps},
+                      f, indent=1)
+
+
 def _extend_freeze_support() -> None:
     """Extend multiprocessing.freeze_support() to also work on Non-Windows for spawn."""
     # upstream issue: https://github.com/python/cpython/issues/76327
@@ -38,7 +38,20 @@ app.config["SECRET_KEY"] = bytes(socket.gethostname(), encoding="utf-8")
 app.config["JOB_THRESHOLD"] = 1
 # after what time in seconds should generation be aborted, freeing the queue slot. Can be set to None to disable.
 app.config["JOB_TIME"] = 600
+# estimated cost, one per player or two with a playthrough, of waiting generations above which new ones are turned away.
+# Can be set to None to disable.
+app.config["JOB_QUEUE_MAX_COST"] = 400
 app.config['SESSION_PERMANENT'] = True
+# after what time in seconds without connections should a room unload its multidata, while staying up.
+# Can be set to None to disable.
+app.config["ROOM_IDLE_UNLOAD"] = 600
+# bytes, as stored in the database, of the multidata, saves and data packages each web process keeps decoded
+# for trackers. Decoded, they take several times that in memory.
+app.config["TRACKER_DATA_CACHE_STORED_SIZE"] = 64 * 1024 * 1024
+# longest time in seconds a request to the tracker API may wait for changes. Each waiting request holds a web thread.
+app.config["TRACKER_API_MAX_WAIT"] = 5
+# how many requests to the tracker API may wait for changes at once per web process, others are answered right away.
+app.config["TRACKER_API_MAX_WAITING"] = 2
 
 # waitress uses one thread for I/O, these are for processing of views that then get sent
 # archipelago.gg uses gunicorn + nginx; ignoring this option
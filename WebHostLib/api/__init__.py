@@ -6,6 +6,7 @@ from flask import Blueprint, abort, url_for
 
 import worlds.Files
 from ..models import Room, Seed
+from ..tracker import tracker_data_cache
 
 api_endpoints = Blueprint('api', __name__, url_prefix="/api")
 
@@ -48,4 +49,9 @@ def room_info(room: UUID):
     }
 
 
-from . import generate, user, datapackage  # trigger registration
+@api_endpoints.route('/tracker_cache')
+def tracker_cache_stats():
+    return tracker_data_cache.get_stats()
+
+
+from . import generate, user, datapackage, tracker  # trigger registration
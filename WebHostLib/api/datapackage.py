@@ -1,5 +1,6 @@
-from flask import abort
+from flask import Response, abort
 
+from NetUtils import encode, encode_game_package
 from Utils import restricted_loads
 from WebHostLib import cache
 from WebHostLib.models import GameDataPackage
@@ -10,7 +11,8 @@ from . import api_endpoints
 @cache.cached()
 def get_datapackage():
     from worlds import network_data_package
-    return network_data_package
+    games = {game: encode_game_package(game_data) for game, game_data in network_data_package["games"].items()}
+    return Response(encode({"games": games}), mimetype="application/json")
 
 
 @api_endpoints.route('/datapackage/<string:checksum>')
@@ -18,7 +20,7 @@ def get_datapackage():
 def get_datapackage_by_checksum(checksum: str):
     package = GameDataPackage.get(checksum=checksum)
     if package:
-        return restricted_loads(package.data)
+        return Response(encode_game_package(restricted_loads(package.data)), mimetype="application/json")
     return abort(404)
 
 
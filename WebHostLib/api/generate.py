@@ -1,14 +1,12 @@
 import json
-import pickle
 from uuid import UUID
 
 from flask import request, session, url_for
 from markupsafe import Markup
-from pony.orm import commit
 
 from WebHostLib import app
 from WebHostLib.check import get_yaml_data, roll_options
-from WebHostLib.generate import get_meta
+from WebHostLib.generate import get_meta, queue_generation
 from WebHostLib.models import Generation, STATE_QUEUED, Seed, STATE_ERROR
 from . import api_endpoints
 
@@ -55,12 +53,9 @@ def generate_api():
             return {"text": str(results),
                     "detail": results}, 400
         else:
-            gen = Generation(
-                options=pickle.dumps({name: vars(options) for name, options in gen_options.items()}),
-                # convert to json compatible
-                meta=json.dumps(meta), state=STATE_QUEUED,
-                owner=session["_id"])
-            commit()
+            gen = queue_generation(options, gen_options, meta, session["_id"], "api")
+            if isinstance(gen, str):
+                return {"text": gen}, 503
             return {"text": f"Generation of seed {gen.id} started successfully.",
                     "detail": gen.id,
                     "encoded": app.url_map.converters["suuid"].to_url(None, gen.id),
@@ -82,4 +77,6 @@ def wait_seed_api(seed: UUID):
         return {"text": "Generation not found"}, 404
     elif generation.state == STATE_ERROR:
         return {"text": "Generation failed"}, 500
-    return {"text": "Generation running"}, 202
+    return {"text": "Generation running",
+            "queued": generation.state == STATE_QUEUED,
+            "progress": json.loads(generation.meta).get("progress")}, 202
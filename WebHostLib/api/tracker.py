@@ -0,0 +1,101 @@
+import threading
+import time
+from uuid import UUID
+
+from flask import abort, jsonify, make_response, request
+from pony.orm import rollback
+
+from WebHostLib import app
+from WebHostLib.models import Room
+from WebHostLib.tracker import TrackerData
+from . import api_endpoints
+
+TRACKER_POLL_INTERVAL_IN_SECONDS = 1
+
+# requests waiting for changes, each holds a web thread, so only TRACKER_API_MAX_WAITING of them may at once
+waiting_requests = 0
+waiting_requests_lock = threading.Lock()
+
+
+def start_waiting() -> bool:
+    """Counts a request as waiting for changes, unless too many already are."""
+    global waiting_requests
+    with waiting_requests_lock:
+        if waiting_requests >= app.config["TRACKER_API_MAX_WAITING"]:
+            return False
+        waiting_requests += 1
+        return True
+
+
+def stop_waiting():
+    global waiting_requests
+    with waiting_requests_lock:
+        waiting_requests -= 1
+
+
+def get_tracker_etag(room: Room) -> str:
+    """Changes with every save of the room."""
+    if room.tracker_snapshot:
+        return f"v{room.tracker_snapshot.version}"
+    return f"t{room.last_activity.timestamp()}"
+
+
+@api_endpoints.route('/tracker/<suuid:tracker>')
+def get_tracker(tracker: UUID):
+    """Checked locations and status of each player of a room.
+    With `since` set to the version of an earlier response, only lists locations checked after it, if still known.
+    With `wait`, waits up to that many seconds for the room to save changes, if there were none since `since`
+    or the ETag in If-None-Match. While too many requests are waiting, answers right away instead."""
+    since = request.args.get("since", None, type=int)
+    wait = min(request.args.get("wait", 0, type=float), app.config["TRACKER_API_MAX_WAIT"])
+    room = Room.get(tracker=tracker)
+    if not room:
+        return abort(404)
+
+    def is_unchanged() -> bool:
+        if room.tracker_snapshot and room.tracker_snapshot.version == since:
+            return True
+        return get_tracker_etag(room) in request.if_none_match
+
+    if wait > 0 and is_unchanged() and start_waiting():
+        try:
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline and is_unchanged():
+                time.sleep(TRACKER_POLL_INTERVAL_IN_SECONDS)
+                rollback()  # ends the transaction, so the room is read again with its latest save
+                room = Room.get(tracker=tracker)
+        finally:
+            stop_waiting()
+
+    etag = get_tracker_etag(room)
+    if etag in request.if_none_match:
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+
+    tracker_data = TrackerData(room)
+    newly_checked = tracker_data.get_checked_locations_since(since) if since is not None else None
+    statuses = tracker_data.get_room_client_statuses()
+    players = []
+    for team, team_players in tracker_data.get_all_players().items():
+        for player in team_players:
+            if newly_checked is None:
+                checked = tracker_data.get_player_checked_locations(team, player)
+            else:
+                checked = newly_checked.get((team, player), [])
+            players.append({
+                "team": team,
+                "player": player,
+                "status": statuses[team, player],
+                "locations": len(tracker_data.get_player_locations(team, player)),
+                "checked_count": tracker_data.get_player_checked_locations_count(team, player),
+                "checked": sorted(checked),
+            })
+    response = jsonify({
+        "version": tracker_data.get_snapshot_version(),
+        "full": newly_checked is None,
+        "players": players,
+    })
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
@@ -3,6 +3,8 @@ from __future__ import annotations
 import json
 import logging
 import multiprocessing
+import os
+import time
 import typing
 from datetime import timedelta, datetime
 from threading import Event, Thread
@@ -10,6 +12,7 @@ from uuid import UUID
 
 from pony.orm import db_session, select, commit
 
+import ModuleUpdate
 from Utils import restricted_loads
 from .locker import Locker, AlreadyRunningException
 
@@ -35,22 +38,84 @@ def handle_generation_failure(result: BaseException):
         logging.exception(e)
 
 
-def launch_generator(pool: multiprocessing.pool.Pool, generation: Generation):
+def launch_generator(pool: multiprocessing.pool.Pool,
+                     generation: Generation) -> typing.Optional[multiprocessing.pool.AsyncResult]:
     try:
         meta = json.loads(generation.meta)
         options = restricted_loads(generation.options)
         logging.info(f"Generating {generation.id} for {len(options)} players")
-        pool.apply_async(gen_game, (options,),
-                         {"meta": meta,
-                          "sid": generation.id,
-                          "owner": generation.owner},
-                         handle_generation_success, handle_generation_failure)
+        result = pool.apply_async(gen_game, (options,),
+                                  {"meta": meta,
+                                   "sid": generation.id,
+                                   "owner": generation.owner},
+                                  handle_generation_success, handle_generation_failure)
     except Exception as e:
         generation.state = STATE_ERROR
         commit()
         logging.exception(e)
     else:
         generation.state = STATE_STARTED
+        return result
+
+
+large_generation_cost = 20  # generations estimated to cost more are only run on half of the generators at a time
+job_sources = ("web", "api")  # people waiting on the page are served before API clients
+
+
+class RunningGeneration(typing.NamedTuple):
+    result: multiprocessing.pool.AsyncResult
+    cost: int
+    started: float
+
+
+def get_job(generation: Generation) -> typing.Dict[str, typing.Any]:
+    """Queue information queue_generation stored for the generation, defaulted for older ones."""
+    job = json.loads(generation.meta).get("job", {})
+    job.setdefault("source", "web")
+    job.setdefault("cost", 1)
+    job.setdefault("queued", 0)
+    return job
+
+
+def select_generations(queued: typing.Dict[UUID, typing.Dict[str, typing.Any]], running_costs: typing.List[int],
+                       generators: int, max_wait: float, now: float) -> typing.List[UUID]:
+    """Picks which queued generations to start on the free generators.
+    Generations that waited longer than max_wait go first, then the web form before the API, small before large
+    and finally the oldest first. Large generations leave at least half of the generators to small ones."""
+    def priority(sid: UUID) -> typing.Tuple[bool, int, bool, float]:
+        job = queued[sid]
+        return (now - job["queued"] < max_wait,
+                job_sources.index(job["source"]) if job["source"] in job_sources else len(job_sources),
+                job["cost"] > large_generation_cost,
+                job["queued"])
+
+    free = generators - len(running_costs)
+    large_free = max(1, generators // 2) - sum(cost > large_generation_cost for cost in running_costs)
+    selected = []
+    for sid in sorted(queued, key=priority):
+        if len(selected) >= free:
+            break
+        if queued[sid]["cost"] > large_generation_cost:
+            if large_free <= 0:
+                continue
+            large_free -= 1
+        selected.append(sid)
+    return selected
+
+
+def get_generator_context() -> typing.Tuple[multiprocessing.context.BaseContext, int]:
+    """Context to create generators with and how many generations each may run.
+    Where supported, generators are forked from a server process that imported all worlds once, so a new one is
+    ready in milliseconds. Each then runs a single generation, so module state a world changes while generating
+    can't leak into the next one, which starts from the freshly imported state again."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # the forkserver has no parent process, so tell it that requirements were checked already
+        os.environ[ModuleUpdate.skip_update_variable] = "1"
+        # WebHost sets up the process, like it does for spawned ones that import it as their main module
+        context.set_forkserver_preload(["WebHost", "worlds", "WebHostLib.generate"])
+        return context, 1
+    return multiprocessing.get_context(), 10
 
 
 def init_db(pony_config: dict):
@@ -105,8 +170,13 @@ def autogen(config: dict):
         try:
             with Locker("autogen"):
 
-                with multiprocessing.Pool(config["GENERATORS"], initializer=init_db,
-                                          initargs=(config["PONY"],), maxtasksperchild=10) as generator_pool:
+                context, generations_per_generator = get_generator_context()
+                with context.Pool(config["GENERATORS"], initializer=init_db, initargs=(config["PONY"],),
+                                  maxtasksperchild=generations_per_generator) as generator_pool:
+                    running: typing.Dict[UUID, RunningGeneration] = {}
+                    # generations cancel themselves after JOB_TIME, ones still running after that were lost
+                    lost_after = config["JOB_TIME"] + 60 if config["JOB_TIME"] is not None else None
+                    max_wait = config["JOB_TIME"] or 600
                     with db_session:
                         to_start = select(generation for generation in Generation if generation.state == STATE_STARTED)
 
@@ -117,19 +187,51 @@ def autogen(config: dict):
                                 if sid:
                                     generation.delete()
                                 else:
-                                    launch_generator(generator_pool, generation)
+                                    result = launch_generator(generator_pool, generation)
+                                    if result:
+                                        running[generation.id] = RunningGeneration(
+                                            result, get_job(generation)["cost"], time.monotonic())
 
                             commit()
                         select(generation for generation in Generation if generation.state == STATE_ERROR).delete()
 
+                    # lost generations keep their generator busy, so they still count as running until they end
+                    reported_lost: typing.Set[UUID] = set()
                     while not stop_event.wait(0.1):
+                        lost = []
+                        for sid, generation in list(running.items()):
+                            if generation.result.ready():
+                                del running[sid]
+                                reported_lost.discard(sid)
+                            elif sid not in reported_lost and lost_after is not None and \
+                                    time.monotonic() - generation.started > lost_after:
+                                reported_lost.add(sid)
+                                lost.append(sid)
+                        if lost:
+                            with db_session:
+                                for generation in Generation.select(lambda generation: generation.id in lost):
+                                    generation.state = STATE_ERROR
+                                    meta = json.loads(generation.meta)
+                                    meta["error"] = "Generation did not finish in time."
+                                    generation.meta = json.dumps(meta)
+                        if len(running) >= config["GENERATORS"]:
+                            continue
                         with db_session:
                             # for update locks the database row(s) during transaction, preventing writes from elsewhere
-                            to_start = select(
+                            to_start = {generation.id: generation for generation in select(
                                 generation for generation in Generation
-                                if generation.state == STATE_QUEUED).for_update()
-                            for generation in to_start:
-                                launch_generator(generator_pool, generation)
+                                if generation.state == STATE_QUEUED).for_update()}
+                            if not to_start:
+                                continue
+                            for sid in select_generations({sid: get_job(generation)
+                                                           for sid, generation in to_start.items()},
+                                                          [generation.cost for generation in running.values()],
+                                                          config["GENERATORS"], max_wait, time.time()):
+                                generation = to_start[sid]
+                                result = launch_generator(generator_pool, generation)
+                                if result:
+                                    running[sid] = RunningGeneration(result, get_job(generation)["cost"],
+                                                                     time.monotonic())
         except AlreadyRunningException:
             logging.info("Autogen reports as already running, not starting another.")
 
@@ -147,6 +249,7 @@ class MultiworldInstance():
         self.cert = config["SELFLAUNCHCERT"]
         self.key = config["SELFLAUNCHKEY"]
         self.host = config["HOST_ADDRESS"]
+        self.idle_unload = config["ROOM_IDLE_UNLOAD"]
         self.rooms_to_start = multiprocessing.Queue()
         self.rooms_shutting_down = multiprocessing.Queue()
         self.name = f"MultiHoster{id}"
@@ -158,7 +261,7 @@ class MultiworldInstance():
         process = multiprocessing.Process(group=None, target=run_server_process,
                                           args=(self.name, self.ponyconfig, get_static_server_data(),
                                                 self.cert, self.key, self.host,
-                                                self.rooms_to_start, self.rooms_shutting_down),
+                                                self.rooms_to_start, self.rooms_shutting_down, self.idle_unload),
                                           name=self.name)
         process.start()
         self.process = process
@@ -16,13 +16,16 @@ import sys
 
 import websockets
 from pony.orm import commit, db_session, select
+from pony.orm.dbapiprovider import OperationalError
 
+import NetUtils
 import Utils
 
-from MultiServer import Context, server, auto_shutdown, ServerCommandProcessor, ClientMessageProcessor, load_server_cert
-from Utils import restricted_loads, cache_argsless
+from MultiServer import Context, server, auto_shutdown, ServerCommandProcessor, ClientMessageProcessor, \
+    get_saving_second, load_server_cert
+from Utils import restricted_loads, cache_argsless, Version
 from .locker import Locker
-from .models import Command, GameDataPackage, Room, db
+from .models import Command, GameDataPackage, Room, RoomServerInfo, RoomTrackerSnapshot, SaveJournalRecord, db
 
 
 class CustomClientMessageProcessor(ClientMessageProcessor):
@@ -53,14 +56,122 @@ del MultiServer
 
 
 class DBCommandProcessor(ServerCommandProcessor):
+    ctx: WebHostContext
+
+    def __call__(self, raw: str):
+        self.ctx.hydrate()
+        return super(DBCommandProcessor, self).__call__(raw)
+
     def output(self, text: str):
         self.ctx.logger.info(text)
 
 
+class RoomShard:
+    """The rooms hosted by one server process, on its event loop.
+    Polls their commands and saves them from one thread each, instead of two threads per room,
+    and unloads the multidata of rooms that nobody is connected to."""
+    command_poll_interval = 5  # in seconds
+    unload_task: typing.Optional[asyncio.Task] = None
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, idle_unload: typing.Optional[int] = None):
+        self.loop = loop
+        self.idle_unload = idle_unload
+        self.rooms: typing.Dict[typing.Any, WebHostContext] = {}
+        self.saving_rooms: typing.Dict[int, typing.Set[WebHostContext]] = collections.defaultdict(set)  # by second
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.poll_commands, name="RoomCommandPoller", daemon=True).start()
+        threading.Thread(target=self.save_rooms, name="RoomSaver", daemon=True).start()
+        if self.idle_unload:
+            self.unload_task = self.loop.create_task(self.unload_idle_rooms())
+
+    def add_room(self, ctx: WebHostContext):
+        with self.lock:
+            self.rooms[ctx.room_id] = ctx
+
+    def add_saving_room(self, ctx: WebHostContext):
+        with self.lock:
+            self.saving_rooms[get_saving_second(ctx.seed_name, ctx.auto_save_interval)].add(ctx)
+
+    def remove_room(self, ctx: WebHostContext):
+        with self.lock:
+            if self.rooms.get(ctx.room_id) is ctx:
+                del self.rooms[ctx.room_id]
+            for rooms in self.saving_rooms.values():
+                rooms.discard(ctx)
+
+    def poll_commands(self):
+        while 1:
+            try:
+                with db_session:
+                    with self.lock:
+                        room_ids = list(self.rooms)
+                    if room_ids:
+                        for command in select(command for command in Command if command.room.id in room_ids):
+                            ctx = self.rooms.get(command.room.id)
+                            if ctx:
+                                self.loop.call_soon_threadsafe(ctx.db_command_processor, command.commandtext)
+                            command.delete()
+                        commit()
+            except Exception as e:
+                logging.exception(e)
+            time.sleep(self.command_poll_interval)
+
+    def save_rooms(self):
+        """Saves each dirty room at its saving second, like the saving thread of a single Context."""
+        # time.time() is platform dependent, so using the expensive datetime method instead
+        second = datetime.datetime.now().second
+        while 1:
+            time.sleep(1 - datetime.datetime.now().microsecond * 0.000001)
+            current_second = datetime.datetime.now().second
+            while second != current_second:  # catch up on seconds spent saving
+                second = (second + 1) % 60
+                with self.lock:
+                    rooms = [ctx for ctx in self.saving_rooms.get(second, ()) if ctx.save_dirty]
+                for ctx in rooms:
+                    self.save_room(ctx)
+
+    async def unload_idle_rooms(self):
+        """Dehydrates rooms that had no connections for idle_unload seconds, they stay up to be hydrated again."""
+        idle_since: typing.Dict[WebHostContext, float] = {}
+        while 1:
+            await asyncio.sleep(min(60, self.idle_unload))
+            now = time.monotonic()
+            with self.lock:
+                rooms = list(self.rooms.values())
+            for ctx in idle_since.keys() - set(rooms):
+                del idle_since[ctx]
+            for ctx in rooms:
+                if ctx.endpoints or not ctx.hydrated or ctx.exit_event.is_set():
+                    idle_since.pop(ctx, None)
+                elif now - idle_since.setdefault(ctx, now) >= self.idle_unload:
+                    del idle_since[ctx]
+                    try:
+                        ctx.dehydrate()
+                    except Exception as e:
+                        ctx.logger.exception(e)
+
+    @staticmethod
+    def save_room(ctx: WebHostContext):
+        ctx.save_dirty = False
+        try:
+            ctx.logger.debug("Saving via thread.")
+            ctx._save()
+        except Exception as e:
+            ctx.save_dirty = True
+            ctx.logger.exception(e)
+            if isinstance(e, OperationalError):
+                ctx.logger.info(f"Saving failed. Retry in {ctx.auto_save_interval} seconds.")
+
+
 class WebHostContext(Context):
     room_id: int
+    # what RoomInfo needs while the multidata is not loaded, see get_server_info
+    server_info: typing.Optional[typing.Dict[str, typing.Any]] = None
+    tracker_snapshot_changes_kept = 60  # publishes whose newly checked locations the tracker snapshot keeps
 
-    def __init__(self, static_server_data: dict, logger: logging.Logger):
+    def __init__(self, static_server_data: dict, logger: logging.Logger, shard: RoomShard):
         # static server data is used during _load_game_data to load required data,
         # without needing to import worlds system, which takes quite a bit of memory
         self.static_server_data = static_server_data
@@ -68,7 +179,16 @@ class WebHostContext(Context):
                                              40, True, "enabled", "enabled",
                                              "enabled", 0, 2, logger=logger)
         del self.static_server_data
-        self.main_loop = asyncio.get_running_loop()
+        self.shard = shard
+        self.db_command_processor = DBCommandProcessor(self)
+        self.hydrated = False
+        self.hydrate_lock: typing.Optional[asyncio.Lock] = None
+        # the checked bitsets and changes of the last published tracker snapshot, to diff the next one against
+        self.published_checked: typing.Dict[typing.Tuple[int, int], bytes] = {}
+        self.published_changes: typing.List[typing.Tuple[int, typing.Dict[typing.Tuple[int, int], typing.List[int]]]]
+        self.published_changes = []
+        # held while saving, so the save thread never sees a half loaded or unloaded room
+        self.save_lock = threading.RLock()
         self.video = {}
         self.tags = ["AP", "WebHost"]
 
@@ -77,19 +197,10 @@ class WebHostContext(Context):
             # NOTE: attributes are mutable and shared, so they will have to be copied before being modified
             setattr(self, key, value)
         self.non_hintable_names = collections.defaultdict(frozenset, self.non_hintable_names)
-
-    def listen_to_db_commands(self):
-        cmdprocessor = DBCommandProcessor(self)
-
-        while not self.exit_event.is_set():
-            with db_session:
-                commands = select(command for command in Command if command.room.id == self.room_id)
-                if commands:
-                    for command in commands:
-                        self.main_loop.call_soon_threadsafe(cmdprocessor, command.commandtext)
-                        command.delete()
-                    commit()
-            time.sleep(5)
+        # this is shared across all rooms
+        self.static_gamespackage = self.gamespackage
+        self.static_item_name_groups = self.item_name_groups
+        self.static_location_name_groups = self.location_name_groups
 
     @db_session
     def load(self, room_id: int):
@@ -100,12 +211,25 @@ class WebHostContext(Context):
         else:
             self.port = get_random_port()
 
-        multidata = self.decompress(room.seed.multidata)
+        if room.server_info:
+            # hydrated by the first client that needs more than RoomInfo
+            self._load_server_info(restricted_loads(room.server_info.data))
+        else:
+            self.hydrate()
+
+    @db_session
+    def hydrate(self, multidata: typing.Optional[dict] = None):
+        """Loads multidata and save of the room. Decompresses the multidata, unless it is passed in."""
+        if self.hydrated:
+            return
+        room = Room.get(id=self.room_id)
+        if multidata is None:
+            multidata = self.decompress(room.seed.multidata)
         game_data_packages = {}
 
-        static_gamespackage = self.gamespackage  # this is shared across all rooms
-        static_item_name_groups = self.item_name_groups
-        static_location_name_groups = self.location_name_groups
+        static_gamespackage = self.static_gamespackage
+        static_item_name_groups = self.static_item_name_groups
+        static_location_name_groups = self.static_location_name_groups
         self.gamespackage = {"Archipelago": static_gamespackage.get("Archipelago", {})}  # this may be modified by _load
         self.item_name_groups = {"Archipelago": static_item_name_groups.get("Archipelago", {})}
         self.location_name_groups = {"Archipelago": static_location_name_groups.get("Archipelago", {})}
@@ -133,27 +257,199 @@ class WebHostContext(Context):
             self.gamespackage = static_gamespackage
             self.item_name_groups = static_item_name_groups
             self.location_name_groups = static_location_name_groups
-        return self._load(multidata, game_data_packages, True)
+        with self.save_lock:
+            self._load(multidata, game_data_packages, True)
+            if self.saving:
+                self._load_save(room)
+            if room.tracker_snapshot:
+                published = restricted_loads(room.tracker_snapshot.data)
+                self.published_checked = {team_slot: slot_state["checked"]
+                                          for team_slot, slot_state in published["slots"].items()}
+                self.published_changes = published.get("changes", [])
+            self.hydrated = True
+        self.server_info = None
+        self.logger.info("Loaded multidata.")
+
+    async def hydrate_async(self):
+        """Like hydrate, but decompresses the multidata in an executor, so the other rooms of the shard keep running."""
+        if self.hydrated:
+            return
+        if not self.hydrate_lock:
+            self.hydrate_lock = asyncio.Lock()
+        async with self.hydrate_lock:
+            if not self.hydrated:
+                multidata = await asyncio.get_running_loop().run_in_executor(None, self.read_multidata)
+                self.hydrate(multidata)
+
+    @db_session
+    def read_multidata(self) -> dict:
+        return self.decompress(Room.get(id=self.room_id).seed.multidata)
+
+    def dehydrate(self):
+        """Saves the room and frees its multidata and save, keeping what RoomInfo needs."""
+        with self.save_lock:
+            if not self.hydrated:
+                return
+            if self.saving:
+                self._save(True)
+            self.server_info = self.get_server_info()
+            self.hydrated = False
+            self.locations = {}
+            self.slot_data = {}
+            self.er_hint_data = {}
+            self.start_inventory = {}
+            self.received_items = {}
+            self.location_checks = collections.defaultdict(set)
+            self.hints = collections.defaultdict(set)
+            self.hint_index = {}
+            self.data_storage.load({})
+            self.spheres = []
+            self.sphere_index = NetUtils.SphereIndex(self.spheres)
+            self.read_data = {}
+            self.encoded_cache = {}
+            self.published_checked = {}
+            self.published_changes = []
+            self.gamespackage = self.static_gamespackage
+            self.item_name_groups = self.static_item_name_groups
+            self.location_name_groups = self.static_location_name_groups
+        self.logger.info("Unloaded multidata of idle room.")
+
+    def get_server_info(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "seed_name": self.seed_name,
+            "generator_version": tuple(self.generator_version),
+            "games": self.games,
+            "datapackage_checksums": self.get_datapackage_checksums(),
+            "game_options": self.get_game_options(),
+        }
+
+    def _load_server_info(self, server_info: typing.Dict[str, typing.Any]):
+        self.server_info = server_info
+        self.seed_name = server_info["seed_name"]
+        self.generator_version = Version(*server_info["generator_version"])
+        self.games = server_info["games"]
+        for key, value in server_info["game_options"].items():
+            setattr(self, key, value)
+
+    def get_datapackage_checksums(self) -> typing.Dict[str, str]:
+        if self.hydrated:
+            return super(WebHostContext, self).get_datapackage_checksums()
+        return self.server_info["datapackage_checksums"]
 
     @db_session
     def init_save(self, enabled: bool = True):
         self.saving = enabled
         if self.saving:
-            savegame_data = Room.get(id=self.room_id).multisave
-            if savegame_data:
-                self.set_save(restricted_loads(Room.get(id=self.room_id).multisave))
+            if self.hydrated:
+                self._load_save(Room.get(id=self.room_id))
             self._start_async_saving(atexit_save=False)
-        threading.Thread(target=self.listen_to_db_commands, daemon=True).start()
+        self.shard.add_room(self)
+
+    def _load_save(self, room: Room):
+        savegame_data = room.multisave
+        if savegame_data:
+            self.set_save(self.replay_journal(restricted_loads(savegame_data), room.save_journal_data))
+
+    def _start_async_saving(self, atexit_save: bool = True):
+        self.shard.add_saving_room(self)
 
     @db_session
     def _save(self, exit_save: bool = False) -> bool:
+        with self.save_lock:
+            if not self.hydrated:
+                return True  # nothing changed since dehydrate saved
+            self._write_save(exit_save)
+            self._publish_tracker_snapshot()
         room = Room.get(id=self.room_id)
-        room.multisave = pickle.dumps(self.get_save())
         # saving only occurs on activity, so we can "abuse" this information to mark this as last_activity
         if not exit_save:  # we don't want to count a shutdown as activity, which would restart the server again
             room.last_activity = datetime.datetime.utcnow()
         return True
 
+    def _write_save_snapshot(self, savedata: dict):
+        room = Room.get(id=self.room_id)
+        room.multisave = pickle.dumps(savedata)
+        SaveJournalRecord.select(lambda record: record.room == room).delete(bulk=True)
+        # lets the next start of the room answer RoomInfo without loading the multidata
+        server_info = pickle.dumps(self.get_server_info())
+        if room.server_info:
+            room.server_info.data = server_info
+        else:
+            RoomServerInfo(room=room, data=server_info)
+        commit()
+
+    def get_tracker_snapshot(self) -> typing.Dict[str, typing.Any]:
+        """What trackers show of the room, see RoomTrackerSnapshot."""
+        slots = {}
+        for team, slot in self.player_names:
+            location_ids = sorted(self.locations[slot]) if slot in self.locations else []
+            checked_locations = self.location_checks[team, slot]
+            checked = bytearray((len(location_ids) + 7) // 8)
+            for index, location_id in enumerate(location_ids):
+                if location_id in checked_locations:
+                    checked[index >> 3] |= 1 << (index & 7)
+            inventory: typing.Dict[int, int] = {}
+            received_order: typing.Dict[int, int] = {}
+            for index, item in enumerate(self.received_items.get((team, slot, True), ())):
+                inventory[item.item] = inventory.get(item.item, 0) + 1
+                received_order[item.item] = index
+            slots[team, slot] = {
+                "checked": bytes(checked),
+                "checked_count": len(checked_locations),
+                "inventory": inventory,
+                "received_order": received_order,
+                "status": self.client_game_state[team, slot],
+                "hints": self.hints[team, slot],
+                "alias": self.name_aliases.get((team, slot), None),
+            }
+        return {
+            "slots": slots,
+            "activity": tuple((key, value.timestamp()) for key, value in self.client_activity_timers.items()),
+            "video": [(tuple(playerslot), videodata) for playerslot, videodata in self.video.items()],
+        }
+
+    def get_newly_checked(self, slot: int, checked: bytes, previously_checked: bytes) -> typing.List[int]:
+        """Location ids set in the checked bitset of slot, but not in previously_checked."""
+        location_ids = sorted(self.locations[slot]) if slot in self.locations else []
+        previously_checked = previously_checked.ljust(len(checked), b"\0")
+        newly_checked = []
+        for byte_index, byte in enumerate(checked):
+            new_bits = byte & ~previously_checked[byte_index]
+            while new_bits:
+                bit = new_bits & -new_bits
+                newly_checked.append(location_ids[byte_index * 8 + bit.bit_length() - 1])
+                new_bits ^= bit
+        return newly_checked
+
+    def _publish_tracker_snapshot(self):
+        room = Room.get(id=self.room_id)
+        snapshot = self.get_tracker_snapshot()
+        checked = {team_slot: slot_state["checked"] for team_slot, slot_state in snapshot["slots"].items()}
+        published = room.tracker_snapshot
+        if published:
+            version = published.version + 1
+            newly_checked = {}
+            for (team, slot), slot_checked in checked.items():
+                previously_checked = self.published_checked.get((team, slot), b"")
+                if slot_checked != previously_checked:
+                    newly_checked[team, slot] = self.get_newly_checked(slot, slot_checked, previously_checked)
+            changes = self.published_changes[-self.tracker_snapshot_changes_kept + 1:] + [(version, newly_checked)]
+            snapshot["changes"] = changes
+            published.data = pickle.dumps(snapshot)
+            published.version = version
+        else:
+            changes = snapshot["changes"] = []
+            RoomTrackerSnapshot(room=room, data=pickle.dumps(snapshot))
+        # only diff against it once it was published
+        commit()
+        self.published_checked = checked
+        self.published_changes = changes
+
+    def _append_save_journal(self, record: bytes):
+        SaveJournalRecord(room=Room.get(id=self.room_id), data=record)
+        # commit here, so a failed commit makes the next save a snapshot again
+        commit()
+
     def get_save(self) -> dict:
         d = super(WebHostContext, self).get_save()
         d["video"] = [(tuple(playerslot), videodata) for playerslot, videodata in self.video.items()]
@@ -215,7 +511,8 @@ def set_up_logging(room_id) -> logging.Logger:
 
 def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                        cert_file: typing.Optional[str], cert_key_file: typing.Optional[str],
-                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue):
+                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue,
+                       idle_unload: typing.Optional[int] = None):
     Utils.init_logging(name)
     try:
         import resource
@@ -241,12 +538,14 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
     gc.collect()  # free intermediate objects used during setup
 
     loop = asyncio.get_event_loop()
+    shard = RoomShard(loop, idle_unload)
+    shard.start()
 
     async def start_room(room_id):
         with Locker(f"RoomLocker {room_id}"):
             try:
                 logger = set_up_logging(room_id)
-                ctx = WebHostContext(static_server_data, logger)
+                ctx = WebHostContext(static_server_data, logger, shard)
                 ctx.load(room_id)
                 ctx.init_save()
                 try:
@@ -298,6 +597,7 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                     setattr(asyncio.current_task(), "save", None)
             finally:
                 try:
+                    shard.remove_room(ctx)
                     ctx.save_dirty = False  # make sure the saving thread does not write to DB after final wakeup
                     ctx.exit_event.set()  # make sure the saving thread stops at some point
                     # NOTE: async saving should probably be an async task and could be merged with shutdown_task
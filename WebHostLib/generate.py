@@ -1,15 +1,19 @@
 import concurrent.futures
+import hashlib
 import json
+import logging
 import os
 import pickle
 import random
 import tempfile
+import threading
+import time
 import zipfile
 from collections import Counter
 from typing import Any, Dict, List, Optional, Union, Set
 
 from flask import flash, redirect, render_template, request, session, url_for
-from pony.orm import commit, db_session
+from pony.orm import commit, db_session, select
 
 from BaseClasses import get_seed, seeddigits
 from Generate import PlandoOptions, handle_name
@@ -19,7 +23,7 @@ from WebHostLib import app
 from settings import ServerOptions, GeneratorOptions
 from worlds.alttp.EntranceRandomizer import parse_arguments
 from .check import get_yaml_data, roll_options
-from .models import Generation, STATE_ERROR, STATE_QUEUED, Seed, UUID
+from .models import Generation, STATE_ERROR, STATE_QUEUED, STATE_STARTED, Seed, UUID
 from .upload import upload_zip_to_db
 
 
@@ -82,13 +86,10 @@ def start_generation(options: Dict[str, Union[dict, str]], meta: Dict[str, Any])
         flash(f"Sorry, generating of multiworlds is limited to {app.config['MAX_ROLL']} players. "
               f"If you have a larger group, please generate it yourself and upload it.")
     elif len(gen_options) >= app.config["JOB_THRESHOLD"]:
-        gen = Generation(
-            options=pickle.dumps({name: vars(options) for name, options in gen_options.items()}),
-            # convert to json compatible
-            meta=json.dumps(meta),
-            state=STATE_QUEUED,
-            owner=session["_id"])
-        commit()
+        gen = queue_generation(options, gen_options, meta, session["_id"], "web")
+        if isinstance(gen, str):
+            flash(gen)
+            return redirect(request.url)
 
         return redirect(url_for("wait_seed", seed=gen.id))
     else:
@@ -103,6 +104,80 @@ def start_generation(options: Dict[str, Union[dict, str]], meta: Dict[str, Any])
         return redirect(url_for("view_seed", seed=seed_id))
 
 
+def estimate_generation_cost(gen_options: Dict[str, Any], meta: Dict[str, Any]) -> int:
+    """Rough cost of generating the rolled options, about one per player."""
+    cost = len(gen_options)
+    if meta["generator_options"].get("spoiler", 0) >= 2:
+        cost *= 2  # calculating the playthrough takes about as long as the rest of the generation
+    return cost
+
+
+def queue_generation(options: Dict[str, Union[dict, str]], gen_options: Dict[str, Any], meta: Dict[str, Any],
+                     owner: UUID, source: str) -> Union[Generation, str]:
+    """Queues generating the rolled options for the autogen to schedule, by source and estimated cost.
+    Submitting the same options again returns the owner's generation that is still waiting or running.
+    Returns the reason instead, if the queue is too full to admit the generation."""
+    digest = hashlib.sha256(json.dumps([options, meta], sort_keys=True, default=str).encode()).hexdigest()
+    waiting = select(generation for generation in Generation
+                     if generation.owner == owner and generation.state in (STATE_QUEUED, STATE_STARTED))
+    for generation in waiting:
+        if json.loads(generation.meta).get("job", {}).get("digest") == digest:
+            return generation
+
+    cost = estimate_generation_cost(gen_options, meta)
+    max_cost = app.config["JOB_QUEUE_MAX_COST"]
+    if max_cost is not None:
+        queued = select(generation for generation in Generation if generation.state == STATE_QUEUED)
+        queued_cost = sum(json.loads(generation.meta).get("job", {}).get("cost", 1) for generation in queued)
+        if queued_cost + cost > max_cost:
+            return "Sorry, too many multiworlds are waiting to be generated right now. Please try again later."
+
+    meta["job"] = {"source": source, "cost": cost, "queued": time.time(), "digest": digest}
+    gen = Generation(
+        options=pickle.dumps({name: vars(options) for name, options in gen_options.items()}),
+        # convert to json compatible
+        meta=json.dumps(meta),
+        state=STATE_QUEUED,
+        owner=owner)
+    commit()
+    return gen
+
+
+class GenerationCancelled(BaseException):
+    """Raised from the logging of a generation to stop it, which worlds catching Exception don't catch."""
+
+
+class GenerationProgress(logging.Handler):
+    """Writes what the generating thread logs to its Generation as progress.
+    The next time it logs after running out of time, or after its Generation failed elsewhere, the generation is
+    cancelled by raising GenerationCancelled."""
+    report_interval = 1  # seconds between progress updates written to the database
+
+    def __init__(self, sid: Optional[UUID], time_limit: Optional[float], thread: int):
+        super().__init__(logging.INFO)
+        self.sid = sid
+        self.deadline = None if time_limit is None else time.monotonic() + time_limit
+        self.thread = thread
+        self.last_report = 0.0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.thread != self.thread:
+            return
+        now = time.monotonic()
+        if self.deadline is not None and now > self.deadline:
+            raise GenerationCancelled("Allowed time for Generation exceeded, "
+                                      "please consider generating locally instead.")
+        if self.sid and now - self.last_report >= self.report_interval:
+            self.last_report = now
+            with db_session:
+                gen = Generation.get(id=self.sid)
+                if gen is None or gen.state == STATE_ERROR:
+                    raise GenerationCancelled("Generation was cancelled.")
+                meta = json.loads(gen.meta)
+                meta["progress"] = record.getMessage().strip()[:200]
+                gen.meta = json.dumps(meta)
+
+
 def gen_game(gen_options: dict, meta: Optional[Dict[str, Any]] = None, owner=None, sid=None):
     if not meta:
         meta: Dict[str, Any] = {}
@@ -134,6 +209,8 @@ def gen_game(gen_options: dict, meta: Optional[Dict[str, Any]] = None, owner=Non
                                                                        {"bosses", "items", "connections", "texts"}))
         erargs.skip_prog_balancing = False
         erargs.skip_output = False
+        erargs.stage_workers = 0
+        erargs.profile_out = None
 
         name_counter = Counter()
         for player, (playerfile, settings) in enumerate(gen_options.items(), 1):
@@ -152,8 +229,23 @@ def gen_game(gen_options: dict, meta: Optional[Dict[str, Any]] = None, owner=Non
         ERmain(erargs, seed, baked_server_options=meta["server_options"])
 
         return upload_to_db(target.name, sid, owner, race)
+
+    def run():
+        # the handler stays until the generation ends, so one that ran out of time still stops at its next log
+        root_logger = logging.getLogger()
+        root_level = root_logger.level
+        if not root_logger.isEnabledFor(logging.INFO):
+            root_logger.setLevel(logging.INFO)  # progress and cancellation hook into Main's info logging
+        progress = GenerationProgress(sid, app.config["JOB_TIME"], threading.get_ident())
+        root_logger.addHandler(progress)
+        try:
+            return task()
+        finally:
+            root_logger.removeHandler(progress)
+            root_logger.setLevel(root_level)
+
     thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-    thread = thread_pool.submit(task)
+    thread = thread_pool.submit(run)
 
     try:
         return thread.result(app.config["JOB_TIME"])
@@ -180,6 +272,8 @@ def gen_game(gen_options: dict, meta: Optional[Dict[str, Any]] = None, owner=Non
                     gen.meta = json.dumps(meta)
                     commit()
         raise
+    finally:
+        thread_pool.shutdown(wait=False)
 
 
 @app.route('/wait/<suuid:seed>')
@@ -194,7 +288,8 @@ def wait_seed(seed: UUID):
         return "Generation not found."
     elif generation.state == STATE_ERROR:
         return render_template("seedError.html", seed_error=generation.meta)
-    return render_template("waitSeed.html", seed_id=seed_id)
+    return render_template("waitSeed.html", seed_id=seed_id, queued=generation.state == STATE_QUEUED,
+                           progress=json.loads(generation.meta).get("progress"))
 
 
 def upload_to_db(folder, sid, owner, race):
@@ -26,12 +26,19 @@ class Room(db.Entity):
     commands = Set('Command')
     seed = Required('Seed', index=True)
     multisave = Optional(buffer, lazy=True)
+    save_journal = Set('SaveJournalRecord')  # changes to multisave since it was written
+    server_info = Optional('RoomServerInfo')
+    tracker_snapshot = Optional('RoomTrackerSnapshot')
     show_spoiler = Required(int, default=0)  # 0 -> never, 1 -> after completion, -> 2 always
     timeout = Required(int, default=lambda: 2 * 60 * 60)  # seconds since last activity to shutdown
     tracker = Optional(UUID, index=True)
     # Port special value -1 means the server errored out. Another attempt can be made with a page refresh
     last_port = Optional(int, default=lambda: 0)
 
+    @property
+    def save_journal_data(self) -> bytes:
+        return b"".join(record.data for record in self.save_journal.select().order_by(SaveJournalRecord.id))
+
 
 class Seed(db.Entity):
     id = PrimaryKey(UUID, default=uuid4)
@@ -50,6 +57,29 @@ class Command(db.Entity):
     commandtext = Required(str)
 
 
+class SaveJournalRecord(db.Entity):
+    id = PrimaryKey(int, auto=True)
+    room = Required(Room, index=True)
+    data = Required(bytes)
+
+
+class RoomServerInfo(db.Entity):
+    room = PrimaryKey(Room)
+    data = Required(bytes)  # what the room server needs to answer RoomInfo without loading the multidata
+
+
+class RoomTrackerSnapshot(db.Entity):
+    """What trackers show of the room, published by the room server with each save. data is a pickled dict of
+    {"slots": {(team, slot): slot state}, "activity": client_activity_timers, "video": video} where slot state has
+    "checked" (bitset over the slot's sorted location ids, location i is bit i % 8 of byte i // 8), "checked_count",
+    "inventory" (received item id -> count), "received_order" (item id -> index of its last receipt), "status",
+    "hints" and "alias", but not the received items themselves, which trackers read from the save. "changes" lists
+    (version, {(team, slot): newly checked location ids}) of the last publishes."""
+    room = PrimaryKey(Room)
+    version = Required(int, default=0)  # increases with every publish
+    data = Required(bytes, lazy=True)
+
+
 class Generation(db.Entity):
     id = PrimaryKey(UUID, default=uuid4)
     owner = Required(UUID)
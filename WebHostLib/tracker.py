@@ -1,7 +1,8 @@
 import datetime
 import collections
+import threading
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, List, Optional, Set, Tuple, NamedTuple, Counter
+from typing import Any, Callable, Dict, Hashable, List, Optional, OrderedDict, Set, Tuple, NamedTuple, Counter
 from uuid import UUID
 from email.utils import parsedate_to_datetime
 
@@ -12,12 +13,11 @@ from MultiServer import Context, get_saving_second
 from NetUtils import ClientStatus, Hint, NetworkItem, NetworkSlot, SlotType
 from Utils import restricted_loads, KeyedDefaultDict
 from . import app, cache
-from .models import GameDataPackage, Room
+from .models import GameDataPackage, Room, RoomTrackerSnapshot
 
 # Multisave is currently updated, at most, every minute.
 TRACKER_CACHE_TIMEOUT_IN_SECONDS = 60
 
-_multidata_cache = {}
 _multiworld_trackers: Dict[str, Callable] = {}
 _player_trackers: Dict[str, Callable] = {}
 
@@ -25,6 +25,93 @@ TeamPlayer = Tuple[int, int]
 ItemMetadata = Tuple[int, int, int]
 
 
+class DecodedDataCache:
+    """Process-wide least recently used cache of decoded database blobs, shared by all requests.
+
+    Entries are accounted with the size of the blob they were decoded from, as stored in the database, and evicted
+    once their total exceeds the budget. Decoded, they take several times that in memory.
+    Decoded objects are shared and must not be modified.
+    """
+    def __init__(self, get_budget: Callable[[], int]):
+        self.get_budget = get_budget
+        # key -> (version, value, size)
+        self.entries: OrderedDict[Hashable, Tuple[Any, Any, int]] = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable, version: Any, load: Callable[[], Tuple[Any, int]]) -> Any:
+        """Returns the cached value of key if it was loaded for version, otherwise loads it as (value, size)."""
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # load outside the lock, so other requests are not held up by it; concurrent misses may both load
+        value, size = load()
+        with self.lock:
+            old_entry = self.entries.pop(key, None)
+            if old_entry:
+                self.size -= old_entry[2]
+            budget = self.get_budget()
+            if size <= budget:
+                self.entries[key] = version, value, size
+                self.size += size
+                while self.size > budget:
+                    _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                    self.size -= evicted_size
+        return value
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries),
+                    "size": self.size, "budget": self.get_budget()}
+
+
+tracker_data_cache = DecodedDataCache(lambda: app.config["TRACKER_DATA_CACHE_STORED_SIZE"])
+
+
+def _load_multidata(room: Room) -> Tuple[Dict[str, Any], int]:
+    multidata = room.seed.multidata
+    return Context.decompress(multidata), len(multidata)
+
+
+def _load_multisave(room: Room) -> Tuple[Dict[str, Any], int]:
+    multisave = room.multisave
+    if not multisave:
+        return {}, 0
+    journal = room.save_journal_data
+    return Context.replay_journal(restricted_loads(multisave), journal), len(multisave) + len(journal)
+
+
+def _load_tracker_snapshot(snapshot: RoomTrackerSnapshot) -> Tuple[Dict[str, Any], int]:
+    data = snapshot.data
+    return restricted_loads(data), len(data)
+
+
+class GameNameTables(NamedTuple):
+    item_id_to_name: Dict[int, str]
+    location_id_to_name: Dict[int, str]
+    item_name_to_id: Dict[str, int]
+    location_name_to_id: Dict[str, int]
+
+
+def _load_game_name_tables(checksum: str) -> Tuple[GameNameTables, int]:
+    data = GameDataPackage.get(checksum=checksum).data
+    game_package = restricted_loads(data)
+    return GameNameTables(
+        KeyedDefaultDict(lambda code: f"Unknown Item (ID: {code})", {
+            id: name for name, id in game_package["item_name_to_id"].items()}),
+        KeyedDefaultDict(lambda code: f"Unknown Location (ID: {code})", {
+            id: name for name, id in game_package["location_name_to_id"].items()}),
+        game_package["item_name_to_id"],
+        game_package["location_name_to_id"],
+    ), len(data)
+
+
 def _cache_results(func: Callable) -> Callable:
     """Stores the results of any computationally expensive methods after the initial call in TrackerData.
     If called again, returns the cached result instead, as results will not change for the lifetime of TrackerData.
@@ -50,14 +137,21 @@ class TrackerData:
     """
     room: Room
     _multidata: Dict[str, Any]
-    _multisave: Dict[str, Any]
+    _multisave: Optional[Dict[str, Any]]
+    _snapshot: Optional[Dict[str, Any]]
+    _snapshot_version: Optional[int]
     _tracker_cache: Dict[str, Any]
 
     def __init__(self, room: Room):
         """Initialize a new RoomMultidata object for the current room."""
         self.room = room
-        self._multidata = Context.decompress(room.seed.multidata)
-        self._multisave = restricted_loads(room.multisave) if room.multisave else {}
+        self._multidata = tracker_data_cache.get(("multidata", room.seed.id), None, lambda: _load_multidata(room))
+        # the save is only loaded if needed, for rooms that did not publish a tracker snapshot yet
+        self._multisave = None
+        snapshot = room.tracker_snapshot
+        self._snapshot_version = snapshot.version if snapshot else None
+        self._snapshot = tracker_data_cache.get(("snapshot", room.id), snapshot.version,
+                                                lambda: _load_tracker_snapshot(snapshot)) if snapshot else None
         self._tracker_cache = {}
 
         self.item_name_to_id: Dict[str, Dict[str, int]] = {}
@@ -71,15 +165,47 @@ class TrackerData:
             game_name: KeyedDefaultDict(lambda code: f"Unknown Game {game_name} - Location (ID: {code})")
         })
         for game, game_package in self._multidata["datapackage"].items():
-            game_package = restricted_loads(GameDataPackage.get(checksum=game_package["checksum"]).data)
-            self.item_id_to_name[game] = KeyedDefaultDict(lambda code: f"Unknown Item (ID: {code})", {
-                id: name for name, id in game_package["item_name_to_id"].items()})
-            self.location_id_to_name[game] = KeyedDefaultDict(lambda code: f"Unknown Location (ID: {code})", {
-                id: name for name, id in game_package["location_name_to_id"].items()})
+            checksum = game_package["checksum"]
+            tables: GameNameTables = tracker_data_cache.get(("datapackage", checksum), None,
+                                                            lambda: _load_game_name_tables(checksum))
+            self.item_id_to_name[game] = tables.item_id_to_name
+            self.location_id_to_name[game] = tables.location_id_to_name
 
             # Normal lookup tables as well.
-            self.item_name_to_id[game] = game_package["item_name_to_id"]
-            self.location_name_to_id[game] = game_package["item_name_to_id"]
+            self.item_name_to_id[game] = tables.item_name_to_id
+            self.location_name_to_id[game] = tables.location_name_to_id
+
+    def _get_multisave(self) -> Dict[str, Any]:
+        if self._multisave is None:
+            # the room server publishes a tracker snapshot with each save, exit and unload saves included,
+            # rooms last saved before snapshots existed only change their save on activity
+            version = self._snapshot_version if self._snapshot_version is not None else self.room.last_activity
+            self._multisave = tracker_data_cache.get(("multisave", self.room.id), version,
+                                                     lambda: _load_multisave(self.room))
+        return self._multisave
+
+    def _get_slot_snapshot(self, team: int, player: int) -> Dict[str, Any]:
+        return self._snapshot["slots"].get((team, player), {})
+
+    def get_snapshot_version(self) -> Optional[int]:
+        """Retrieves the version of the room's tracker snapshot, None if it did not publish one yet."""
+        return self._snapshot_version
+
+    def get_checked_locations_since(self, version: int) -> Optional[Dict[TeamPlayer, List[int]]]:
+        """Retrieves the locations checked by each player after the tracker snapshot of version was published.
+        Returns None if the snapshot does not remember back that far.
+        """
+        if not self._snapshot:
+            return None
+        changes = self._snapshot.get("changes", [])
+        if not self._snapshot_version - len(changes) <= version <= self._snapshot_version:
+            return None
+        newly_checked: Dict[TeamPlayer, List[int]] = collections.defaultdict(list)
+        for change_version, checked in changes:
+            if change_version > version:
+                for team_player, location_ids in checked.items():
+                    newly_checked[team_player].extend(location_ids)
+        return newly_checked
 
     def get_seed_name(self) -> str:
         """Retrieves the seed name."""
@@ -102,16 +228,29 @@ class TrackerData:
         return self.get_slot_info(team, player).game
 
     def get_player_locations(self, team: int, player: int) -> Dict[int, ItemMetadata]:
-        """Retrieves all locations with their containing item's metadata for a given player."""
-        return self._multidata["locations"][player]
+        """Retrieves all locations with their containing item's metadata for a given player, none for groups."""
+        return self._multidata["locations"].get(player, {})
 
     def get_player_starting_inventory(self, team: int, player: int) -> List[int]:
-        """Retrieves a list of all item codes a given slot starts with."""
-        return self._multidata["precollected_items"][player]
+        """Retrieves a list of all item codes a given slot starts with, none for groups."""
+        return self._multidata["precollected_items"].get(player, [])
 
+    @_cache_results
     def get_player_checked_locations(self, team: int, player: int) -> Set[int]:
         """Retrieves the set of all locations marked complete by this player."""
-        return self._multisave.get("location_checks", {}).get((team, player), set())
+        if self._snapshot:
+            checked = self._get_slot_snapshot(team, player).get("checked", b"")
+            return {
+                location_id for index, location_id in enumerate(sorted(self._multidata["locations"].get(player, ())))
+                if checked[index >> 3] >> (index & 7) & 1
+            }
+        return self._get_multisave().get("location_checks", {}).get((team, player), set())
+
+    def get_player_checked_locations_count(self, team: int, player: int) -> int:
+        """Retrieves the number of locations marked complete by this player."""
+        if self._snapshot:
+            return self._get_slot_snapshot(team, player).get("checked_count", 0)
+        return len(self.get_player_checked_locations(team, player))
 
     @_cache_results
     def get_player_missing_locations(self, team: int, player: int) -> Set[int]:
@@ -119,26 +258,49 @@ class TrackerData:
         return set(self.get_player_locations(team, player)) - self.get_player_checked_locations(team, player)
 
     def get_player_received_items(self, team: int, player: int) -> List[NetworkItem]:
-        """Returns all items received to this player in order of received."""
-        return self._multisave.get("received_items", {}).get((team, player, True), [])
+        """Returns all items received to this player in order of received.
+        Always read from the save, the tracker snapshot only holds how often and when each item was received,
+        so this can be from a newer save than get_player_inventory_counts and get_player_received_items_order.
+        """
+        return self._get_multisave().get("received_items", {}).get((team, player, True), [])
 
     @_cache_results
     def get_player_inventory_counts(self, team: int, player: int) -> collections.Counter:
         """Retrieves a dictionary of all items received by their id and their received count."""
-        received_items = self.get_player_received_items(team, player)
         starting_items = self.get_player_starting_inventory(team, player)
         inventory = collections.Counter()
-        for item in received_items:
-            inventory[item.item] += 1
+        if self._snapshot:
+            inventory.update(self._get_slot_snapshot(team, player).get("inventory", {}))
+        else:
+            for item in self.get_player_received_items(team, player):
+                inventory[item.item] += 1
         for item in starting_items:
             inventory[item] += 1
 
         return inventory
 
+    @_cache_results
+    def get_player_received_items_order(self, team: int, player: int) -> Dict[int, int]:
+        """Retrieves the index of the last time each item was received by this player, counting starting items first.
+        """
+        starting_inventory = self.get_player_starting_inventory(team, player)
+        received_items_order = {item: index for index, item in enumerate(starting_inventory)}
+        if self._snapshot:
+            for item, index in self._get_slot_snapshot(team, player).get("received_order", {}).items():
+                received_items_order[item] = len(starting_inventory) + index
+        else:
+            for index, network_item in enumerate(self.get_player_received_items(team, player),
+                                                 start=len(starting_inventory)):
+                received_items_order[network_item.item] = index
+
+        return received_items_order
+
     @_cache_results
     def get_player_hints(self, team: int, player: int) -> Set[Hint]:
         """Retrieves a set of all hints relevant for a particular player."""
-        return self._multisave.get("hints", {}).get((team, player), set())
+        if self._snapshot:
+            return self._get_slot_snapshot(team, player).get("hints", set())
+        return self._get_multisave().get("hints", {}).get((team, player), set())
 
     @_cache_results
     def get_player_last_activity(self, team: int, player: int) -> Optional[datetime.timedelta]:
@@ -149,11 +311,15 @@ class TrackerData:
 
     def get_player_client_status(self, team: int, player: int) -> ClientStatus:
         """Retrieves the ClientStatus of a particular player."""
-        return self._multisave.get("client_game_state", {}).get((team, player), ClientStatus.CLIENT_UNKNOWN)
+        if self._snapshot:
+            return self._get_slot_snapshot(team, player).get("status", ClientStatus.CLIENT_UNKNOWN)
+        return self._get_multisave().get("client_game_state", {}).get((team, player), ClientStatus.CLIENT_UNKNOWN)
 
     def get_player_alias(self, team: int, player: int) -> Optional[str]:
         """Returns the alias of a particular player, if any."""
-        return self._multisave.get("name_aliases", {}).get((team, player), None)
+        if self._snapshot:
+            return self._get_slot_snapshot(team, player).get("alias", None)
+        return self._get_multisave().get("name_aliases", {}).get((team, player), None)
 
     @_cache_results
     def get_team_completed_worlds_count(self) -> Dict[int, int]:
@@ -187,7 +353,7 @@ class TrackerData:
     def get_team_locations_checked_count(self) -> Dict[int, int]:
         """Retrieves a dictionary of checked player locations each team has."""
         return {
-            team: sum(len(self.get_player_checked_locations(team, player)) for player in players)
+            team: sum(self.get_player_checked_locations_count(team, player) for player in players)
             for team, players in self.get_all_players().items()
         }
 
@@ -242,7 +408,7 @@ class TrackerData:
     def get_room_locations_complete(self) -> Dict[TeamPlayer, int]:
         """Retrieves a dictionary of all locations complete per player."""
         return {
-            (team, player): len(self.get_player_checked_locations(team, player))
+            (team, player): self.get_player_checked_locations_count(team, player)
             for team, players in self.get_all_players().items() for player in players
         }
 
@@ -275,7 +441,11 @@ class TrackerData:
         """
         last_activity: Dict[TeamPlayer, datetime.timedelta] = {}
         now = datetime.datetime.utcnow()
-        for (team, player), timestamp in self._multisave.get("client_activity_timers", []):
+        if self._snapshot:
+            timers = self._snapshot["activity"]
+        else:
+            timers = self._get_multisave().get("client_activity_timers", [])
+        for (team, player), timestamp in timers:
             last_activity[team, player] = now - datetime.datetime.utcfromtimestamp(timestamp)
 
         return last_activity
@@ -287,7 +457,8 @@ class TrackerData:
         Only supported platforms are Twitch and YouTube.
         """
         video_feeds = {}
-        for (team, player), video_data in self._multisave.get("video", []):
+        videos = self._snapshot["video"] if self._snapshot else self._get_multisave().get("video", [])
+        for (team, player), video_data in videos:
             video_feeds[team, player] = video_data
 
         return video_feeds
@@ -403,14 +574,6 @@ def get_enabled_multiworld_trackers(room: Room) -> Dict[str, Callable]:
 def render_generic_tracker(tracker_data: TrackerData, team: int, player: int) -> str:
     game = tracker_data.get_player_game(team, player)
 
-    received_items_in_order = {}
-    starting_inventory = tracker_data.get_player_starting_inventory(team, player)
-    for index, item in enumerate(starting_inventory):
-        received_items_in_order[item] = index
-    for index, network_item in enumerate(tracker_data.get_player_received_items(team, player),
-                                         start=len(starting_inventory)):
-        received_items_in_order[network_item.item] = index
-
     return render_template(
         template_name_or_list="genericTracker.html",
         game_specific_tracker=game in _player_trackers,
@@ -421,7 +584,7 @@ def render_generic_tracker(tracker_data: TrackerData, team: int, player: int) ->
         inventory=tracker_data.get_player_inventory_counts(team, player),
         locations=tracker_data.get_player_locations(team, player),
         checked_locations=tracker_data.get_player_checked_locations(team, player),
-        received_items=received_items_in_order,
+        received_items=tracker_data.get_player_received_items_order(team, player),
         saving_second=tracker_data.get_room_saving_second(),
         game=game,
         games=tracker_data.get_room_games(),
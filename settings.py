@@ -586,6 +586,9 @@ class ServerOptions(Group):
         OFF = 0
         ON = 1
 
+    class DataStorageSlotLimit(int):
+        """Approximate bytes each slot may store in the data storage, 0 for no limit"""
+
     host: Optional[str] = None
     port: int = 38281
     password: Optional[str] = None
@@ -603,6 +606,7 @@ class ServerOptions(Group):
     auto_shutdown: AutoShutdown = AutoShutdown(0)
     compatibility: Compatibility = Compatibility(2)
     log_network: LogNetwork = LogNetwork(0)
+    datastorage_slot_limit: DataStorageSlotLimit = DataStorageSlotLimit(0)
 
 
 class GeneratorOptions(Group):
@@ -662,6 +666,12 @@ class GeneratorOptions(Group):
         start_inventory -> Move remaining items to start_inventory, generate additional filler items to fill locations.
         """
 
+    class StageWorkers(int):
+        """
+        Amount of threads for the generation steps that worlds declare as isolated per player, 0 runs them one by one.
+        Only speeds up generation on free-threaded Python builds or for steps that release the GIL.
+        """
+
     enemizer_path: EnemizerPath = EnemizerPath("EnemizerCLI/EnemizerCLI.Core")  # + ".exe" is implied on Windows
     player_files_path: PlayerFilesPath = PlayerFilesPath("Players")
     players: Players = Players(0)
@@ -671,6 +681,7 @@ class GeneratorOptions(Group):
     race: Race = Race(0)
     plando_options: PlandoOptions = PlandoOptions("bosses, connections, texts")
     panic_method: PanicMethod = PanicMethod("swap")
+    stage_workers: StageWorkers = StageWorkers(0)
 
 
 class SNIOptions(Group):
@@ -20,6 +20,7 @@ def run_locations_benchmark():
         gen_steps: typing.Tuple[str, ...] = (
             "generate_early", "create_regions", "create_items", "set_rules", "generate_basic", "pre_fill")
         rule_iterations: int = 100_000
+        item_iterations: int = 100
 
         if sys.version_info >= (3, 9):
             @staticmethod
@@ -40,6 +41,25 @@ def run_locations_benchmark():
                 gc.collect()
             return t.dif
 
+        def item_count_test(self, state: CollectionState, game: str) -> None:
+            """Compares the interned prog_items lookups of CollectionState against lookups in a plain Counter."""
+            item_names = sorted(AutoWorld.AutoWorldRegister.world_types[game].item_names)
+            if not item_names:
+                return
+            counter = collections.Counter(dict(state.prog_items[1].items()))
+            with TimeIt(f"{game} {self.item_iterations} Counter lookups of {len(item_names)} item names", logger) as t:
+                for _ in range(self.item_iterations):
+                    for item_name in item_names:
+                        counter[item_name] >= 1
+                    sum(counter[item_name] for item_name in item_names)
+            counter_time = t.dif
+            with TimeIt(f"{game} {self.item_iterations} state.has of {len(item_names)} item names", logger) as t:
+                for _ in range(self.item_iterations):
+                    for item_name in item_names:
+                        state.has(item_name, 1)
+                    state.count_group("Everything", 1)
+            logger.info(f"{game} interned item lookups took {t.dif / counter_time:.2%} of the Counter time.")
+
         def main(self):
             for game in sorted(AutoWorld.AutoWorldRegister.world_types):
                 summary_data: typing.Dict[str, collections.Counter[str]] = {
@@ -70,6 +90,8 @@ def run_locations_benchmark():
                         continue
 
                     all_state = multiworld.get_all_state(False)
+                    self.item_count_test(multiworld.state, game)
+                    self.item_count_test(all_state, game)
                     for location in locations:
                         time_taken = self.location_test(location, multiworld.state, "empty_state")
                         summary_data["empty_state"][location.name] = time_taken
@@ -0,0 +1,78 @@
+def run_reachability_benchmark():
+    """Compares sweeping and reachability updates of opaque access rules against rules with declared dependencies."""
+    import argparse
+    import logging
+    import gc
+
+    from time_it import TimeIt
+
+    from Utils import init_logging
+    from BaseClasses import CollectionState, Item, ItemClassification, Location, MultiWorld, Region
+    from worlds import AutoWorld
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    class BenchmarkRunner:
+        players: int = 40
+        regions_per_player: int = 100
+        locations_per_region: int = 5
+        sweep_iterations: int = 5
+
+        def create_multiworld(self, declare: bool) -> MultiWorld:
+            """Per player, a hub with an exit to each region, where each region holds the key to the next one."""
+            multiworld = MultiWorld(self.players)
+            multiworld.player_name = {player: f"Tester{player}" for player in multiworld.player_ids}
+            multiworld.set_seed(0)
+            args = argparse.Namespace()
+            world_type = AutoWorld.AutoWorldRegister.world_types["Archipelago"]
+            for name, option in world_type.options_dataclass.type_hints.items():
+                setattr(args, name, {player: option.from_any(option.default) for player in multiworld.player_ids})
+            multiworld.set_options(args)
+            for player in multiworld.player_ids:
+                hub = Region("Menu", player, multiworld)
+                multiworld.regions.append(hub)
+                for i in range(self.regions_per_player):
+                    key_names = (f"Key {i}", f"Key {(i + 1) // 2}") if i else ()
+                    region = Region(f"Region {i}", player, multiworld)
+                    multiworld.regions.append(region)
+                    entrance = hub.connect(region, rule=lambda state, key_names=key_names, player=player:
+                                           state.has_all(key_names, player))
+                    if declare:
+                        multiworld.register_rule_dependencies(entrance, key_names)
+                    event = Location(player, f"Event {i}", None, region)
+                    region.locations.append(event)
+                    event.place_locked_item(Item(f"Key {i + 1}", ItemClassification.progression, None, player))
+                    for j in range(self.locations_per_region):
+                        location = Location(player, f"Location {i}-{j}", None, region)
+                        location.access_rule = lambda state, key_name=f"Key {i + 1}", player=player: \
+                            state.has(key_name, player)
+                        region.locations.append(location)
+                        location.place_locked_item(Item(f"Token {i}-{j}", ItemClassification.progression, None,
+                                                        player))
+                        if declare:
+                            multiworld.register_rule_dependencies(location, [f"Key {i + 1}"])
+            return multiworld
+
+        def sweep_test(self, multiworld: MultiWorld, name: str) -> float:
+            with TimeIt(f"{self.sweep_iterations} sweeps with {name} rules", logger) as t:
+                for _ in range(self.sweep_iterations):
+                    state = CollectionState(multiworld)
+                    state.sweep_for_events()
+                gc.collect()
+            return t.dif
+
+        def main(self):
+            opaque_time = self.sweep_test(self.create_multiworld(False), "opaque")
+            declared_time = self.sweep_test(self.create_multiworld(True), "declared")
+            logger.info(f"Declared rule dependencies took {declared_time / opaque_time:.2%} of the opaque time "
+                        f"for {self.players} players with {self.regions_per_player} regions each.")
+
+    runner = BenchmarkRunner()
+    runner.main()
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_reachability_benchmark()
@@ -0,0 +1,70 @@
+def run_server_messages_benchmark():
+    """Compares encoding server messages per client against encoding them once, and the json module against the
+    installed encoding backend."""
+    import logging
+
+    from time_it import TimeIt
+
+    from Utils import init_logging
+    import NetUtils
+    from NetUtils import EncodedJSON, NetworkItem, NetworkSlot, SlotType, encode
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    class BenchmarkRunner:
+        clients: int = 200
+        items: int = 1000
+        iterations: int = 20
+
+        def __init__(self):
+            self.received_items = [{"cmd": "ReceivedItems", "index": 0,
+                                    "items": [NetworkItem(item, item, item % 50, 1) for item in range(self.items)]}]
+            self.slot_info = {slot: NetworkSlot(f"Player{slot}", "Archipelago", SlotType.player)
+                              for slot in range(1, self.clients + 1)}
+
+        def fan_out_test(self) -> None:
+            with TimeIt(f"{self.iterations} ReceivedItems of {self.items} items encoded for each of "
+                        f"{self.clients} clients", logger) as per_client:
+                for _ in range(self.iterations):
+                    for _ in range(self.clients):
+                        encode(self.received_items)
+            with TimeIt(f"{self.iterations} ReceivedItems encoded once for all clients", logger) as once:
+                for _ in range(self.iterations):
+                    encode(self.received_items)
+            logger.info(f"Encoding once took {once.dif / per_client.dif:.2%} of the per client time.")
+
+        def slot_info_test(self) -> None:
+            connected = {"cmd": "Connected", "team": 0, "slot": 1, "slot_info": self.slot_info}
+            with TimeIt(f"{self.clients} Connected with slot_info of {len(self.slot_info)} slots", logger) as plain:
+                for _ in range(self.clients):
+                    encode([connected])
+            encoded_slot_info = EncodedJSON(encode(self.slot_info))
+            with TimeIt(f"{self.clients} Connected with pre-encoded slot_info", logger) as cached:
+                for _ in range(self.clients):
+                    encode([{**connected, "slot_info": encoded_slot_info}])
+            logger.info(f"Pre-encoded slot_info took {cached.dif / plain.dif:.2%} of the plain time.")
+
+        def backend_test(self) -> None:
+            scanned = NetUtils._scan_for_TypedTuples(self.received_items, [])
+            with TimeIt(f"{self.iterations * self.clients} encodes with the json module", logger) as json_time:
+                for _ in range(self.iterations * self.clients):
+                    NetUtils._json_encode(scanned)
+            with TimeIt(f"{self.iterations * self.clients} encodes with the installed backend", logger) as backend:
+                for _ in range(self.iterations * self.clients):
+                    NetUtils._encode(scanned)
+            logger.info(f"The installed backend took {backend.dif / json_time.dif:.2%} of the json module time.")
+
+        def main(self):
+            self.fan_out_test()
+            self.slot_info_test()
+            self.backend_test()
+
+    runner = BenchmarkRunner()
+    runner.main()
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_server_messages_benchmark()
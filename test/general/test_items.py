@@ -1,9 +1,29 @@
 import unittest
+from typing import Any
 
+from BaseClasses import CollectionState
 from worlds.AutoWorld import AutoWorldRegister, call_all
 from . import setup_solo_multiworld
 
 
+def get_comparable(value: Any, depth: int = 3) -> Any:
+    """Turns what worlds keep in a CollectionState into values that compare equal if their contents are equal."""
+    if isinstance(value, dict):
+        return {key: get_comparable(entry, depth - 1) for key, entry in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [get_comparable(entry, depth - 1) for entry in value]
+    if depth > 0 and hasattr(value, "__dict__"):
+        return type(value).__name__, get_comparable(vars(value), depth - 1)
+    return value
+
+
+def get_item_state(state: CollectionState) -> Any:
+    """Returns what collecting items changes in state, except for reachability, which removing items resets."""
+    return ({player: dict(prog_items.items()) for player, prog_items in state.prog_items.items()},
+            get_comparable({name: value for name, value in vars(state).items()
+                            if name not in CollectionState.__annotations__}))
+
+
 class TestBase(unittest.TestCase):
     def test_create_item(self):
         """Test that a world can successfully create all items in its datapackage"""
@@ -64,6 +84,35 @@ class TestBase(unittest.TestCase):
                 for item in multiworld.itempool:
                     self.assertIn(item.name, world_type.item_name_to_id)
 
+    def test_remove_undoes_collect(self):
+        """Test that removing items from a state undoes collecting them, which filling and balancing rely on"""
+        for game_name, world_type in AutoWorldRegister.world_types.items():
+            with self.subTest("Game", game=game_name):
+                multiworld = setup_solo_multiworld(world_type)
+                state = CollectionState(multiworld)
+                expected = get_item_state(state)
+                for item in multiworld.itempool:
+                    state.collect(item, True)
+                # in the order they were collected, so not each removal undoes the latest collection
+                for item in multiworld.itempool:
+                    state.remove(item, True)
+                self.assertEqual(get_item_state(state), expected)
+
+    def test_collect_again_after_remove(self):
+        """Test that removing an item from a state with many items and collecting it again restores the state,
+        as progression balancing does while testing which items to move"""
+        for game_name, world_type in AutoWorldRegister.world_types.items():
+            with self.subTest("Game", game=game_name):
+                multiworld = setup_solo_multiworld(world_type)
+                state = CollectionState(multiworld)
+                for item in multiworld.itempool:
+                    state.collect(item, True)
+                expected = get_item_state(state)
+                for item in multiworld.itempool:
+                    state.remove(item, True)
+                    state.collect(item, True)
+                self.assertEqual(get_item_state(state), expected)
+
     def test_itempool_not_modified(self):
         """Test that worlds don't modify the itempool after `create_items`"""
         gen_steps = ("generate_early", "create_regions", "create_items")
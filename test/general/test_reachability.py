@@ -1,8 +1,9 @@
 import unittest
 
-from BaseClasses import CollectionState
+from BaseClasses import CollectionState, Item, ItemClassification, Location, MultiWorld, Region
 from worlds.AutoWorld import AutoWorldRegister
-from . import setup_solo_multiworld
+from worlds.generic.Rules import add_rule
+from . import generate_test_multiworld, setup_solo_multiworld
 
 
 class TestBase(unittest.TestCase):
@@ -69,3 +70,98 @@ class TestBase(unittest.TestCase):
                             locations.add(location)
                     self.assertGreater(len(locations), 0,
                                        msg="Need to be able to reach at least one location to get started.")
+
+
+class TestRuleDependencies(unittest.TestCase):
+    chain_length = 10
+
+    def build_multiworld(self, declare: bool) -> MultiWorld:
+        """Builds a chain of regions, each unlocked by an event key found in the previous region."""
+        multiworld = generate_test_multiworld()
+        parent = multiworld.get_region("Menu", 1)
+        for i in range(self.chain_length):
+            event = Location(1, f"Event {i}", None, parent)
+            parent.locations.append(event)
+            event.place_locked_item(Item(f"Key {i}", ItemClassification.progression, None, 1))
+            region = Region(f"Region {i}", 1, multiworld)
+            multiworld.regions.append(region)
+            entrance = parent.connect(region, rule=lambda state, i=i: state.has(f"Key {i}", 1))
+            if declare:
+                multiworld.register_rule_dependencies(entrance, [f"Key {i}"])
+            if i:
+                # a second lock on the previous key, depending on an item found later on
+                late_event = Location(1, f"Late Event {i}", None, parent)
+                late_event.access_rule = lambda state, i=i: state.has(f"Key {i}", 1)
+                parent.locations.append(late_event)
+                late_event.place_locked_item(Item(f"Late Key {i}", ItemClassification.progression, None, 1))
+                if declare:
+                    multiworld.register_rule_dependencies(late_event, [f"Key {i}"])
+            parent = region
+        return multiworld
+
+    def test_sweep_matches_opaque_rules(self):
+        """Tests that declared rule dependencies reach the same regions and events as opaque rules"""
+        declared = self.build_multiworld(True)
+        opaque = self.build_multiworld(False)
+        self.assertTrue(declared.rule_dependencies)
+        self.assertFalse(opaque.rule_dependencies)
+        declared_state = CollectionState(declared)
+        opaque_state = CollectionState(opaque)
+        declared_state.sweep_for_events()
+        opaque_state.sweep_for_events()
+        self.assertEqual({region.name for region in declared_state.reachable_regions[1]},
+                         {region.name for region in opaque_state.reachable_regions[1]})
+        self.assertEqual(declared_state.prog_items[1], opaque_state.prog_items[1])
+        self.assertEqual(len(declared_state.events), 2 * self.chain_length - 1)
+
+    def test_spheres_match_opaque_rules(self):
+        """Tests that get_spheres yields the same spheres and unreachable locations with declared rule dependencies"""
+        def sphere_names(multiworld: MultiWorld):
+            return [{location.name for location in sphere} for sphere in multiworld.get_spheres()]
+
+        declared = self.build_multiworld(True)
+        opaque = self.build_multiworld(False)
+        unreachable = Location(1, "Unreachable", None, declared.get_region("Menu", 1))
+        unreachable.access_rule = lambda state: False
+        unreachable.place_locked_item(Item("Nothing", ItemClassification.progression, None, 1))
+        declared.get_region("Menu", 1).locations.append(unreachable)
+        spheres = sphere_names(declared)
+        self.assertEqual(spheres[:-2], sphere_names(opaque))
+        self.assertEqual(spheres[-2:], [set(), {"Unreachable"}])
+
+    def test_incremental_update_after_collect(self):
+        """Tests that collecting a declared item unlocks the entrance depending on it, including in copies"""
+        multiworld = self.build_multiworld(True)
+        state = CollectionState(multiworld)
+        region = multiworld.get_region("Region 0", 1)
+        self.assertFalse(region.can_reach(state))
+        copied_state = state.copy()
+        state.collect(Item("Key 0", ItemClassification.progression, None, 1), True)
+        self.assertTrue(region.can_reach(state))
+        self.assertFalse(region.can_reach(copied_state))
+        copied_state.collect(Item("Key 0", ItemClassification.progression, None, 1), True)
+        self.assertTrue(region.can_reach(copied_state))
+
+    def test_replaced_rule_is_opaque(self):
+        """Tests that replacing a declared rule drops its dependencies"""
+        multiworld = self.build_multiworld(True)
+        entrance = multiworld.get_region("Region 0", 1).entrances[0]
+        self.assertEqual(entrance.item_dependencies, {"Key 0"})
+        add_rule(entrance, lambda state: state.has("Key 1", 1))
+        self.assertIsNone(entrance.item_dependencies)
+        state = CollectionState(multiworld)
+        state.collect(Item("Key 0", ItemClassification.progression, None, 1), True)
+        self.assertFalse(entrance.connected_region.can_reach(state))
+        state.collect(Item("Key 1", ItemClassification.progression, None, 1), True)
+        self.assertTrue(entrance.connected_region.can_reach(state))
+
+    def test_assigned_rule_is_opaque(self):
+        """Tests that assigning a new access rule directly drops the dependencies of the old one"""
+        multiworld = self.build_multiworld(True)
+        entrance = multiworld.get_region("Region 0", 1).entrances[0]
+        state = CollectionState(multiworld)
+        self.assertFalse(entrance.connected_region.can_reach(state))
+        entrance.access_rule = lambda state: state.has("Key 1", 1)
+        self.assertIsNone(entrance.item_dependencies)
+        state.collect(Item("Key 1", ItemClassification.progression, None, 1), True)
+        self.assertTrue(entrance.connected_region.can_reach(state))
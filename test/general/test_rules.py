@@ -0,0 +1,92 @@
+import unittest
+
+from BaseClasses import CollectionState, Item, ItemClassification, Location, Region
+from worlds.generic.Rules import And, CanReach, Constant, Count, Has, HasAll, HasAny, Opaque, Or, add_rule, \
+    compile_rules
+from . import generate_test_multiworld
+
+
+class TestRules(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld()
+        self.state = CollectionState(self.multiworld)
+
+    def collect(self, *item_names: str) -> None:
+        for item_name in item_names:
+            self.state.collect(Item(item_name, ItemClassification.progression, None, 1), True)
+
+    def test_simplify(self):
+        """Tests that simplification flattens nodes and merges the item checks of a player"""
+        function = lambda state: True
+        rule = (Has("A", 1) & Has("B", 1) & Constant(True)) & (Has("A", 1, 2) | Opaque(function))
+        self.assertEqual(rule.simplify(), And(HasAll(["A", "B"], 1), Or(Has("A", 1, 2), Opaque(function))))
+        self.assertEqual((Has("A", 1) | HasAny(["B", "A"], 1) | Has("C", 1, 3)).simplify(),
+                         Or(HasAny(["A", "B"], 1), Has("C", 1, 3)))
+        self.assertEqual((Has("A", 1) & Constant(False)).simplify(), Constant(False))
+        self.assertEqual(Count([Has("A", 1), Has("B", 1), Constant(True)], 2).simplify(), HasAny(["A", "B"], 1))
+        self.assertEqual(Count([Has("A", 1), Has("B", 1)], 3).simplify(), Constant(False))
+
+    def test_dependencies(self):
+        """Tests that rules report the items they read, and None once they can read anything else"""
+        rule = Has("A", 1) & (HasAny(["B", "C"], 1) | Has("D", 2))
+        self.assertEqual(rule.get_item_dependencies(), {1: {"A", "B", "C"}, 2: {"D"}})
+        self.assertIsNone((rule | CanReach("Menu", 1)).get_item_dependencies())
+
+    def test_compiled_matches_evaluation(self):
+        """Tests that compiled rules give the same results as evaluating them node by node"""
+        rules = [
+            Has("A", 1, 2) | (Has("B", 1) & HasAll(["C", "D"], 1)),
+            Count([Has("A", 1), Has("B", 1), Has("C", 1), CanReach("Menu", 1)], 3),
+            And(*(Or(Has(f"Item {i}", 1), Has("A", 1)) for i in range(100))),
+        ]
+        for items in ([], ["A"], ["A", "A"], ["B", "C"], ["B", "C", "D"]):
+            self.state = CollectionState(self.multiworld)
+            self.collect(*items)
+            for rule in rules:
+                with self.subTest(rule=rule, items=items):
+                    expected = self.evaluate(rule)
+                    self.assertEqual(rule(self.state), expected)
+                    self.assertEqual(bool(rule.simplify().compile()(self.state)), expected)
+
+    def evaluate(self, rule) -> bool:
+        if isinstance(rule, And):
+            return all(self.evaluate(child) for child in rule.rules)
+        if isinstance(rule, Or):
+            return any(self.evaluate(child) for child in rule.rules)
+        if isinstance(rule, Count):
+            return sum(self.evaluate(child) for child in rule.rules) >= rule.count
+        return bool(rule(self.state))
+
+    def test_add_rule_combines(self):
+        """Tests that add_rule combines Rules into one flat rule that compile_rules compiles,
+        and chains other rules like before"""
+        region = Region("Locked", 1, self.multiworld)
+        self.multiworld.regions.append(region)
+        location = Location(1, "Chest", None, region)
+        region.locations.append(location)
+        self.multiworld.get_region("Menu", 1).connect(region)
+        add_rule(location, Has("A", 1))
+        add_rule(location, Has("C", 1))
+        self.assertEqual(len(location.access_rule.rules), 2)
+        compile_rules(self.multiworld, 1)
+        self.assertEqual(location.item_dependencies, {"A", "C"})
+        add_rule(location, Has("D", 1), "or")
+        self.assertEqual(location.item_dependencies, {"A", "C", "D"}, "a compiled rule should stay compiled")
+        add_rule(location, lambda state: state.has("B", 1))
+        self.assertNotIsInstance(location.access_rule, And)
+        self.assertIsNone(location.item_dependencies)
+        self.collect("A", "C")
+        self.assertFalse(location.can_reach(self.state))
+        self.collect("B")
+        self.assertTrue(location.can_reach(self.state))
+
+    def test_compile_rules_registers_dependencies(self):
+        """Tests that compile_rules registers the item dependencies of rules only reading their own player's items"""
+        region = Region("Locked", 1, self.multiworld)
+        self.multiworld.regions.append(region)
+        entrance = self.multiworld.get_region("Menu", 1).connect(region, rule=Has("Key", 1) | Has("Other Key", 1))
+        compile_rules(self.multiworld, 1)
+        self.assertEqual(entrance.item_dependencies, {"Key", "Other Key"})
+        self.assertFalse(self.state.can_reach(region))
+        self.collect("Other Key")
+        self.assertTrue(self.state.can_reach(region))
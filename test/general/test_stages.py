@@ -0,0 +1,22 @@
+import unittest
+
+from worlds.AutoWorld import AutoWorldRegister, call_all
+from . import gen_steps, setup_multiworld
+
+
+class TestParallelStages(unittest.TestCase):
+    def test_parallel_stages_match_sequential(self):
+        """Tests that running parallel_stages in threads creates the same regions and item pool as calling them in
+        order, including with players in between that can't run in parallel"""
+        world_types = [AutoWorldRegister.world_types[game] for game in ("Clique", "Clique", "Archipelago", "Clique")]
+        self.assertIn("create_items", world_types[0].parallel_stages)
+        results = []
+        for stage_workers in (0, 4):
+            multiworld = setup_multiworld(world_types, (), seed=0)
+            multiworld.stage_workers = stage_workers
+            for step in gen_steps:
+                call_all(multiworld, step)
+            results.append(([(item.name, item.player) for item in multiworld.itempool],
+                            [(region.name, region.player) for region in multiworld.get_regions()]))
+            self.assertTrue(multiworld.random.passthrough)
+        self.assertEqual(results[0], results[1])
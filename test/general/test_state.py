@@ -0,0 +1,265 @@
+import unittest
+from collections import Counter
+
+from BaseClasses import CollectionState, Item, ItemClassification, ItemCounter, ItemNameIndex, Location, MultiWorld, \
+    Region
+from . import generate_test_multiworld
+
+
+class TestStateCopy(unittest.TestCase):
+    players = 3
+
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld(self.players)
+        for player in self.multiworld.player_ids:
+            menu = self.multiworld.get_region("Menu", player)
+            region = Region("Locked", player, self.multiworld)
+            self.multiworld.regions.append(region)
+            menu.connect(region, rule=lambda state, player=player: state.has("Key", player))
+            location = Location(player, "Event", None, region)
+            region.locations.append(location)
+            location.place_locked_item(Item("Prize", ItemClassification.progression, None, player))
+
+    def key(self, player: int) -> Item:
+        return Item("Key", ItemClassification.progression, None, player)
+
+    def test_copies_are_independent(self):
+        """Tests that changes to either the state or its copy don't show up in the other one"""
+        state = CollectionState(self.multiworld)
+        state.collect(self.key(1), True)
+        state.sweep_for_events()
+        copied_state = state.copy()
+        state.collect(self.key(2), True)
+        copied_state.collect(self.key(3), True)
+        state.sweep_for_events()
+        copied_state.sweep_for_events()
+        self.assertEqual([state.has("Prize", player) for player in self.multiworld.player_ids], [True, True, False])
+        self.assertEqual([copied_state.has("Prize", player) for player in self.multiworld.player_ids],
+                         [True, False, True])
+        self.assertEqual(state.copy().prog_items, state.prog_items)
+
+    def test_untouched_players_are_shared(self):
+        """Tests that a copy only clones the parts of the players that are accessed"""
+        state = CollectionState(self.multiworld)
+        state.sweep_for_events()
+        copied_state = state.copy()
+        self.assertEqual(set(copied_state.prog_items.shared), set(self.multiworld.player_ids))
+        copied_state.collect(self.key(1), True)
+        self.assertEqual(set(copied_state.prog_items.shared), {2, 3})
+        self.assertIs(copied_state.reachable_regions.shared[2], state.reachable_regions[2])
+        state.collect(self.key(2), True)
+        self.assertTrue(state.can_reach("Locked", "Region", 2))
+        self.assertNotIn(2, copied_state.reachable_regions.shared)
+        self.assertFalse(copied_state.can_reach("Locked", "Region", 2))
+
+    def test_reading_keeps_sharing(self):
+        """Tests that reading a copy, including a sweep that finds nothing new, doesn't clone what it shares"""
+        state = CollectionState(self.multiworld)
+        state.sweep_for_events()
+        copied_state = state.copy()
+        self.assertFalse(copied_state.has("Key", 1))
+        self.assertEqual(copied_state.count("Prize", 2), 0)
+        self.assertFalse(copied_state.can_reach("Locked", "Region", 3))
+        copied_state.sweep_for_events()
+        self.assertEqual(set(copied_state.prog_items.shared), set(self.multiworld.player_ids))
+        self.assertEqual(set(copied_state.reachable_regions.shared), set(self.multiworld.player_ids))
+        self.assertEqual(set(copied_state.blocked_connections.shared), set(self.multiworld.player_ids))
+
+    def test_reading_players_keeps_sharing(self):
+        """Tests that reading which players a copy has, comparing and copying it doesn't clone what it shares"""
+        state = CollectionState(self.multiworld)
+        state.collect(self.key(1), True)
+        copied_state = state.copy()
+        prog_items = copied_state.prog_items
+        self.assertIn(1, prog_items)
+        self.assertNotIn(4, prog_items)
+        self.assertEqual(list(prog_items), [1, 2, 3])
+        self.assertEqual(len(prog_items), 3)
+        self.assertEqual(prog_items, state.prog_items)
+        copied_items = prog_items.copy()
+        self.assertEqual(set(prog_items.shared), {1, 2, 3})
+        self.assertIs(copied_items.shared[1], prog_items.shared[1])
+        self.assertEqual(copied_items.get(1)["Key"], 1)
+        self.assertEqual(set(copied_items.shared), {2, 3})
+        copied_items[1]["Key"] += 1
+        self.assertEqual((state.count("Key", 1), copied_state.count("Key", 1)), (1, 1))
+
+    def test_copy_during_reachability_update(self):
+        """Tests that copying a state from within an access rule doesn't mix up the copy and the original"""
+        copies = []
+
+        def rule(state: CollectionState) -> bool:
+            copies.append(state.copy())
+            return True
+
+        region = Region("Copying", 1, self.multiworld)
+        self.multiworld.regions.append(region)
+        self.multiworld.get_region("Menu", 1).connect(region, rule=rule)
+        state = CollectionState(self.multiworld)
+        self.assertTrue(state.can_reach(region))
+        self.assertTrue(copies)
+        self.assertNotIn(region, copies[0].reachable_regions[1])
+        copies[0].collect(self.key(1), True)
+        self.assertTrue(copies[0].can_reach("Locked", "Region", 1))
+        self.assertFalse(state.can_reach("Locked", "Region", 1))
+
+    def test_additional_copy_functions(self):
+        """Tests that LogicMixin style attributes are initialized and copied"""
+        def init(state: CollectionState, multiworld: MultiWorld) -> None:
+            state.test_initialized = True
+            state.test_copied = False
+
+        def copy(state: CollectionState, ret: CollectionState) -> CollectionState:
+            ret.test_copied = True
+            return ret
+
+        CollectionState.additional_init_functions.append(init)
+        CollectionState.additional_copy_functions.append(copy)
+        try:
+            copied_state = CollectionState(self.multiworld).copy()
+        finally:
+            CollectionState.additional_init_functions.remove(init)
+            CollectionState.additional_copy_functions.remove(copy)
+        self.assertTrue(copied_state.test_initialized)
+        self.assertTrue(copied_state.test_copied)
+
+    def test_remove_undoes_collect(self):
+        """Tests that removing items collected as events restores the previous state, filler items included"""
+        state = CollectionState(self.multiworld)
+        state.sweep_for_events()
+        items = [self.key(1), self.key(1), Item("Filler", ItemClassification.filler, None, 1)]
+        for item in items:
+            state.collect(item, True)
+        self.assertTrue(state.can_reach("Locked", "Region", 1))
+        for item in items:
+            state.remove(item, True)
+        self.assertFalse(state.prog_items[1])
+        self.assertFalse(state.can_reach("Locked", "Region", 1))
+
+    def test_access_results(self):
+        """Tests that results of rules with declared dependencies are shared with copies until the items change"""
+        calls = []
+
+        def rule(state: CollectionState) -> bool:
+            calls.append(state)
+            return state.has("Key", 1)
+
+        location = Location(1, "Chest", None, self.multiworld.get_region("Menu", 1))
+        location.access_rule = rule
+        self.multiworld.register_rule_dependencies(location, ["Key"])
+        state = CollectionState(self.multiworld)
+        self.assertFalse(state.check_access(location))
+        copied_state = state.copy()
+        state.collect(self.key(2), True)
+        self.assertFalse(copied_state.check_access(location))
+        self.assertFalse(state.check_access(location))
+        self.assertEqual(len(calls), 1)
+        copied_state.collect(self.key(1), True)
+        self.assertTrue(copied_state.check_access(location))
+        self.assertFalse(state.check_access(location))
+        state.collect(self.key(1), True)
+        state.remove(self.key(1), True)
+        self.assertFalse(state.check_access(location))
+        self.assertEqual(len(calls), 3)
+
+    def test_access_results_in_fill_scan(self):
+        """Tests that scanning locations with declared lambda rules for one item per player, like fill_restrictive does,
+        evaluates each rule once, and again only after the items of its own player changed"""
+        calls = []
+        locations = []
+        for player in self.multiworld.player_ids:
+            menu = self.multiworld.get_region("Menu", player)
+            for i in range(10):
+                location = Location(player, f"Chest {i}", None, menu)
+                location.access_rule = lambda state, player=player, i=i: \
+                    calls.append(player) or state.has("Key", player, i)
+                self.multiworld.register_rule_dependencies(location, ["Key"])
+                locations.append(location)
+        state = CollectionState(self.multiworld)
+        for player in self.multiworld.player_ids:
+            item = Item("Sword", ItemClassification.progression, None, player)
+            self.assertEqual(len([location for location in locations if location.can_fill(state, item)]), 3)
+        self.assertEqual(len(calls), len(locations), "each rule should only be evaluated in the first scan")
+        state.collect(self.key(1), True)
+        self.assertEqual(len([location for location in locations if location.can_reach(state)]), 4)
+        self.assertEqual(calls.count(2) + calls.count(3), 20, "the rules of other players should not run again")
+
+    def test_access_results_of_replaced_rule(self):
+        """Tests that a rule declared again after replacing it is evaluated instead of reusing the old result"""
+        location = Location(1, "Chest", None, self.multiworld.get_region("Menu", 1))
+        location.access_rule = lambda state: state.has("Key", 1)
+        self.multiworld.register_rule_dependencies(location, ["Key"])
+        state = CollectionState(self.multiworld)
+        self.assertFalse(state.check_access(location))
+        location.access_rule = lambda state: not state.has("Key", 1)
+        self.assertTrue(state.check_access(location))
+        self.multiworld.register_rule_dependencies(location, ["Key"])
+        self.assertTrue(state.check_access(location))
+
+
+class TestItemCounter(unittest.TestCase):
+    def test_counter_behavior(self):
+        """Tests that ItemCounter behaves like the Counter it replaces"""
+        index = ItemNameIndex(["Sword", "Shield"], {"Gear": ["Sword", "Shield"]})
+        item_counter = ItemCounter(["Sword", "Sword", "Bomb"], index)
+        self.assertEqual(item_counter, Counter({"Sword": 2, "Bomb": 1}))
+        self.assertEqual(item_counter["Shield"], 0)
+        self.assertEqual(item_counter["Unknown"], 0)
+        self.assertNotIn("Shield", item_counter)
+        self.assertIsNone(item_counter.get("Shield"))
+        item_counter["Shield"] += 1
+        del item_counter["Bomb"]
+        del item_counter["Unknown"]
+        self.assertEqual(dict(item_counter), {"Sword": 2, "Shield": 1})
+        self.assertEqual(len(item_counter), 2)
+        item_counter.subtract({"Sword": 2})
+        self.assertEqual(list(item_counter), ["Shield"])
+        self.assertEqual(item_counter.total(), 1)
+
+    def test_interned_later(self):
+        """Tests that counters can count and look up names interned after they were created"""
+        index = ItemNameIndex(["Sword"])
+        item_counter = ItemCounter(index=index)
+        later_counter = ItemCounter(index=index)
+        later_counter["Event"] = 1
+        self.assertEqual(item_counter["Event"], 0)
+        self.assertEqual(item_counter.clone()["Event"], 0)
+        item_counter["Event"] = 2
+        self.assertEqual((item_counter["Event"], later_counter["Event"]), (2, 1))
+
+    def test_interned_per_multiworld(self):
+        """Tests that names interned during a generation stay with its worlds instead of the world class"""
+        multiworld = generate_test_multiworld(1)
+        world = multiworld.worlds[1]
+        class_index = type(world).item_name_index
+        registered = len(class_index.names)
+        state = CollectionState(multiworld)
+        state.collect(Item("Generation Event", ItemClassification.progression, None, 1), True)
+        self.assertTrue(state.has("Generation Event", 1))
+        self.assertIn("Generation Event", world.item_name_index)
+        self.assertNotIn("Generation Event", class_index)
+        self.assertEqual(len(class_index.names), registered)
+        self.assertEqual(world.item_name_index.groups, class_index.groups)
+
+    def test_state_lookups(self):
+        """Tests the item name methods of CollectionState on ItemCounters and on plain Counters"""
+        multiworld = generate_test_multiworld(2)
+        state = CollectionState(multiworld)
+        self.assertIs(state.prog_items[1].index, multiworld.worlds[1].item_name_index)
+        state.prog_items[2] = Counter()
+        for player in (1, 2):
+            for item_name in ("Key", "Key", "Prize"):
+                state.collect(Item(item_name, ItemClassification.progression, None, player), True)
+            self.assertTrue(state.has("Key", player, 2))
+            self.assertFalse(state.has("Key", player, 3))
+            self.assertTrue(state.has_all(["Key", "Prize"], player))
+            self.assertFalse(state.has_all(["Key", "Lock"], player))
+            self.assertTrue(state.has_any(["Lock", "Prize"], player))
+            self.assertEqual(state.count("Key", player), 2)
+            self.assertEqual(state.count_from_list(["Key", "Prize", "Lock"], player), 3)
+            self.assertEqual(state.count_from_list_unique(["Key", "Prize", "Lock"], player), 2)
+            self.assertTrue(state.has_from_list(["Key", "Lock"], player, 2))
+            self.assertFalse(state.has_from_list([], player, 0))
+            self.assertFalse(state.has_from_list_unique(["Key", "Lock"], player, 2))
+            self.assertEqual(state.count_group("Everything", player), 0)
+            self.assertFalse(state.has_group("Everything", player))
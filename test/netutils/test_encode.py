@@ -0,0 +1,53 @@
+# Tests for NetUtils.encode
+import json
+import unittest
+
+import NetUtils
+from NetUtils import EncodedJSON, NetworkItem, NetworkSlot, SlotType, _json_encode, _scan_for_TypedTuples, \
+    decode, encode, encode_game_package
+
+
+sample_msgs = [{
+    "cmd": "Sample",
+    "items": [NetworkItem(1, 2, 3, 4)],
+    "slot_info": {1: NetworkSlot("Player", "Game", SlotType.player)},
+    "games": {"Game"},
+    "text": "ünïcödé \x00 \"quoted\"",
+    "large": 2 ** 70,
+    "float": 0.5,
+    "none": None,
+}]
+
+
+class TestEncode(unittest.TestCase):
+    def test_matches_json(self) -> None:
+        """Tests that the installed backend produces the same JSON as the json module"""
+        expected = json.loads(_json_encode(_scan_for_TypedTuples(sample_msgs, [])))
+        self.assertEqual(json.loads(encode(sample_msgs)), expected)
+        self.assertEqual(decode(encode(sample_msgs))[0]["items"], [NetworkItem(1, 2, 3, 4)])
+
+    def test_encoded_fragments(self) -> None:
+        """Tests that pre-encoded parts are embedded as they are"""
+        fragment = EncodedJSON(encode(sample_msgs[0]["slot_info"]))
+        other_fragment = EncodedJSON(encode([1, 2]))
+        msgs = [{**sample_msgs[0], "slot_info": fragment, "list": other_fragment, "nested": {"a": fragment}}]
+        decoded = json.loads(encode(msgs))[0]
+        expected = json.loads(encode(sample_msgs))[0]
+        self.assertEqual(decoded["slot_info"], expected["slot_info"])
+        self.assertEqual(decoded["nested"], {"a": expected["slot_info"]})
+        self.assertEqual(decoded["list"], [1, 2])
+        self.assertEqual(decoded["text"], sample_msgs[0]["text"])
+
+    def test_encode_game_package(self) -> None:
+        """Tests that game packages are encoded once per checksum and set of keys"""
+        package = {"item_name_groups": {}, "item_name_to_id": {"Item": 1}, "checksum": "abc"}
+        stripped = {"item_name_to_id": {"Item": 1}, "checksum": "abc"}
+        encoded = encode_game_package(package)
+        self.assertEqual(json.loads(encoded), package)
+        self.assertIs(encode_game_package(dict(package)), encoded)
+        self.assertEqual(json.loads(encode_game_package(stripped)), stripped)
+        self.assertEqual(json.loads(encode_game_package({"item_name_to_id": {}})), {"item_name_to_id": {}})
+
+        for index in range(NetUtils.encoded_game_packages_limit):
+            encode_game_package({**package, "checksum": str(index)})
+        self.assertNotIn(("abc", *package), NetUtils._encoded_game_packages)
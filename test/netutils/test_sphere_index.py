@@ -0,0 +1,34 @@
+# Tests for NetUtils.SphereIndex
+import unittest
+
+from NetUtils import SphereIndex
+
+sample_spheres = [
+    {1: {11, 12}, 2: {21}},
+    {2: {23, 22}},
+    {1: {13}, 3: {9}},
+]
+
+
+class TestSphereIndex(unittest.TestCase):
+    def test_get_sphere(self) -> None:
+        index = SphereIndex(sample_spheres)
+        self.assertTrue(index)
+        for sphere_number, sphere in enumerate(sample_spheres):
+            for player, location_ids in sphere.items():
+                for location_id in location_ids:
+                    self.assertEqual(index.get_sphere(player, location_id), sphere_number)
+        for player, location_id in ((1, 10), (1, 14), (2, 11), (4, 9)):
+            with self.assertRaises(KeyError):
+                index.get_sphere(player, location_id)
+
+    def test_get_spheres(self) -> None:
+        index = SphereIndex(sample_spheres)
+        self.assertEqual(index.get_spheres(1), {11: 0, 12: 0, 13: 2})
+        self.assertEqual(index.get_spheres(2, {22, 21, 99}), {21: 0, 22: 1})
+        self.assertEqual(index.get_spheres(4), {})
+
+    def test_empty(self) -> None:
+        index = SphereIndex([])
+        self.assertFalse(index)
+        self.assertEqual(index.get_spheres(1), {})
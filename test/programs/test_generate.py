@@ -1,6 +1,9 @@
 # Tests for Generate.py (ArchipelagoGenerate.exe)
 
+import json
+import tracemalloc
 import unittest
+import unittest.mock
 import os
 import os.path
 import sys
@@ -72,6 +75,37 @@ class TestGenerateMain(unittest.TestCase):
 
         self.assertOutput(self.output_tempdir.name)
 
+    def test_generate_profile(self):
+        profile_path = os.path.join(self.output_tempdir.name, "profile.json")
+        sys.argv = [sys.argv[0], '--seed', '0',
+                    '--player_files_path', str(self.abs_input_dir),
+                    '--outputpath', self.output_tempdir.name,
+                    '--profile_out', profile_path]
+        print(f'Testing Generate.py {sys.argv} in {os.getcwd()}')
+        Main.main(*Generate.main())
+
+        self.assertOutput(self.output_tempdir.name)
+        with open(profile_path) as f:
+            profile = json.load(f)
+        steps = {entry["step"] for entry in profile["steps"]}
+        self.assertIn("fill_restrictive (Progression)", steps)
+        self.assertIn("fulfills_accessibility", steps)
+        self.assertTrue(any(entry["player"] == 1 and entry["step"].endswith(".create_regions")
+                            for entry in profile["steps"]))
+        self.assertTrue(all(entry["memory"] is not None for entry in profile["steps"]))
+        self.assertTrue(profile["games"])
+
+    def test_generate_profile_failure(self):
+        sys.argv = [sys.argv[0], '--seed', '0',
+                    '--player_files_path', str(self.abs_input_dir),
+                    '--outputpath', self.output_tempdir.name,
+                    '--profile_out', os.path.join(self.output_tempdir.name, "profile.json")]
+        args, seed = Generate.main()
+        with unittest.mock.patch("Main.distribute_items_restrictive", side_effect=RuntimeError("Fill failed")):
+            with self.assertRaises(RuntimeError):
+                Main.main(args, seed)
+        self.assertFalse(tracemalloc.is_tracing(), "tracing should stop when generation fails")
+
     def test_generate_yaml(self):
         # override host.yaml
         from settings import get_settings
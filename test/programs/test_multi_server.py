@@ -1,5 +1,13 @@
+import asyncio
+import atexit
+import os
+import tempfile
+import types
 import unittest
-from MultiServer import Context, ServerCommandProcessor
+
+from MultiServer import Context, ServerCommandProcessor, collect_player, process_client_cmds, \
+    register_location_checks, release_player, send_items_to, send_new_items
+from NetUtils import Hint, LocationStore, NetworkItem, NetworkSlot, SlotType, decode
 
 
 class TestResolvePlayerName(unittest.TestCase):
@@ -38,3 +46,272 @@ class TestResolvePlayerName(unittest.TestCase):
         assert p.resolve_player("ABC") == (1, 2, "abc"), "case insensitive resolves when 1 match"
         assert p.resolve_player("abcd") == (1, 3, "abCD"), "case insensitive resolves when 1 match"
         assert not p.resolve_player("aB"), "partial name shouldn't resolve to player"
+
+
+class TestSendNewItems(unittest.TestCase):
+    def test_coalesced_per_slot(self) -> None:
+        ctx = Context("", 0, "", "", 0, 0, False)
+        receiver = types.SimpleNamespace(no_items=False, remote_items=True, remote_start_inventory=False, send_index=0)
+        other = types.SimpleNamespace(no_items=False, remote_items=True, remote_start_inventory=False, send_index=0)
+        ctx.clients = {0: {1: [receiver], 2: [other]}}
+        ctx.received_items[0, 2, True] = [NetworkItem(3, 3, 1, 0)]
+        sent = []
+
+        async def send_encoded_msgs(endpoint, msg: str) -> bool:
+            sent.append((endpoint, decode(msg)))
+            return True
+
+        async def check_items() -> None:
+            send_items_to(ctx, 0, 1, NetworkItem(1, 1, 2, 0))
+            send_new_items(ctx)
+            send_items_to(ctx, 0, 1, NetworkItem(2, 2, 2, 0))
+            send_new_items(ctx)
+            for _ in range(3):
+                await asyncio.sleep(0)
+
+        ctx.send_encoded_msgs = send_encoded_msgs
+        asyncio.run(check_items())
+        self.assertEqual(len(sent), 1, "items sent within one event loop iteration should be sent together")
+        endpoint, msgs = sent[0]
+        self.assertIs(endpoint, receiver)
+        self.assertEqual(msgs, [{"cmd": "ReceivedItems", "index": 0,
+                                 "items": [NetworkItem(1, 1, 2, 0), NetworkItem(2, 2, 2, 0)]}])
+        self.assertEqual(receiver.send_index, 2)
+        self.assertEqual(other.send_index, 0, "clients of slots without new items should not be touched")
+
+
+class TestHintIndex(unittest.TestCase):
+    def test_found_hints(self) -> None:
+        ctx = Context("", 0, "", "", 0, 0, False)
+        hint = Hint(receiving_player=2, finding_player=1, location=10, item=5, found=False)
+        other_hint = Hint(receiving_player=1, finding_player=2, location=10, item=6, found=False)
+        ctx.hints[0, 1] = {hint, other_hint}
+        ctx.hints[0, 2] = {hint, other_hint}
+        ctx.index_hints()
+
+        ctx.location_checks[0, 1] |= {10, 11}
+        self.assertEqual(ctx.hints_found(0, 1, {10, 11}), {1, 2})
+        found_hint = hint._replace(found=True)
+        for slot in (1, 2):
+            self.assertEqual(ctx.hints[0, slot], {found_hint, other_hint})
+        self.assertEqual(ctx.hints_found(0, 1, {10}), set(), "hints should only be found once")
+        self.assertIn((0, 2, 10), ctx.hint_index)
+
+
+class TestRelease(unittest.TestCase):
+    def test_batched(self) -> None:
+        ctx = Context("", 0, "", "", 0, 0, False)
+        ctx.slot_info = {1: NetworkSlot("A", "Archipelago", SlotType.player),
+                         2: NetworkSlot("B", "Archipelago", SlotType.player)}
+        ctx.player_names = {(0, 1): "A", (0, 2): "B"}
+        ctx.locations = LocationStore({1: {location: (location, 2, 0) for location in range(1, 251)}, 2: {}})
+        receiver = types.SimpleNamespace(no_items=False, remote_items=True, remote_start_inventory=False, send_index=0)
+        ctx.clients = {0: {1: [], 2: [receiver]}}
+        broadcasts = []
+        sent = []
+
+        async def send_encoded_msgs(endpoint, msg: str) -> bool:
+            sent.append((endpoint, decode(msg)))
+            return True
+
+        async def release() -> None:
+            release_player(ctx, 0, 1)
+            for _ in range(3):
+                await asyncio.sleep(0)
+
+        ctx.send_encoded_msgs = send_encoded_msgs
+        ctx.broadcast_team = lambda team, msgs: broadcasts.append(msgs)
+        asyncio.run(release())
+        self.assertEqual([len(msgs) for msgs in broadcasts], [100, 100, 50])
+        self.assertTrue(all(msg["cmd"] == "PrintJSON" and msg["type"] == "ItemSend"
+                            for msgs in broadcasts for msg in msgs))
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(len(sent[0][1][0]["items"]), 250)
+        self.assertEqual(ctx.location_checks[0, 1], set(range(1, 251)))
+
+    def test_collect_saves_once(self) -> None:
+        ctx = Context("", 0, "", "", 0, 0, False)
+        ctx.slot_info = {slot: NetworkSlot(name, "Archipelago", SlotType.player)
+                         for slot, name in ((1, "A"), (2, "B"), (3, "C"))}
+        ctx.player_names = {(0, 1): "A", (0, 2): "B", (0, 3): "C"}
+        ctx.locations = LocationStore({1: {location: (location, 3, 0) for location in range(1, 11)},
+                                       2: {location: (location, 3, 0) for location in range(1, 11)}, 3: {}})
+        receiver = types.SimpleNamespace(no_items=False, remote_items=True, remote_start_inventory=False, send_index=0)
+        ctx.clients = {0: {1: [], 2: [], 3: [receiver]}}
+        saves = []
+        sent = []
+
+        async def send_encoded_msgs(endpoint, msg: str) -> bool:
+            sent.append((endpoint, decode(msg)))
+            return True
+
+        async def collect() -> None:
+            collect_player(ctx, 0, 3)
+            for _ in range(3):
+                await asyncio.sleep(0)
+
+        ctx.send_encoded_msgs = send_encoded_msgs
+        ctx.save = lambda now=False: saves.append(now)
+        asyncio.run(collect())
+        self.assertEqual(len(saves), 1, "collecting from several slots should save once")
+        self.assertEqual(ctx.location_checks[0, 1], set(range(1, 11)))
+        self.assertEqual(ctx.location_checks[0, 2], set(range(1, 11)))
+        self.assertEqual([len(msgs[0]["items"]) for endpoint, msgs in sent if endpoint is receiver], [20])
+
+
+class StorageClient:
+    def __init__(self, team: int, slot: int) -> None:
+        self.auth = True
+        self.team = team
+        self.slot = slot
+
+
+class TestDataStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.ctx = Context("", 0, "", "", 0, 0, False)
+        self.broadcasts = []
+        self.sent = []
+
+        async def send_msgs(endpoint, msgs) -> bool:
+            self.sent.append((endpoint, msgs))
+            return True
+
+        self.ctx.broadcast = lambda endpoints, msgs: self.broadcasts.append((list(endpoints), msgs))
+        self.ctx.send_msgs = send_msgs
+
+    def process(self, client: StorageClient, *msgs: dict) -> None:
+        async def process() -> None:
+            await process_client_cmds(self.ctx, client, list(msgs))
+            for _ in range(3):
+                await asyncio.sleep(0)
+
+        asyncio.run(process())
+
+    def test_batched_replies(self) -> None:
+        writer = StorageClient(0, 1)
+        watcher = StorageClient(0, 2)
+        other_watcher = StorageClient(0, 2)
+        self.process(watcher, {"cmd": "SetNotify", "keys": ["a"], "prefixes": ["b_"]})
+        self.process(other_watcher, {"cmd": "SetNotify", "keys": ["a", "b_1"]})
+        self.process(writer,
+                     {"cmd": "Set", "key": "a", "default": 1, "want_reply": False,
+                      "operations": [{"operation": "add", "value": 2}]},
+                     {"cmd": "Set", "key": "b_1", "want_reply": False,
+                      "operations": [{"operation": "replace", "value": [1]}]},
+                     {"cmd": "Set", "key": "a", "want_reply": False, "operations": [{"operation": "mul", "value": 3}]})
+        self.assertEqual(self.ctx.stored_data, {"a": 9, "b_1": [1]})
+        self.assertEqual(len(self.broadcasts), 1, "clients watching the same keys should share one message")
+        endpoints, replies = self.broadcasts[0]
+        self.assertEqual(set(endpoints), {watcher, other_watcher})
+        self.assertEqual([(reply["key"], reply["original_value"], reply["value"]) for reply in replies],
+                         [("a", 1, 3), ("b_1", 0, [1]), ("a", 3, 9)])
+
+        self.process(watcher, {"cmd": "Get", "keys": ["a"], "prefixes": ["b"]})
+        self.assertEqual(self.sent[-1][1][0]["keys"], {"a": 9, "b_1": [1]})
+
+    def test_atomic(self) -> None:
+        client = StorageClient(0, 1)
+        self.process(client, {"cmd": "Set", "key": "list", "default": [1, 2],
+                              "operations": [{"operation": "default", "value": None}]})
+        self.broadcasts.clear()
+        self.process(client,
+                     {"cmd": "Set", "key": "list", "operations": [{"operation": "remove", "value": 1}]},
+                     {"cmd": "Set", "key": "other", "operations": [{"operation": "replace", "value": 1}]},
+                     {"cmd": "Set", "key": "list", "operations": [{"operation": "update", "value": {}}]})
+        self.assertEqual(self.ctx.stored_data, {"list": [1, 2]}, "no Set of a failed batch should be applied")
+        self.assertEqual(self.broadcasts, [])
+        self.assertEqual(self.sent[-1][1][0]["cmd"], "InvalidPacket")
+
+    def test_slot_limit(self) -> None:
+        self.ctx.data_storage.slot_limit = 200
+        client = StorageClient(0, 1)
+        self.process(client, {"cmd": "Set", "key": "a", "operations": [{"operation": "replace", "value": "a" * 100}]})
+        self.process(client, {"cmd": "Set", "key": "b", "operations": [{"operation": "replace", "value": "b" * 100}]})
+        self.assertNotIn("b", self.ctx.stored_data)
+        self.assertEqual(self.sent[-1][1][0]["cmd"], "InvalidPacket")
+        self.process(client,
+                     {"cmd": "Set", "key": "a", "operations": [{"operation": "replace", "value": ""}]},
+                     {"cmd": "Set", "key": "b", "operations": [{"operation": "replace", "value": "b" * 100}]})
+        self.assertEqual(self.ctx.stored_data, {"a": "", "b": "b" * 100})
+        self.process(StorageClient(0, 2),
+                     {"cmd": "Set", "key": "b", "operations": [{"operation": "replace", "value": "c" * 150}]})
+        self.assertEqual(self.ctx.data_storage.owners, {"a": (0, 1), "b": (0, 2)})
+        self.assertLess(self.ctx.data_storage.slot_sizes[0, 1], 50)
+
+    def test_unlimited(self) -> None:
+        client = StorageClient(0, 1)
+        self.process(client, {"cmd": "Set", "key": "a", "want_reply": False,
+                              "operations": [{"operation": "replace", "value": {"b": 1}}]})
+        value = self.ctx.stored_data["a"]
+        self.process(client, {"cmd": "Set", "key": "a", "want_reply": False,
+                              "operations": [{"operation": "update", "value": {"c": 2}}]})
+        self.assertIs(self.ctx.stored_data["a"], value, "values nobody gets a SetReply of should not be copied")
+        self.assertEqual(value, {"b": 1, "c": 2})
+        self.assertEqual(self.ctx.data_storage.sizes, {}, "values should only be measured for a limit")
+        self.ctx.data_storage.slot_limit = 200
+        self.assertEqual(set(self.ctx.data_storage.sizes), {"a"})
+        self.assertTrue(self.ctx.data_storage.slot_sizes[0, 1])
+
+    def test_reply_order(self) -> None:
+        client = StorageClient(0, 1)
+        self.process(client,
+                     {"cmd": "Set", "key": "a", "operations": [{"operation": "replace", "value": 1}]},
+                     {"cmd": "Get", "keys": ["a"]})
+        self.assertEqual([msgs[0]["cmd"] for endpoint, msgs in self.sent], ["SetReply", "Retrieved"],
+                         "Sets should be answered before the commands after them")
+        self.assertEqual(self.broadcasts, [])
+
+
+class TestSaveJournal(unittest.TestCase):
+    @staticmethod
+    def make_context(save_filename: str) -> Context:
+        ctx = Context("", 0, "", "", 0, 0, False)
+        ctx.slot_info = {1: NetworkSlot("A", "Archipelago", SlotType.player),
+                         2: NetworkSlot("B", "Archipelago", SlotType.player)}
+        ctx.player_names = {(0, 1): "A", (0, 2): "B"}
+        ctx.connect_names = {"A": (0, 1), "B": (0, 2)}
+        ctx.locations = LocationStore({1: {location: (location, 2, 0) for location in range(1, 11)}, 2: {}})
+        ctx.clients = {0: {1: [], 2: []}}
+        ctx.save_filename = save_filename
+        ctx.saving = True
+        return ctx
+
+    def test_replay(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            ctx = self.make_context(os.path.join(tempdir, "test.apsave"))
+            hint = Hint(receiving_player=2, finding_player=1, location=5, item=5, found=False)
+            ctx.hints[0, 2] = {hint}
+            ctx.index_hints()
+
+            async def play() -> None:
+                register_location_checks(ctx, 0, 1, {1, 2})
+                self.assertTrue(ctx._save())
+                with open(ctx.journal_filename, "rb") as f:
+                    self.assertEqual(f.read(), b"", "first save should be a snapshot")
+
+                register_location_checks(ctx, 0, 1, {3, 5})
+                ctx.stored_data["key"] = 1
+                ctx.unjournaled_stored_data.add("key")
+                self.assertTrue(ctx._save())
+                register_location_checks(ctx, 0, 1, {4})
+                ctx.client_game_state[0, 1] = 30
+                self.assertTrue(ctx._save())
+
+            asyncio.run(play())
+            self.assertEqual(ctx.journal_length, 2)
+            with open(ctx.journal_filename, "ab") as f:
+                f.write(ctx.encode_journal_record({"journal": ctx.journal_id})[:-5])  # torn by a crash
+
+            loaded = self.make_context(ctx.save_filename)
+            loaded.init_save()
+            loaded.exit_event.set()
+            atexit.unregister(loaded._save)
+            for key in ("received_items", "location_checks", "hints", "stored_data", "stored_data_owners",
+                        "client_game_state"):
+                self.assertEqual(loaded.get_save()[key], ctx.get_save()[key], key)
+            self.assertEqual(loaded.hints[0, 2], {hint._replace(found=True)})
+            self.assertIsNone(loaded.journal_id, "a loaded save should not continue its journal")
+
+            self.assertTrue(ctx._save(True))
+            with open(ctx.journal_filename, "rb") as f:
+                self.assertEqual(f.read(), b"", "snapshots should clear the journal")
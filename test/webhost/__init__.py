@@ -0,0 +1,73 @@
+import atexit
+import glob
+import json
+import os
+import sys
+import uuid
+import zipfile
+from tempfile import TemporaryDirectory, mkstemp
+from typing import TYPE_CHECKING, Any, Dict
+
+if TYPE_CHECKING:
+    from flask.testing import FlaskClient
+
+
+bound_provider = None  # what bind_database bound the WebHost database with
+
+
+def bind_database() -> None:
+    """Binds the WebHost database to a temporary file, which the threads of a room can share.
+    Binds it again if another test bound it elsewhere, like to a database in memory, which they could not share."""
+    global bound_provider
+    from WebHostLib.models import db
+    if db.provider is not None:
+        if db.provider is bound_provider:
+            return
+        db.disconnect()
+        db.provider = None  # pony has no way to unbind
+    handle, filename = mkstemp(suffix=".db")
+    os.close(handle)
+    atexit.register(os.remove, filename)
+    db.bind(provider="sqlite", filename=filename, create_db=True)
+    if db.schema is None:
+        db.generate_mapping(create_tables=True)
+    else:
+        db.create_tables()
+    bound_provider = db.provider
+
+
+def get_test_client() -> "FlaskClient":
+    """A test client of the WebHost app, registering its views unless another test already did."""
+    from WebHostLib import app, cache, register
+    app.config["TESTING"] = True
+    if "api" not in app.blueprints:
+        register()
+        cache.init_app(app)
+    bind_database()
+    return app.test_client()
+
+
+def create_room(player_options: Dict[str, Dict[str, Any]], seed: int = 0) -> int:
+    """Generates a multiworld of player_options by name, uploads it and opens a room of it, returning the room id."""
+    import Generate
+    import Main
+    from pony.orm import commit, db_session
+    from WebHostLib.models import Room
+    from WebHostLib.upload import upload_zip_to_db
+
+    bind_database()
+    original_argv = sys.argv
+    with TemporaryDirectory() as player_files, TemporaryDirectory() as output:
+        for name, options in player_options.items():
+            with open(os.path.join(player_files, f"{name}.yaml"), "w") as f:
+                json.dump({"name": name, **options}, f)
+        sys.argv = [sys.argv[0], "--seed", str(seed), "--player_files_path", player_files, "--outputpath", output]
+        try:
+            Main.main(*Generate.main())
+        finally:
+            sys.argv = original_argv
+        owner = uuid.uuid4()
+        with zipfile.ZipFile(glob.glob(os.path.join(output, "*.zip"))[0]) as zfile, db_session:
+            room = Room(seed=upload_zip_to_db(zfile, owner), owner=owner)
+            commit()
+            return room.id
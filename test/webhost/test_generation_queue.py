@@ -0,0 +1,44 @@
+import logging
+import threading
+import unittest
+from uuid import uuid4
+
+from WebHostLib.autolauncher import large_generation_cost, select_generations
+from WebHostLib.generate import GenerationCancelled, GenerationProgress
+
+
+class TestGenerationQueue(unittest.TestCase):
+    def test_priorities(self) -> None:
+        api, web, large, old = uuid4(), uuid4(), uuid4(), uuid4()
+        queued = {
+            api: {"source": "api", "cost": 1, "queued": 100},
+            large: {"source": "web", "cost": large_generation_cost + 1, "queued": 100},
+            web: {"source": "web", "cost": 1, "queued": 200},
+            old: {"source": "api", "cost": large_generation_cost + 1, "queued": 0},
+        }
+        self.assertEqual(select_generations(queued, [], 8, 250, 300), [old, web, large, api])
+        self.assertEqual(select_generations(queued, [1, 1, 1, 1, 1, 1], 8, 250, 300), [old, web])
+
+    def test_large_generations_limited(self) -> None:
+        large = {uuid4(): {"source": "web", "cost": large_generation_cost + 1, "queued": n} for n in range(4)}
+        small = uuid4()
+        queued = {**large, small: {"source": "api", "cost": 1, "queued": 10}}
+        self.assertEqual(select_generations(queued, [], 4, 600, 20), [*list(large)[:2], small])
+        self.assertEqual(select_generations(queued, [large_generation_cost + 1] * 2, 4, 600, 20), [small])
+
+
+class TestGenerationProgress(unittest.TestCase):
+    def test_cancel_after_time_limit(self) -> None:
+        logger = logging.getLogger("TestGenerationProgress")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        progress = GenerationProgress(None, 0, threading.get_ident())
+        logger.addHandler(progress)
+        try:
+            with self.assertRaises(GenerationCancelled):
+                try:
+                    logger.info("Filling the multiworld.")
+                except Exception:
+                    self.fail("worlds catching Exception should not stop the cancellation")
+        finally:
+            logger.removeHandler(progress)
@@ -0,0 +1,81 @@
+import asyncio
+import copy
+import logging
+import unittest
+
+from Utils import version_tuple
+from . import create_room
+
+
+class TestRoomHydration(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.room_id = create_room({"Player1": {"game": "Clique", "Clique": {"hard_mode": "true"}},
+                                   "Player2": {"game": "Clique", "Clique": {"hard_mode": "true"}}})
+
+    def test_round_trip(self) -> None:
+        """Tests that a dehydrated room answers RoomInfo like before and hydrates to the same state on Connect"""
+        from MultiServer import Client, on_client_connected, process_client_cmds
+        from WebHostLib.customserver import RoomShard, WebHostContext, get_static_server_data
+
+        async def play() -> None:
+            logger = logging.getLogger("TestRoomHydration")
+            ctx = WebHostContext(get_static_server_data(), logger, RoomShard(asyncio.get_running_loop()))
+            sent = []
+
+            async def send_msgs(endpoint, msgs) -> bool:
+                sent.extend(msgs)
+                return True
+
+            async def connect(name: str) -> Client:
+                client = Client(None, ctx)
+                await process_client_cmds(ctx, client, [{
+                    "cmd": "Connect", "password": None, "game": "Clique", "name": name, "uuid": name,
+                    "version": version_tuple, "items_handling": 0b111, "tags": [], "slot_data": False}])
+                self.assertIn("Connected", [msg["cmd"] for msg in sent])
+                sent.clear()
+                return client
+
+            async def get_room_info() -> dict:
+                await on_client_connected(ctx, Client(None, ctx))
+                room_info = sent.pop()
+                self.assertEqual(room_info["cmd"], "RoomInfo")
+                del room_info["time"]
+                return room_info
+
+            ctx.send_msgs = send_msgs
+            ctx.load(self.room_id)
+            ctx.init_save()
+            self.assertTrue(ctx.hydrated, "a room that was never saved has no server info to start without")
+            ctx.hint_cost = 5
+            client = await connect("Player1")
+            await process_client_cmds(ctx, client, [
+                {"cmd": "LocationChecks", "locations": [min(ctx.locations[1])]},
+                {"cmd": "LocationScouts", "locations": [max(ctx.locations[1])], "create_as_hint": 2},
+                {"cmd": "Set", "key": "counter", "default": 1, "operations": [{"operation": "add", "value": 2}]},
+            ])
+            await asyncio.sleep(0)
+            await ctx.disconnect(client)
+            room_info = await get_room_info()
+            expected = copy.deepcopy(ctx.get_save())
+            self.assertTrue(expected["received_items"])
+            self.assertTrue(expected["location_checks"][0, 1])
+            self.assertTrue(expected["hints"][0, 1])
+            self.assertEqual(expected["stored_data"]["counter"], 3)
+
+            ctx.dehydrate()
+            self.assertFalse(ctx.hydrated)
+            self.assertFalse(ctx.locations)
+            self.assertEqual(await get_room_info(), room_info)
+            self.assertFalse(ctx.hydrated, "RoomInfo should be answered without loading the multidata")
+
+            await connect("Player2")
+            self.assertTrue(ctx.hydrated)
+            save = ctx.get_save()
+            for key in ("received_items", "location_checks", "hints", "stored_data", "game_options"):
+                # connecting looks up the empty checks and hints of the slot
+                self.assertEqual({name: value for name, value in save[key].items() if value != set()},
+                                 {name: value for name, value in expected[key].items() if value != set()}, key)
+            self.assertEqual(ctx.hint_cost, 5)
+
+        asyncio.run(play())
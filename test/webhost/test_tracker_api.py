@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+import unittest
+import uuid
+
+from . import create_room, get_test_client
+
+
+class TestTrackerAPI(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        from pony.orm import commit, db_session
+        from WebHostLib import app
+        from WebHostLib.models import Room
+
+        cls.client = get_test_client()
+        cls.room_id = create_room({"Player1": {"game": "Clique", "Clique": {"hard_mode": "true"}}})
+        tracker = uuid.uuid4()
+        with db_session:
+            Room.get(id=cls.room_id).tracker = tracker
+            commit()
+        with app.test_request_context():
+            from flask import url_for
+            cls.url = url_for("api.get_tracker", tracker=tracker)
+
+    def check_location(self, index: int) -> int:
+        """Checks the location of Player1 at index, saves the room and returns the location id."""
+        from MultiServer import register_location_checks
+        from WebHostLib.customserver import RoomShard, WebHostContext, get_static_server_data
+
+        async def play() -> int:
+            ctx = WebHostContext(get_static_server_data(), logging.getLogger("TestTrackerAPI"),
+                                 RoomShard(asyncio.get_running_loop()))
+            ctx.load(self.room_id)
+            ctx.hydrate()
+            ctx.init_save()
+            location = sorted(ctx.locations[1])[index]
+            register_location_checks(ctx, 0, 1, [location])
+            ctx._save(True)
+            return location
+
+        return asyncio.run(play())
+
+    def test_tracker(self) -> None:
+        first_location = self.check_location(0)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json["full"])
+        version = response.json["version"]
+        player = response.json["players"][0]
+        self.assertEqual((player["player"], player["locations"], player["checked"]), (1, 2, [first_location]))
+
+        etag = response.headers["ETag"]
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304, "an unchanged room should not be sent again")
+        response = self.client.get(self.url, query_string={"since": version})
+        self.assertEqual((response.json["full"], response.json["players"][0]["checked"]), (False, []))
+
+        second_location = self.check_location(1)
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        response = self.client.get(self.url, query_string={"since": version})
+        self.assertFalse(response.json["full"])
+        self.assertEqual(response.json["players"][0]["checked"], [second_location],
+                         "only locations checked since the version should be listed")
+        self.assertEqual(response.json["players"][0]["checked_count"], 2)
+        response = self.client.get(self.url, query_string={"since": version - 1000})
+        self.assertTrue(response.json["full"], "all locations should be listed if the version is too old")
+        self.assertEqual(response.json["players"][0]["checked"], sorted([first_location, second_location]))
+
+    def test_waiting_limited(self) -> None:
+        from WebHostLib import app
+        response = self.client.get(self.url)
+        etag = response.headers["ETag"]
+        max_waiting = app.config["TRACKER_API_MAX_WAITING"]
+        app.config["TRACKER_API_MAX_WAITING"] = 0
+        try:
+            start = time.monotonic()
+            response = self.client.get(self.url, query_string={"wait": 5}, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertLess(time.monotonic() - start, 1, "requests past the limit should not wait")
+        finally:
+            app.config["TRACKER_API_MAX_WAITING"] = max_waiting
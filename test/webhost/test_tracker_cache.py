@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import unittest
+
+from WebHostLib.tracker import DecodedDataCache
+from . import create_room
+
+
+class TestDecodedDataCache(unittest.TestCase):
+    def test_versions(self) -> None:
+        cache = DecodedDataCache(lambda: 100)
+        loads = []
+
+        def load(value: str):
+            loads.append(value)
+            return value, 10
+
+        self.assertEqual(cache.get("save", 1, lambda: load("a")), "a")
+        self.assertEqual(cache.get("save", 1, lambda: load("b")), "a")
+        self.assertEqual(cache.get("save", 2, lambda: load("c")), "c", "a new version should be loaded again")
+        self.assertEqual(loads, ["a", "c"])
+        self.assertEqual(cache.get_stats(), {"hits": 1, "misses": 2, "entries": 1, "size": 10, "budget": 100})
+
+    def test_budget(self) -> None:
+        cache = DecodedDataCache(lambda: 100)
+        cache.get("a", None, lambda: ("a", 40))
+        cache.get("b", None, lambda: ("b", 40))
+        cache.get("a", None, lambda: ("not cached", 40))
+        cache.get("c", None, lambda: ("c", 40))
+        self.assertEqual(list(cache.entries), ["a", "c"], "the least recently used entry should be evicted")
+        self.assertEqual(cache.size, 80)
+        cache.get("d", None, lambda: ("d", 200))
+        self.assertNotIn("d", cache.entries, "entries larger than the budget should not be kept")
+        self.assertEqual(cache.size, 80)
+
+
+class TestTrackerSaveVersion(unittest.TestCase):
+    def test_exit_save(self) -> None:
+        """Tests that trackers see the changes saved by saves that don't count as activity, like the one on exit"""
+        from pony.orm import db_session
+        from MultiServer import register_location_checks
+        from WebHostLib.customserver import RoomShard, WebHostContext, get_static_server_data
+        from WebHostLib.models import Room
+        from WebHostLib.tracker import TrackerData
+
+        room_id = create_room({"Player1": {"game": "Clique", "Clique": {"hard_mode": "true"}}})
+
+        def get_received_count() -> int:
+            with db_session:
+                return len(TrackerData(Room.get(id=room_id)).get_player_received_items(0, 1))
+
+        async def play() -> None:
+            ctx = WebHostContext(get_static_server_data(), logging.getLogger("TestTrackerSaveVersion"),
+                                 RoomShard(asyncio.get_running_loop()))
+            ctx.load(room_id)
+            ctx.init_save()
+            for count, location in enumerate(sorted(ctx.locations[1]), 1):
+                register_location_checks(ctx, 0, 1, [location])
+                ctx._save(True)
+                self.assertEqual(get_received_count(), count)
+
+        asyncio.run(play())
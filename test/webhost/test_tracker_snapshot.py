@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import unittest
+
+from . import create_room
+
+
+class TestTrackerSnapshot(unittest.TestCase):
+    def test_round_trip(self) -> None:
+        """Tests that trackers show the same from the tracker snapshot of a room as from its save,
+        for an item link group without locations as well"""
+        from pony.orm import commit, db_session
+        from MultiServer import collect_hint_location_id, register_location_checks
+        from NetUtils import ClientStatus
+        from WebHostLib.customserver import RoomShard, WebHostContext, get_static_server_data
+        from WebHostLib.models import Room
+        from WebHostLib.tracker import TrackerData
+
+        item_links = [{"name": "Link", "item_pool": ["Feeling of Satisfaction"], "replacement_item": None}]
+        room_id = create_room({"Player1": {"game": "Clique", "Clique": {"item_links": item_links}},
+                               "Player2": {"game": "Clique", "Clique": {"item_links": item_links}}})
+
+        def get_tracked(tracker_data: TrackerData, team: int, slot: int) -> tuple:
+            return (tracker_data.get_player_checked_locations(team, slot),
+                    tracker_data.get_player_checked_locations_count(team, slot),
+                    tracker_data.get_player_missing_locations(team, slot),
+                    tracker_data.get_player_inventory_counts(team, slot),
+                    tracker_data.get_player_received_items_order(team, slot),
+                    tracker_data.get_player_hints(team, slot),
+                    tracker_data.get_player_client_status(team, slot))
+
+        async def play() -> WebHostContext:
+            ctx = WebHostContext(get_static_server_data(), logging.getLogger("TestTrackerSnapshot"),
+                                 RoomShard(asyncio.get_running_loop()))
+            ctx.load(room_id)
+            ctx.init_save()
+            register_location_checks(ctx, 0, 1, ctx.locations[1])
+            ctx.notify_hints(0, collect_hint_location_id(ctx, 0, 2, min(ctx.locations[2])))
+            ctx.client_game_state[0, 1] = ClientStatus.CLIENT_GOAL
+            await asyncio.sleep(0)
+            ctx._save(True)
+            return ctx
+
+        ctx = asyncio.run(play())
+        self.assertIn((0, 3), ctx.player_names)
+        self.assertNotIn(3, ctx.locations, "the item link group should have no locations")
+        with db_session:
+            room = Room.get(id=room_id)
+            tracker_data = TrackerData(room)
+            self.assertIsNotNone(tracker_data.get_snapshot_version())
+            from_snapshot = {team_slot: get_tracked(tracker_data, *team_slot) for team_slot in ctx.player_names}
+            room.tracker_snapshot.delete()
+            commit()
+            tracker_data = TrackerData(room)
+            self.assertIsNone(tracker_data.get_snapshot_version())
+            from_save = {team_slot: get_tracked(tracker_data, *team_slot) for team_slot in ctx.player_names}
+        self.assertEqual(from_snapshot, from_save)
+        self.assertEqual(from_snapshot[0, 1][0], set(ctx.locations[1]))
+        self.assertTrue(from_snapshot[0, 1][3], "the checked location should have sent an item")
+        self.assertTrue(from_snapshot[0, 2][5], "the hint should be shown to the slot it was hinted for")
+        self.assertEqual(from_snapshot[0, 1][6], ClientStatus.CLIENT_GOAL)
+        self.assertEqual(from_snapshot[0, 3][:3], (set(), 0, set()))
+
+    def test_publish_from_memory(self) -> None:
+        """Tests that publishing a snapshot diffs against the last published one kept in memory, not the database"""
+        from pony.orm import commit, db_session
+        from MultiServer import register_location_checks
+        from Utils import restricted_loads
+        from WebHostLib.customserver import RoomShard, WebHostContext, get_static_server_data
+        from WebHostLib.models import Room
+
+        room_id = create_room({"Player1": {"game": "Clique", "Clique": {"hard_mode": "true"}}})
+
+        async def play() -> int:
+            ctx = WebHostContext(get_static_server_data(), logging.getLogger("TestTrackerSnapshot"),
+                                 RoomShard(asyncio.get_running_loop()))
+            ctx.load(room_id)
+            ctx.init_save()
+            first_location, second_location = sorted(ctx.locations[1])
+            register_location_checks(ctx, 0, 1, [first_location])
+            ctx._save(True)
+            with db_session:
+                Room.get(id=room_id).tracker_snapshot.data = b"not read again"
+                commit()
+            register_location_checks(ctx, 0, 1, [second_location])
+            ctx._save(True)
+            return second_location
+
+        second_location = asyncio.run(play())
+        with db_session:
+            published = Room.get(id=room_id).tracker_snapshot
+            changes = restricted_loads(published.data)["changes"]
+        self.assertEqual(changes, [(published.version, {(0, 1): [second_location]})])
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import concurrent.futures
 import hashlib
 import logging
 import pathlib
@@ -11,7 +12,7 @@ from typing import (Any, Callable, ClassVar, Dict, FrozenSet, List, Mapping, Opt
                     TYPE_CHECKING, Type, Union)
 
 from Options import item_and_loc_options, OptionGroup, PerGameCommonOptions
-from BaseClasses import CollectionState
+from BaseClasses import CollectionState, ItemNameIndex
 
 if TYPE_CHECKING:
     from BaseClasses import MultiWorld, Item, Location, Tutorial, Region, Entrance
@@ -51,6 +52,9 @@ class AutoWorldRegister(type):
         dct["item_name_groups"] = {group_name: frozenset(group_set) for group_name, group_set
                                    in dct.get("item_name_groups", {}).items()}
         dct["item_name_groups"]["Everything"] = dct["item_names"]
+        # intern item names for CollectionState.prog_items
+        dct["item_name_index"] = ItemNameIndex(sorted(dct["item_name_to_id"], key=dct["item_name_to_id"].__getitem__),
+                                               dct["item_name_groups"])
 
         dct["location_names"] = frozenset(dct["location_name_to_id"])
         dct["location_name_groups"] = {group_name: frozenset(group_set) for group_name, group_set
@@ -147,7 +151,11 @@ class WebWorldRegister(type):
 def _timed_call(method: Callable[..., Any], *args: Any,
                 multiworld: Optional["MultiWorld"] = None, player: Optional[int] = None) -> Any:
     start = time.perf_counter()
-    ret = method(*args)
+    if multiworld and multiworld.profile:
+        with multiworld.profile.measure(method.__qualname__, player):
+            ret = method(*args)
+    else:
+        ret = method(*args)
     taken = time.perf_counter() - start
     if taken > 1.0:
         if player and multiworld:
@@ -175,27 +183,64 @@ def call_single(multiworld: "MultiWorld", method_name: str, player: int, *args:
 
 def call_all(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
     world_types: Set[AutoWorldRegister] = set()
+    parallel_players: List[int] = []
     for player in multiworld.player_ids:
-        prev_item_count = len(multiworld.itempool)
         world_types.add(multiworld.worlds[player].__class__)
-        call_single(multiworld, method_name, player, *args)
-        if __debug__:
-            new_items = multiworld.itempool[prev_item_count:]
+        if multiworld.stage_workers > 1 and method_name in multiworld.worlds[player].parallel_stages:
+            parallel_players.append(player)
+        else:
+            # players before this one go first, so the order is the same as calling all of them one by one
+            _call_players(multiworld, method_name, parallel_players, *args)
+            parallel_players = []
+            _call_players(multiworld, method_name, [player], *args)
+    _call_players(multiworld, method_name, parallel_players, *args)
+
+    call_stage(multiworld, method_name, *args)
+
+    if method_name == "set_rules":
+        from worlds.generic.Rules import compile_rules
+        for player in multiworld.player_ids:
+            with multiworld.profile_step("compile_rules", player):
+                compile_rules(multiworld, player)
+
+
+def _call_players(multiworld: "MultiWorld", method_name: str, players: List[int], *args: Any) -> None:
+    """Calls method_name of the worlds of players, in threads if there is more than one."""
+    prev_item_count = len(multiworld.itempool)
+    if len(players) > 1:
+        multiworld.random.passthrough = False
+        try:
+            with concurrent.futures.ThreadPoolExecutor(min(multiworld.stage_workers, len(players)),
+                                                       thread_name_prefix=method_name) as pool:
+                futures = [pool.submit(call_single, multiworld, method_name, player, *args) for player in players]
+            for future in futures:
+                future.result()
+        finally:
+            multiworld.random.passthrough = True
+        # worlds in parallel_stages only add their own items, so this restores the order of calling them one by one
+        multiworld.itempool[prev_item_count:] = sorted(multiworld.itempool[prev_item_count:],
+                                                       key=lambda item: item.player)
+    elif players:
+        call_single(multiworld, method_name, players[0], *args)
+    else:
+        return
+    if __debug__:
+        for player in players:
+            new_items = [item for item in multiworld.itempool[prev_item_count:]
+                         if len(players) == 1 or item.player == player]
             for i, item in enumerate(new_items):
                 for other in new_items[i+1:]:
                     assert item is not other, (
                         f"Duplicate item reference of \"{item.name}\" in \"{multiworld.worlds[player].game}\" "
                         f"of player \"{multiworld.player_name[player]}\". Please make a copy instead.")
 
-    call_stage(multiworld, method_name, *args)
-
 
 def call_stage(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
     world_types = {multiworld.worlds[player].__class__ for player in multiworld.player_ids}
     for world_type in sorted(world_types, key=lambda world: world.__name__):
         stage_callable = getattr(world_type, f"stage_{method_name}", None)
         if stage_callable:
-            _timed_call(stage_callable, multiworld, *args)
+            _timed_call(stage_callable, multiworld, *args, multiworld=multiworld)
 
 
 class WebWorld(metaclass=WebWorldRegister):
@@ -270,6 +315,10 @@ class World(metaclass=AutoWorldRegister):
     item_name_groups: ClassVar[Dict[str, Set[str]]] = {}
     """maps item group names to sets of items. Example: {"Weapons": {"Sword", "Bow"}}"""
 
+    item_name_index: ItemNameIndex
+    """gets automatically populated, interns item names to the indices CollectionState.prog_items counts them at.
+    Each instance gets its own overlay of the index of the class, for names interned during its generation."""
+
     location_name_groups: ClassVar[Dict[str, Set[str]]] = {}
     """maps location group names to sets of locations. Example: {"Sewer": {"Sewer Key Drop 1", "Sewer Key Drop 2"}}"""
 
@@ -289,6 +338,13 @@ class World(metaclass=AutoWorldRegister):
     hidden: ClassVar[bool] = False
     """Hide World Type from various views. Does not remove functionality."""
 
+    parallel_stages: ClassVar[FrozenSet[str]] = frozenset()
+    """
+    names of generation steps, like "create_regions", in which this world only creates and changes its own player's
+    regions, items and options and only uses self.random. With MultiWorld.stage_workers set, call_all runs these steps
+    of consecutive players concurrently in threads.
+    """
+
     web: ClassVar[WebWorld] = WebWorld()
     """see WebWorld for options"""
 
@@ -326,6 +382,7 @@ class World(metaclass=AutoWorldRegister):
         self.player = player
         self.random = Random(multiworld.random.getrandbits(64))
         multiworld.per_slot_randoms[player] = self.random
+        self.item_name_index = self.item_name_index.overlay()
 
     def __getattr__(self, item: str) -> Any:
         if item == "settings":
@@ -1,10 +1,9 @@
-from typing import Callable
+from BaseClasses import MultiWorld
+from worlds.generic.Rules import Constant, Has, Rule
 
-from BaseClasses import CollectionState, MultiWorld
 
-
-def get_button_rule(multiworld: MultiWorld, player: int) -> Callable[[CollectionState], bool]:
+def get_button_rule(multiworld: MultiWorld, player: int) -> Rule:
     if getattr(multiworld, "hard_mode")[player]:
-        return lambda state: state.has("Button Activation", player)
+        return Has("Button Activation", player)
 
-    return lambda state: True
+    return Constant(True)
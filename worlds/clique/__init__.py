@@ -2,6 +2,7 @@ from typing import List
 
 from BaseClasses import Region, Tutorial
 from worlds.AutoWorld import WebWorld, World
+from worlds.generic.Rules import Has
 from .Items import CliqueItem, item_data_table, item_table
 from .Locations import CliqueLocation, location_data_table, location_table, locked_locations
 from .Options import clique_options
@@ -41,6 +42,7 @@ class CliqueWorld(World):
     option_definitions = clique_options
     location_name_to_id = location_table
     item_name_to_id = item_table
+    parallel_stages = frozenset({"create_regions", "create_items", "set_rules"})
 
     def create_item(self, name: str) -> CliqueItem:
         return CliqueItem(name, item_data_table[name].type, item_data_table[name].code, self.player)
@@ -93,7 +95,7 @@ class CliqueWorld(World):
             lambda item: item.name != "Button Activation"
 
         # Completion condition.
-        self.multiworld.completion_condition[self.player] = lambda state: state.has("The Urge to Push", self.player)
+        self.multiworld.completion_condition[self.player] = Has("The Urge to Push", self.player)
 
     def fill_slot_data(self):
         return {
@@ -1,5 +1,8 @@
 import collections
+import functools
+import itertools
 import logging
+import types
 import typing
 
 from BaseClasses import LocationProgressType, MultiWorld, Location, Region, Entrance
@@ -96,6 +99,342 @@ def exclusion_rules(multiworld: MultiWorld, player: int, exclude_locations: typi
                 logging.warning(f"Unable to exclude location {loc_name} in player {player}'s world.")
 
 
+class Rule:
+    """
+    Access rule built from nodes instead of a lambda, for example `Has("Sword", player) & CanReach("Cave", player)`.
+    Combining rules with & and |, or two of them through add_rule, builds And and Or nodes. compile_rules simplifies
+    the rules of a player after set_rules and replaces each with a function generated for the whole rule, which
+    evaluates it without a Python call per node. Rules that only read items of their own player get their item
+    dependencies registered.
+    """
+    _function: typing.Optional[CollectionRule] = None
+
+    def __call__(self, state: "BaseClasses.CollectionState") -> bool:
+        function = self._function
+        if function is None:
+            self._function = function = self.compile()
+        return function(state)
+
+    def __and__(self, other: "Rule") -> "Rule":
+        return And(self, other)
+
+    def __or__(self, other: "Rule") -> "Rule":
+        return Or(self, other)
+
+    def __eq__(self, other: object) -> bool:
+        return type(self) is type(other) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash((type(self), self._key()))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(map(repr, self._key()))})"
+
+    def _key(self) -> typing.Tuple[typing.Any, ...]:
+        raise NotImplementedError
+
+    def simplify(self) -> "Rule":
+        """Returns an equivalent rule that is cheaper to evaluate."""
+        return self
+
+    def get_item_dependencies(self) -> typing.Optional[typing.Dict[int, typing.Set[str]]]:
+        """Returns the item names this rule reads per player, or None if it can also depend on anything else."""
+        return None
+
+    def compile(self) -> CollectionRule:
+        """Returns a function evaluating this rule as a single expression."""
+        constants: typing.List[typing.Any] = []
+        source = self._source(constants, 0)
+        function = eval(_compile_rule_source(source), {f"_{i}": constant for i, constant in enumerate(constants)})
+        function.rule = self
+        return function
+
+    def _source(self, constants: typing.List[typing.Any], depth: int) -> str:
+        """Returns an expression evaluating this rule for state, with constants[i] available as _i."""
+        raise NotImplementedError
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_rule_source(source: str) -> types.CodeType:
+    # rules of the same shape only differ in their constants, so they share their code
+    return compile(f"lambda state: {source}", "<rule>", "eval")
+
+
+def _add_constant(constants: typing.List[typing.Any], constant: typing.Any) -> str:
+    constants.append(constant)
+    return f"_{len(constants) - 1}"
+
+
+class Constant(Rule):
+    def __init__(self, value: bool):
+        self.value = value
+
+    def _key(self) -> typing.Tuple[bool]:
+        return self.value,
+
+    def get_item_dependencies(self) -> typing.Dict[int, typing.Set[str]]:
+        return {}
+
+    def _source(self, constants: typing.List[typing.Any], depth: int) -> str:
+        return repr(self.value)
+
+
+class Has(Rule):
+    def __init__(self, item: str, player: int, count: int = 1):
+        self.item = item
+        self.player = player
+        self.count = count
+
+    def _key(self) -> typing.Tuple[str, int, int]:
+        return self.item, self.player, self.count
+
+    def simplify(self) -> Rule:
+        return Constant(True) if self.count <= 0 else self
+
+    def get_item_dependencies(self) -> typing.Dict[int, typing.Set[str]]:
+        return {self.player: {self.item}}
+
+    def _source(self, constants: typing.List[typing.Any], depth: int) -> str:
+        if self.count == 1:
+            return f"state.has({self.item!r}, {self.player!r})"
+        return f"state.has({self.item!r}, {self.player!r}, {self.count!r})"
+
+
+class _HasItems(Rule):
+    def __init__(self, items: typing.Iterable[str], player: int):
+        self.items = tuple(dict.fromkeys(items))
+        self.player = player
+
+    def _key(self) -> typing.Tuple[typing.Tuple[str, ...], int]:
+        return self.items, self.player
+
+    def get_item_dependencies(self) -> typing.Dict[int, typing.Set[str]]:
+        return {self.player: set(self.items)}
+
+
+class HasAll(_HasItems):
+    def simplify(self) -> Rule:
+        if len(self.items) > 1:
+            return self
+        return Has(self.items[0], self.player) if self.items else Constant(True)
+
+    def _source(self, constants: typing.List[typing.Any], depth: int) -> str:
+        return f"state.has_all({self.items!r}, {self.player!r})"
+
+
+class HasAny(_HasItems):
+    def simplify(self) -> Rule:
+        if len(self.items) > 1:
+            return self
+        return Has(self.items[0], self.player) if self.items else Constant(False)
+
+    def _source(self, constants: typing.List[typing.Any], depth: int) -> str:
+        return f"state.has_any({self.items!r}, {self.player!r})"
+
+
+class CanReach(Rule):
+    def __init__(self, spot: str, player: int, resolution_hint: str = "Region"):
+        self.spot = spot
+        self.player = player
+        self.resolution_hint = resolution_hint
+
+    def _key(self) -> typing.Tuple[str, int, str]:
+        return self.spot, self.player, self.resolution_hint
+
+    def _source(self, constants: typing.List[typing.Any], depth: int) -> str:
+        return f"state.can_reach({self.spot!r}, {self.resolution_hint!r}, {self.player!r})"
+
+
+class Opaque(Rule):
+    """Any other CollectionRule as part of a Rule."""
+    def __init__(self, function: CollectionRule):
+        self.function = function
+
+    def _key(self) -> typing.Tuple[CollectionRule]:
+        return self.function,
+
+    def _source(self, constants: typing.List[typing.Any], depth: int) -> str:
+        return f"{_add_constant(constants, self.function)}(state)"
+
+
+class _Aggregate(Rule):
+    rules: typing.Tuple[Rule, ...]
+    # deeper rules are compiled on their own, as the parser limits nesting
+    max_source_depth: typing.ClassVar[int] = 32
+
+    def __init__(self, *rules: Rule):
+        self.rules = tuple(itertools.chain.from_iterable(
+            rule.rules if type(rule) is type(self) else (rule,) for rule in rules))
+
+    def _key(self) -> typing.Tuple[Rule, ...]:
+        return self.rules
+
+    def get_item_dependencies(self) -> typing.Optional[typing.Dict[int, typing.Set[str]]]:
+        dependencies: typing.Dict[int, typing.Set[str]] = {}
+        for rule in self.rules:
+            rule_dependencies = rule.get_item_dependencies()
+            if rule_dependencies is None:
+                return None
+            for player, item_names in rule_dependencies.items():
+                dependencies.setdefault(player, set()).update(item_names)
+        return dependencies
+
+    def _source(self, constants: typing.List[typing.Any], depth: int) -> str:
+        if depth >= self.max_source_depth:
+            return f"{_add_constant(constants, self.compile())}(state)"
+        return self._join([rule._source(constants, depth + 1) for rule in self.rules])
+
+    def _join(self, sources: typing.List[str]) -> str:
+        raise NotImplementedError
+
+    def _flatten(self) -> typing.Optional[typing.List[Rule]]:
+        """Returns the simplified rules with nested rules of the same type spliced in,
+        or None if one of them decides the result on its own."""
+        deciding_value = isinstance(self, Or)
+        rules: typing.List[Rule] = []
+        for rule in self.rules:
+            rule = rule.simplify()
+            if type(rule) is type(self):
+                rules.extend(rule.rules)
+            elif isinstance(rule, Constant):
+                if rule.value == deciding_value:
+                    return None
+            else:
+                rules.append(rule)
+        return rules
+
+
+class And(_Aggregate):
+    def simplify(self) -> Rule:
+        rules = self._flatten()
+        if rules is None:
+            return Constant(False)
+        # merge the item checks of each player into the position of the first one
+        item_counts: typing.Dict[int, typing.Dict[str, int]] = {}
+        merged: typing.Dict[typing.Union[Rule, int], None] = {}
+        for rule in rules:
+            if isinstance(rule, (Has, HasAll)):
+                merged[rule.player] = None
+                player_counts = item_counts.setdefault(rule.player, {})
+                for item, count in ((rule.item, rule.count),) if isinstance(rule, Has) else \
+                        zip(rule.items, itertools.repeat(1)):
+                    player_counts[item] = max(count, player_counts.get(item, 0))
+            else:
+                merged[rule] = None
+        rules = []
+        for rule in merged:
+            if isinstance(rule, Rule):
+                rules.append(rule)
+                continue
+            player_counts = item_counts[rule]
+            items = [item for item, count in player_counts.items() if count == 1]
+            if items:
+                rules.append(HasAll(items, rule).simplify())
+            rules.extend(Has(item, rule, count) for item, count in player_counts.items() if count > 1)
+        if len(rules) > 1:
+            return And(*rules)
+        return rules[0] if rules else Constant(True)
+
+    def _join(self, sources: typing.List[str]) -> str:
+        return f"({' and '.join(sources)})"
+
+
+class Or(_Aggregate):
+    def simplify(self) -> Rule:
+        rules = self._flatten()
+        if rules is None:
+            return Constant(True)
+        # merge the item checks of each player into the position of the first one
+        item_counts: typing.Dict[int, typing.Dict[str, int]] = {}
+        merged: typing.Dict[typing.Union[Rule, int], None] = {}
+        for rule in rules:
+            if isinstance(rule, (Has, HasAny)):
+                merged[rule.player] = None
+                player_counts = item_counts.setdefault(rule.player, {})
+                for item, count in ((rule.item, rule.count),) if isinstance(rule, Has) else \
+                        zip(rule.items, itertools.repeat(1)):
+                    player_counts[item] = min(count, player_counts.get(item, count))
+            else:
+                merged[rule] = None
+        rules = []
+        for rule in merged:
+            if isinstance(rule, Rule):
+                rules.append(rule)
+                continue
+            player_counts = item_counts[rule]
+            items = [item for item, count in player_counts.items() if count == 1]
+            if items:
+                rules.append(HasAny(items, rule).simplify())
+            rules.extend(Has(item, rule, count) for item, count in player_counts.items() if count > 1)
+        if len(rules) > 1:
+            return Or(*rules)
+        return rules[0] if rules else Constant(False)
+
+    def _join(self, sources: typing.List[str]) -> str:
+        return f"({' or '.join(sources)})"
+
+
+class Count(_Aggregate):
+    """At least count of rules are fulfilled."""
+    def __init__(self, rules: typing.Iterable[Rule], count: int):
+        self.rules = tuple(rules)
+        self.count = count
+
+    def _key(self) -> typing.Tuple[typing.Tuple[Rule, ...], int]:
+        return self.rules, self.count
+
+    def simplify(self) -> Rule:
+        count = self.count
+        rules: typing.List[Rule] = []
+        for rule in self.rules:
+            rule = rule.simplify()
+            if not isinstance(rule, Constant):
+                rules.append(rule)
+            elif rule.value:
+                count -= 1
+        if count <= 0:
+            return Constant(True)
+        if count > len(rules):
+            return Constant(False)
+        if count == len(rules):
+            return And(*rules).simplify()
+        if count == 1:
+            return Or(*rules).simplify()
+        return Count(rules, count)
+
+    def _join(self, sources: typing.List[str]) -> str:
+        return f"({' + '.join(f'(1 if {source} else 0)' for source in sources)} >= {self.count!r})"
+
+
+def _as_rule(rule: CollectionRule) -> typing.Optional[Rule]:
+    if isinstance(rule, Rule):
+        return rule
+    # already compiled by compile_rules
+    compiled_rule = getattr(rule, "rule", None)
+    return compiled_rule if isinstance(compiled_rule, Rule) else None
+
+
+def compile_rules(multiworld: MultiWorld, player: int) -> None:
+    """Simplifies the Rule access rules of the locations and entrances of player and replaces them with their compiled
+    functions, registering the item dependencies of rules that only read items of player. Called after set_rules."""
+    for spot in itertools.chain(multiworld.get_locations(player), multiworld.get_entrances(player)):
+        rule = spot.access_rule
+        if isinstance(rule, Rule):
+            _compile_rule(multiworld, spot, rule)
+    completion_condition = multiworld.completion_condition.get(player)
+    if isinstance(completion_condition, Rule):
+        multiworld.completion_condition[player] = completion_condition.simplify().compile()
+
+
+def _compile_rule(multiworld: MultiWorld, spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"],
+                  rule: Rule) -> None:
+    rule = rule.simplify()
+    spot.access_rule = rule.compile()
+    dependencies = rule.get_item_dependencies()
+    if dependencies is not None and dependencies.keys() <= {spot.player}:
+        multiworld.register_rule_dependencies(spot, dependencies.get(spot.player, ()))
+
+
 def set_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"], rule: CollectionRule):
     spot.access_rule = rule
 
@@ -105,11 +444,20 @@ def add_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"],
     # empty rule, replace instead of add
     if old_rule is spot.__class__.access_rule:
         spot.access_rule = rule if combine == "and" else old_rule
-    else:
-        if combine == "and":
-            spot.access_rule = lambda state: rule(state) and old_rule(state)
+        return
+    new_node, old_node = _as_rule(rule), _as_rule(old_rule)
+    if new_node is not None and old_node is not None:
+        # combine into one Rule instead of nesting lambdas, compile_rules turns it back into a single function
+        combined = new_node & old_node if combine == "and" else new_node | old_node
+        if isinstance(old_rule, Rule):
+            spot.access_rule = combined
         else:
-            spot.access_rule = lambda state: rule(state) or old_rule(state)
+            # compile_rules already ran, keep the rule compiled with its item dependencies
+            _compile_rule(spot.parent_region.multiworld, spot, combined)
+    elif combine == "and":
+        spot.access_rule = lambda state: rule(state) and old_rule(state)
+    else:
+        spot.access_rule = lambda state: rule(state) or old_rule(state)
 
 
 def forbid_item(location: "BaseClasses.Location", item: str, player: int):
@@ -509,9 +509,9 @@ class SMZ3World(World):
         return False
 
     def remove(self, state: CollectionState, item: Item) -> bool:
+        state.smz3state[item.player].Remove([TotalSMZ3Item.Item(TotalSMZ3Item.ItemType[item.name], self.smz3World if hasattr(self, "smz3World") else None)])
         name = self.collect_item(state, item, True)
         if name:
-            state.smz3state[item.player].Remove([TotalSMZ3Item.Item(TotalSMZ3Item.ItemType[item.name], self.smz3World if hasattr(self, "smz3World") else None)])
             state.prog_items[item.player][item.name] -= 1
             if state.prog_items[item.player][item.name] < 1:
                 del (state.prog_items[item.player][item.name])